@@ -0,0 +1,142 @@
+"""
+Load test for the tile server
+Creates a map, then requests tiles of it over keep-alive connections and reports requests per second and latency
+Tiles are aligned to a grid of tile size, the same as a frontend requests them, so later requests hit the cache
+Run from the repository root, against a running server or one it starts:
+    python -m benchmarks.loadtest --start-server --requests 5000 --connections 16
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from hexmap.service import server
+
+SEED = 1234
+
+
+async def request(reader, writer, method, target):
+    """
+    Sends a request on a keep-alive connection and reads the response
+    :return: Status code and body
+    :rtype: tuple[int, bytes]
+    """
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def wait_for_server(host, port, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+
+
+async def worker(host, port, targets, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while targets:
+            target = targets.pop()
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "GET", target)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def load_test(host, port, requests, connections, height, width, tile_size, file_format):
+    """
+    Runs the load test
+    :return: Summary of the results
+    :rtype: dict
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    status, body = await request(reader, writer, "POST", f"/maps?height={height}&width={width}&seed={SEED}")
+    writer.close()
+    if status != 200:
+        raise RuntimeError(f"Creating the map failed with {status}: {body.decode()}")
+    info = json.loads(body)
+    rng = random.Random(SEED)
+    targets = []
+    for _ in range(requests):
+        top = info["top"] + rng.randrange(height // tile_size) * tile_size
+        left = info["left"] + rng.randrange(width // tile_size) * tile_size
+        targets.append(f"/maps/{info['id']}/tile?top={top}&left={left}&height={tile_size}&width={tile_size}"
+                       f"&format={file_format}")
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(host, port, targets, latencies, errors) for _ in range(connections)))
+    seconds = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "connections": connections,
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the hexmap tile server")
+    parser.add_argument("--host", default=server.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT)
+    parser.add_argument("--start-server", action="store_true", help="Start a server for the test and stop it after")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--height", type=int, default=200)
+    parser.add_argument("--width", type=int, default=200)
+    parser.add_argument("--tile-size", type=int, default=16)
+    parser.add_argument("--format", choices=sorted(server.CONTENT_TYPES), default="json")
+    args = parser.parse_args()
+
+    process = None
+    if args.start_server:
+        process = subprocess.Popen([sys.executable, "-m", "hexmap", "--serve", "--host", args.host,
+                                    "--port", str(args.port)])
+    try:
+        asyncio.run(wait_for_server(args.host, args.port))
+        results = asyncio.run(load_test(args.host, args.port, args.requests, args.connections, args.height,
+                                        args.width, args.tile_size, args.format))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(f"{results['requests_per_second']:.0f} requests/s, p50 {results['p50_ms']:.2f}ms, "
+          f"p99 {results['p99_ms']:.2f}ms, {results['errors']} errors", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,467 @@
+"""
+Benchmark suite for map generation and memory, chunked generation, propagation, editing, hex math, pathfinding,
+rendering and I/O
+Every benchmark uses fixed seeds, so two runs time the same work
+Run from the repository root:
+    python -m benchmarks.run --output new.json --compare old.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from hexmap import app
+from hexmap.cartographer import builder, chunks, mapfile, pathfinding, stamping
+from hexmap.features import terrain
+from hexmap.math import fov, hexbatch, hexgrid
+from hexmap.math.hexgrid import make_hex
+from hexmap.math.layout import Layout
+from hexmap.render import raster, svg, text, viewport
+
+SEED = 1234
+MAP_SIZES = [(20, 15), (100, 100), (300, 300), (1000, 1000)]
+QUICK_MAP_SIZES = [(20, 15), (100, 100)]
+# Chunked maps are CHUNK_GRID by CHUNK_GRID chunks of CHUNK_SIZE
+CHUNK_SIZE = 32
+CHUNK_GRID = 8
+# Relative slowdown above which a benchmark is flagged as a regression
+DEFAULT_THRESHOLD = 0.10
+
+benchmarks = {}
+
+
+def benchmark(name, repeat=5):
+    """
+    Registers a benchmark
+    The decorated function is called with a fresh random.Random(SEED) and returns a function to time,
+    so any setup it does is not timed
+    The timed function may return a dict of extra figures to include in the results
+    :param str name: Name of the benchmark in the results
+    :param int repeat: Number of times to time the benchmark
+    """
+    def register(function):
+        benchmarks[name] = (function, repeat)
+        return function
+    return register
+
+
+def new_map(height, width, rng):
+    return builder.create_rectangle_hexmap(height, width, terrain.get_default_terrain(), rng=rng)
+
+
+def register_generate_map(height, width):
+    repeat = 5 if height * width <= 10000 else 1
+
+    @benchmark(f"generate_map/{height}x{width}", repeat)
+    def generate_map(rng):
+        seed = rng.randrange(1 << 32)
+        return lambda: app.generate_map(height=height, width=width, seed=seed)
+
+
+def register_create_map_memory(height, width):
+    @benchmark(f"memory/create_map/{height}x{width}", 1)
+    def create_map_memory(rng):
+        def run():
+            # Timed with tracing on, so only the memory figures are comparable with other benchmarks
+            tracemalloc.start()
+            try:
+                positions = new_map(height, width, rng)
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return {"bytes_per_cell": current / len(positions), "peak_bytes_per_cell": peak / len(positions)}
+        return run
+
+
+def register_generate_chunks(workers):
+    @benchmark(f"chunks/generate_parallel/{workers}_workers", 1)
+    def generate_chunks(rng):
+        seed = rng.randrange(1 << 32)
+
+        def run():
+            start = time.perf_counter()
+            for _ in chunks.generate_chunks_parallel(CHUNK_SIZE, CHUNK_GRID, CHUNK_GRID, seed, workers):
+                pass
+            return {"cells_per_second": (CHUNK_SIZE * CHUNK_GRID) ** 2 / (time.perf_counter() - start)}
+        return run
+
+
+@benchmark("chunks/serial_fraction", 1)
+def chunks_serial_fraction(rng):
+    seed = rng.randrange(1 << 32)
+    terrains = terrain.get_default_terrain()
+
+    def run():
+        # Chunks are generated in parallel but their seams are reconciled one at a time,
+        # so the share of the time spent on seams bounds the speedup of any number of workers
+        generating = reconciling = 0.0
+        refilled = 0
+        border = {}
+        for column, row in chunks.chunk_coordinates(CHUNK_GRID, CHUNK_GRID):
+            start = time.perf_counter()
+            chunk = chunks.generate_independent_chunk((column, row), CHUNK_SIZE, terrains, None, seed)
+            generated = time.perf_counter()
+            refilled += chunks.reconcile_chunk(chunk, border, terrains, chunks.chunk_rng(seed, column, row, "seam"))
+            chunks.update_border(border, chunk, CHUNK_GRID)
+            reconciling += time.perf_counter() - generated
+            generating += generated - start
+        return {"serial_fraction": reconciling / (generating + reconciling),
+                "max_speedup": (generating + reconciling) / reconciling,
+                "refilled_fraction": refilled / (CHUNK_SIZE * CHUNK_GRID) ** 2}
+    return run
+
+
+@benchmark("placement/set_terrain_in_random_valid_position")
+def set_terrain_in_random_valid_position(rng):
+    positions = new_map(100, 100, rng)
+    town = terrain.default_terrain["town"]
+
+    def run():
+        for _ in range(100):
+            builder.set_terrain_in_random_valid_position(town, positions)
+    return run
+
+
+@benchmark("placement/place_terrain_hex_shape")
+def place_terrain_hex_shape(rng):
+    positions = new_map(100, 100, rng)
+    water = terrain.default_terrain["water"]
+
+    def run():
+        for _ in range(20):
+            builder.place_terrain_hex_shape(water, positions, 2)
+    return run
+
+
+@benchmark("placement/place_terrain_staggered_wall_shape")
+def place_terrain_staggered_wall_shape(rng):
+    positions = new_map(100, 100, rng)
+    mountains = terrain.default_terrain["mountains"]
+
+    def run():
+        for _ in range(20):
+            builder.place_terrain_staggered_wall_shape(mountains, positions, 5, hexgrid.directions["NE"], 0.5, 1)
+    return run
+
+
+@benchmark("placement/stamp_features")
+def stamp_features(rng):
+    positions = new_map(100, 100, rng)
+    default_terrain = terrain.default_terrain
+    features = ([stamping.StaggeredWall(default_terrain["mountains"], 5, hexgrid.directions["NE"], 0.5, 1)
+                 for _ in range(20)]
+                + [stamping.Single(default_terrain["town"]) for _ in range(100)]
+                + [stamping.HexBlob(default_terrain["water"], 2) for _ in range(20)])
+    return lambda: stamping.stamp_features(features, positions)
+
+
+@benchmark("propagation/per_placement")
+def propagation_per_placement(rng):
+    positions = new_map(100, 100, rng)
+
+    def run():
+        placements = 0
+        revisions = 0
+        while positions.undetermined:
+            revisions += builder.set_terrain_for_location(None, positions, None).revisions
+            placements += 1
+        return {"placements": placements, "revisions_per_placement": revisions / placements}
+    return run
+
+
+@benchmark("editing/set_terrain")
+def set_terrain(rng):
+    grid = app.generate_map(height=100, width=100, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    positions = sorted(grid.grid)
+    edits = [(rng.choice(positions), rng.choice(list(terrain.default_terrain.values()))) for _ in range(100)]
+
+    def run():
+        relaxed = 0
+        for position, terrain_option in edits:
+            relaxed += grid.set_terrain(position, terrain_option).relaxed
+        while grid.undo():
+            pass
+        return {"relaxed_per_edit": relaxed / len(edits)}
+    return run
+
+
+def random_hexes(rng, count, radius=50):
+    return [make_hex(rng.randint(-radius, radius), rng.randint(-radius, radius)) for _ in range(count)]
+
+
+@benchmark("hexgrid/hex_neighbors")
+def hex_neighbors(rng):
+    hexes = random_hexes(rng, 100000)
+
+    def run():
+        for position in hexes:
+            hexgrid.hex_neighbors(position)
+    return run
+
+
+@benchmark("hexgrid/hex_distance")
+def hex_distance(rng):
+    pairs = list(zip(random_hexes(rng, 100000), random_hexes(rng, 100000)))
+
+    def run():
+        for a, b in pairs:
+            hexgrid.hex_distance(a, b)
+    return run
+
+
+@benchmark("hexgrid/hex_linedraw")
+def hex_linedraw(rng):
+    pairs = list(zip(random_hexes(rng, 2000), random_hexes(rng, 2000)))
+
+    def run():
+        for a, b in pairs:
+            hexgrid.hex_linedraw(a, b)
+    return run
+
+
+def random_pixels(rng, count, extent=5000.0):
+    return [rng.uniform(-extent, extent) for _ in range(count)], [rng.uniform(-extent, extent) for _ in range(count)]
+
+
+@benchmark("hexgrid/pixel_to_hex")
+def pixel_to_hex(rng):
+    layout = Layout(size=(10.0, 10.0))
+    points = list(zip(*random_pixels(rng, 100000)))
+
+    def run():
+        for x, y in points:
+            layout.pixel_to_hex(x, y)
+    return run
+
+
+if hexbatch.np is not None:
+    @benchmark("hexbatch/pixel_to_hex")
+    def batch_pixel_to_hex(rng):
+        layout = Layout(size=(10.0, 10.0))
+        x, y = (hexbatch.np.array(values) for values in random_pixels(rng, 1000000))
+        return lambda: hexbatch.pixel_to_hex(layout, x, y)
+
+
+@benchmark("hexgrid/field_of_view")
+def field_of_view(rng):
+    centers = random_hexes(rng, 100)
+    opaque = set(random_hexes(rng, 2000))
+    fov.ray_set(30)
+
+    def run():
+        for center in centers:
+            fov.field_of_view(center, 30, opaque.__contains__)
+    return run
+
+
+@benchmark("pathfinding/find_path")
+def find_path(rng):
+    grid = app.generate_map(height=100, width=100, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    travel_map = pathfinding.TravelMap(grid)
+    positions = sorted(travel_map.costs)
+    pairs = [(rng.choice(positions), rng.choice(positions)) for _ in range(50)]
+
+    def run():
+        for start, goal in pairs:
+            travel_map.find_path(start, goal)
+    return run
+
+
+@benchmark("pathfinding/nearest_town")
+def nearest_town(rng):
+    grid = app.generate_map(height=100, width=100, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    positions = sorted(pathfinding.TravelMap(grid).costs)
+    starts = [rng.choice(positions) for _ in range(10000)]
+
+    def run():
+        # The distance field is built by the first lookup, and every later lookup reads it
+        travel_map = pathfinding.TravelMap(grid)
+        for start in starts:
+            travel_map.nearest(start, "town")
+    return run
+
+
+@benchmark("render/grid_str")
+def grid_str(rng):
+    grid = app.generate_map(height=200, width=200, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    return lambda: str(grid)
+
+
+@benchmark("render/write_grid")
+def write_grid(rng):
+    grid = app.generate_map(height=200, width=200, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    return lambda: text.write_grid(grid, io.StringIO())
+
+
+@benchmark("render/svg")
+def render_svg(rng):
+    grid = app.generate_map(height=200, width=200, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    return lambda: svg.write_svg(grid, io.StringIO())
+
+
+@benchmark("render/png")
+def render_png(rng):
+    grid = app.generate_map(height=200, width=200, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+
+    def run():
+        output = io.BytesIO()
+        raster.write_png(raster.rasterise(grid), output)
+        return {"bytes": len(output.getvalue())}
+    return run
+
+
+@benchmark("render/viewport_scroll")
+def viewport_scroll(rng):
+    grid = app.generate_map(height=300, width=300, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    window = viewport.Viewport(grid, 20, 40)
+
+    def run():
+        # Scroll down the map a row at a time, then back up
+        rendered = window.rendered_rows
+        for rows in [1] * 200 + [-1] * 200:
+            window.scroll(rows, 0)
+            window.frame()
+        return {"rows_per_frame": (window.rendered_rows - rendered) / 400}
+    return run
+
+
+@benchmark("render/viewport_edit")
+def viewport_edit(rng):
+    grid = app.generate_map(height=300, width=300, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    window = viewport.Viewport(grid, 20, 40)
+    window.frame()
+    visible = [make_hex(column - r // 2, r) for r in range(window.top, window.top + window.height)
+               for column in range(window.left, window.left + window.width)]
+    edits = [(rng.choice(visible), rng.choice(list(terrain.default_terrain.values()))) for _ in range(50)]
+
+    def run():
+        rendered = window.rendered_rows
+        for position, terrain_option in edits:
+            grid.set_terrain(position, terrain_option)
+            window.frame()
+        while grid.undo():
+            window.frame()
+        return {"rows_per_frame": (window.rendered_rows - rendered) / (2 * len(edits))}
+    return run
+
+
+@benchmark("io/save_load_round_trip")
+def save_load_round_trip(rng):
+    grid = app.generate_map(height=200, width=200, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    path = os.path.join(tempfile.mkdtemp(), "benchmark.hexmap")
+
+    def run():
+        mapfile.save_map(path, grid)
+        mapfile.load_map(path)
+        return {"bytes": os.path.getsize(path)}
+    return run
+
+
+@benchmark("io/read_window")
+def read_window(rng):
+    grid = app.generate_map(height=500, width=500, town_count=20, lake_count=10, seed=rng.randrange(1 << 32))
+    path = os.path.join(tempfile.mkdtemp(), "benchmark.hexmap")
+    mapfile.save_map(path, grid)
+
+    def run():
+        with mapfile.MapFile(path) as map_file:
+            for _ in range(100):
+                map_file.read_window(rng.randrange(-249, 230), rng.randrange(-249, 230), 20, 20)
+    return run
+
+
+def run_benchmark(name):
+    """
+    Times a registered benchmark
+    :param str name: Name of the benchmark
+    :return: Median and fastest time in seconds, and any extra figures from the last run
+    :rtype: dict
+    """
+    function, repeat = benchmarks[name]
+    times = []
+    extra = None
+    for _ in range(repeat):
+        # Setup is repeated so every run times the same work on a fresh map
+        timed = function(random.Random(SEED))
+        start = time.perf_counter()
+        extra = timed()
+        times.append(time.perf_counter() - start)
+    result = {"seconds": statistics.median(times), "min_seconds": min(times), "repeat": repeat}
+    if isinstance(extra, dict):
+        result.update(extra)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with a baseline run
+    :param dict results: Results of this run, by benchmark name
+    :param dict baseline: Results of the baseline run, by benchmark name
+    :param float threshold: Relative slowdown above which a benchmark is a regression
+    :return: Ratio of this run's time to the baseline's for each benchmark in both, and the names of the regressions
+    :rtype: tuple[dict[str, float], list[str]]
+    """
+    # The fastest run is compared, as it is the least affected by other load on the machine
+    ratios = {name: results[name]["min_seconds"] / baseline[name]["min_seconds"]
+              for name in results if name in baseline and baseline[name]["min_seconds"] > 0}
+    regressions = [name for name, ratio in ratios.items() if ratio > 1 + threshold]
+    return ratios, regressions
+
+
+def init_argparse():
+    parser = argparse.ArgumentParser(description="Run the hexmap benchmarks and print a JSON summary")
+    parser.add_argument("-o", "--output", help="Also write the summary to this file")
+    parser.add_argument("-c", "--compare", help="Summary of a previous run to compare with")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown flagged as a regression, default %(default)s")
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help=f"Only generate maps up to {QUICK_MAP_SIZES[-1][0]}x"
+                                                              f"{QUICK_MAP_SIZES[-1][1]}")
+    return parser
+
+
+def main():
+    args = init_argparse().parse_args()
+    map_sizes = QUICK_MAP_SIZES if args.quick else MAP_SIZES
+    for height, width in map_sizes:
+        register_generate_map(height, width)
+    register_create_map_memory(*map_sizes[-1])
+    for workers in sorted({1, os.cpu_count() or 1}):
+        register_generate_chunks(workers)
+
+    results = {}
+    for name in sorted(benchmarks):
+        if args.filter in name:
+            results[name] = run_benchmark(name)
+            print(f"{name}: {results[name]['seconds']:.4f}s", file=sys.stderr)
+
+    summary = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "seed": SEED},
+        "results": results,
+    }
+    regressions = []
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)["results"]
+        ratios, regressions = compare(results, baseline, args.threshold)
+        summary["comparison"] = {"baseline": args.compare, "threshold": args.threshold,
+                                 "ratios": ratios, "regressions": regressions}
+
+    output = json.dumps(summary, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(output + "\n")
+    for name in regressions:
+        print(f"REGRESSION {name}: {summary['comparison']['ratios'][name]:.2f}x baseline", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
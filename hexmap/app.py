@@ -1,11 +1,23 @@
 import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from dataclasses import dataclass
+import functools
+import math
+import os
 import pickle
 import random
-from hexmap.cartographer import builder
-from hexmap.math import hexgrid
+import sys
+import time
+from hexmap.cartographer import builder, chunks, mapfile, profiling, stamping
+from hexmap.math import hexgrid, layout
 from hexmap.features import terrain
+from hexmap.render import raster, svg, text
+from hexmap.service import server
 
 VERSION = '0.0.1'
+IMAGE_EXTENSIONS = ('.svg', '.png', '.ppm')
 
 
 def init_argparse() -> argparse.ArgumentParser:
@@ -23,62 +35,281 @@ def init_argparse() -> argparse.ArgumentParser:
     parser.add_argument(
         '-l', '--load', action='store', type=str, nargs=1
     )
-    # parser.add_argument(
-    #     'config',
-    #     help='JSON format config defining map elements')
+    parser.add_argument(
+        '--seed', action='store', type=int
+    )
+    parser.add_argument(
+        '--no-colour', action='store_true'
+    )
+    parser.add_argument(
+        '--no-coordinates', action='store_true'
+    )
+    parser.add_argument(
+        '--batch', action='store', type=int, metavar='COUNT',
+        help='Generate COUNT maps into the output directory instead of printing one'
+    )
+    parser.add_argument(
+        '--output-dir', action='store', type=str, default='.',
+        help='Directory batch maps are written to'
+    )
+    parser.add_argument(
+        '--format', action='store', choices=['map', 'text'], default='map',
+        help='Write batch maps as binary map files or plain text'
+    )
+    parser.add_argument(
+        '--workers', action='store', type=int,
+        help='Number of worker processes for batch generation and the tile server, the number of CPUs by default'
+    )
+    parser.add_argument(
+        '--height', action='store', type=int, default=20
+    )
+    parser.add_argument(
+        '--width', action='store', type=int, default=15
+    )
+    parser.add_argument(
+        '--towns', action='store', type=int, default=5
+    )
+    parser.add_argument(
+        '--lakes', action='store', type=int, default=2
+    )
+    parser.add_argument(
+        '--image', action='store', type=str, metavar='FILE',
+        help='Also write the map as an image, SVG, PNG or PPM by the file extension'
+    )
+    parser.add_argument(
+        '--hex-size', action='store', type=float, default=10.0,
+        help='Distance from the centre of a hex to its corners in image pixels'
+    )
+    parser.add_argument(
+        '--orientation', action='store', choices=sorted(layout.orientations), default='pointy',
+        help='Draw images with pointy topped hexes, offset by row, or flat topped hexes, offset by column'
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Report the time and work of each phase of generation on stderr'
+    )
+    parser.add_argument(
+        '--serve', action='store_true',
+        help='Serve tiles of maps over HTTP instead of printing a map, serving the loaded map if any'
+    )
+    parser.add_argument(
+        '--host', action='store', type=str, default=server.DEFAULT_HOST
+    )
+    parser.add_argument(
+        '--port', action='store', type=int, default=server.DEFAULT_PORT
+    )
+    parser.add_argument(
+        '--cache-size', action='store', type=int, default=server.DEFAULT_CACHE_SIZE,
+        help='Number of rendered tiles the server keeps'
+    )
+    parser.add_argument(
+        '--config', action='store', type=str, metavar='FILE',
+        help='JSON file defining the terrain types of generated maps'
+    )
     return parser
 
 
-def place_lake_in_random_position(positions, steps):
-    builder.place_terrain_hex_shape(terrain.default_terrain["water"],
-                                    positions,
-                                    steps)
+def complete_map(positions, grid=None, *, lowest_entropy=False, backtrack_limit=builder.DEFAULT_BACKTRACK_LIMIT):
+    # grid is kept for callers of the old signature, completion only needs positions
+    builder.complete_with_backtracking(positions, backtrack_limit, lowest_entropy)
+
+
+def place_features(positions, town_count=5, lake_count=2):
+    # Features use the map's own terrain types, and are left out if the map has no terrain of that name
+    terrains = {terrain_option.name: terrain_option for terrain_option in builder.get_ruleset(positions).terrains}
+    if "town" in terrains and builder.count_positions_for_terrain(terrains["town"], positions) < town_count:
+        raise ValueError(f"Not enough positions left for {town_count} towns")
+
+    features = []
+    if "mountains" in terrains:
+        features.append(stamping.StaggeredWall(terrains["mountains"], 5, hexgrid.directions["NE"], 0.5, 1))
+    if "town" in terrains:
+        features += [stamping.Single(terrains["town"]) for _ in range(town_count)]
+    if "water" in terrains:
+        features += [stamping.HexBlob(terrains["water"], 2) for _ in range(lake_count)]
+    return stamping.stamp_features(features, positions)
+
+
+def generate_map(backend="dict", height=20, width=15, town_count=5, lake_count=2, seed=None, stats=None,
+                 terrains=None):
+    # Without a seed the map is built from the global random state
+    rng = random.Random(seed) if seed is not None else None
+    if terrains is None:
+        terrains = terrain.get_default_terrain()
+    with stats.phase("create") if stats is not None else contextlib.nullcontext():
+        positions = builder.create_rectangle_hexmap(height, width, terrains, backend, rng)
+    if stats is not None:
+        profiling.enable(positions, stats)
+
+    place_features(positions, town_count, lake_count)
+
+    with profiling.phase(positions, "complete"):
+        complete_map(positions)
+    # The array backend is its own grid, and is converted to a Grid once complete
+    return positions.to_grid() if backend == "array" else builder.Grid(positions, height, width)
+
+
+def generate_chunked_map(chunk_size, columns, rows=None, town_count=1, lake_count=1, seed=None, workers=None,
+                         terrains=None):
+    # Each chunk gets its own features, and chunks are yielded as soon as they are complete
+    populate = functools.partial(place_features, town_count=town_count, lake_count=lake_count)
+    if terrains is None:
+        terrains = terrain.get_default_terrain()
+    if workers is not None:
+        return chunks.generate_chunks_parallel(chunk_size, columns, rows, seed, workers, terrains, populate)
+    return chunks.generate_chunks(chunk_size, columns, rows, terrains, populate, seed)
 
 
-def place_town_in_random_position(positions):
-    builder.set_terrain_in_random_valid_position(terrain.default_terrain["town"], positions)
+@dataclass()
+class BatchResult:
+    paths: list[str]
+    seconds: float
 
+    @property
+    def maps_per_second(self):
+        return len(self.paths) / self.seconds if self.seconds else float("inf")
 
-def complete_map(positions, grid):
-    while not grid.is_complete():
-        builder.set_terrain_for_location(None, positions, None)
 
+def batch_seed(base_seed, index):
+    # Each map's seed only depends on the base seed and its index, not on which worker generates it
+    return random.Random(f"{base_seed}:map:{index}").getrandbits(63)
 
-def generate_map():
-    seed = None
-    if seed:
-        random.seed(seed)
-    height = 20
-    width = 15
-    town_count = 5
-    lake_count = 2
-    positions = builder.create_rectangle_hexmap(height, width, terrain.get_default_terrain())
-    grid = builder.Grid(positions, height, width)
 
-    builder.place_terrain_staggered_wall_shape(terrain.default_terrain["mountains"], positions, 5,
-                                               hexgrid.directions["NE"], 0.5, 1)
+def generate_batch_map(index, output_dir, base_seed, file_format, height, width, town_count, lake_count,
+                       terrains=None):
+    seed = batch_seed(base_seed, index)
+    grid = generate_map(height=height, width=width, town_count=town_count, lake_count=lake_count, seed=seed,
+                        terrains=terrains)
+    if file_format == "map":
+        path = os.path.join(output_dir, f"map-{index:06d}.hexmap")
+        mapfile.save_map(path, grid, seed)
+    elif file_format == "text":
+        path = os.path.join(output_dir, f"map-{index:06d}.txt")
+        with open(path, "w") as outfile:
+            text.write_grid(grid, outfile, colour=False)
+    else:
+        raise ValueError(f"Unknown map file format: {file_format}")
+    return path
+
+
+def generate_batch(count, output_dir, base_seed=0, workers=None, file_format="map", height=20, width=15,
+                   town_count=5, lake_count=2, terrains=None):
+    os.makedirs(output_dir, exist_ok=True)
+    task = functools.partial(generate_batch_map, output_dir=output_dir, base_seed=base_seed, file_format=file_format,
+                             height=height, width=width, town_count=town_count, lake_count=lake_count,
+                             terrains=terrains)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    if workers <= 1:
+        paths = [task(index) for index in range(count)]
+    else:
+        # Workers stay up for the whole batch, and are handed maps in chunks to keep the overhead per map low
+        with ProcessPoolExecutor(workers) as executor:
+            paths = list(executor.map(task, range(count), chunksize=max(1, count // (workers * 8))))
+    return BatchResult(paths, time.perf_counter() - start)
+
+
+def save_image(path, grid, hex_layout):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".svg":
+        with open(path, "w", encoding="utf-8") as outfile:
+            svg.write_svg(grid, outfile, hex_layout)
+    elif extension in (".png", ".ppm"):
+        image = raster.rasterise(grid, hex_layout)
+        with open(path, "wb") as outfile:
+            (raster.write_png if extension == ".png" else raster.write_ppm)(image, outfile)
+    else:
+        raise ValueError(f"Unknown image format: {extension or path}")
+
 
-    for _ in range(0, town_count):
-        place_town_in_random_position(positions)
+def load_grid(path):
+    # Maps saved with pickle by older versions are imported
+    if mapfile.is_map_file(path):
+        with mapfile.MapFile(path) as map_file:
+            return map_file.to_grid(), map_file.seed
+    return mapfile.import_pickle(path), None
 
-    for _ in range(0, lake_count):
-        place_lake_in_random_position(positions, 2)
 
-    complete_map(positions, grid)
-    return grid
+def load_grid_or_exit(path):
+    try:
+        return load_grid(path)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError) as error:
+        print(f"Can't load map: {error}", file=sys.stderr)
+        sys.exit(2)
+
+
+def serve(args, terrains=None):
+    # Maps are generated in the server's worker processes, with the same options as generate_map
+    tile_server = server.TileServer(functools.partial(generate_map, "dict", terrains=terrains), args.cache_size,
+                                    args.workers)
+    if args.load:
+        grid, seed = load_grid_or_exit(args.load[0])
+        tile_server.add_map(os.path.splitext(os.path.basename(args.load[0]))[0], grid, seed)
+
+    def ready(address):
+        print(f"Serving tiles on http://{address[0]}:{address[1]}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever(tile_server, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
 
 
 def run():
     args = init_argparse().parse_args()
+    stats = profiling.GenerationStats() if args.profile else None
+    try:
+        terrains = terrain.load_terrain(args.config) if args.config else None
+    except (OSError, ValueError) as error:
+        print(f"Can't load terrain config: {error}", file=sys.stderr)
+        sys.exit(2)
+    image_layout = None
+    if args.image:
+        extension = os.path.splitext(args.image)[1].lower()
+        if extension not in IMAGE_EXTENSIONS:
+            print(f"Images must be one of {', '.join(IMAGE_EXTENSIONS)}", file=sys.stderr)
+            sys.exit(2)
+        image_layout = layout.Layout(layout.orientations[args.orientation], (args.hex_size, args.hex_size))
+        try:
+            if not (math.isfinite(args.hex_size) and args.hex_size > 0):
+                raise ValueError(f"Hex size must be a positive number, not {args.hex_size}")
+            if extension != ".svg":
+                # Checks the hexes are large enough to cover whole pixels
+                raster.lattice_steps(image_layout)
+        except ValueError as error:
+            print(f"Can't write image: {error}", file=sys.stderr)
+            sys.exit(2)
 
+    if args.serve:
+        serve(args, terrains)
+        return
+
+    if args.batch is not None:
+        base_seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+        result = generate_batch(args.batch, args.output_dir, base_seed, args.workers, args.format, args.height,
+                                args.width, args.towns, args.lakes, terrains)
+        print(f"Generated {len(result.paths)} maps with base seed {base_seed} in {result.seconds:.2f}s "
+              f"({result.maps_per_second:.1f} maps/s)", file=sys.stderr)
+        return
+
+    seed = args.seed
     if args.load:
-        with open(args.load[0], "rb") as infile:
-            grid = pickle.load(infile)
-            print(grid)
+        with stats.phase("load") if stats is not None else contextlib.nullcontext():
+            grid, seed = load_grid_or_exit(args.load[0])
     else:
-        grid = generate_map()
-        print(grid)
+        grid = generate_map(height=args.height, width=args.width, town_count=args.towns, lake_count=args.lakes,
+                            seed=seed, stats=stats, terrains=terrains)
+    with stats.phase("render") if stats is not None else contextlib.nullcontext():
+        text.write_grid(grid, sys.stdout, not args.no_colour, not args.no_coordinates)
+        print()
 
     if args.save:
-        with open(args.save[0], "wb") as outfile:
-            pickle.dump(grid, outfile)
+        with stats.phase("save") if stats is not None else contextlib.nullcontext():
+            mapfile.save_map(args.save[0], grid, seed)
+
+    if args.image:
+        with stats.phase("image") if stats is not None else contextlib.nullcontext():
+            save_image(args.image, grid, image_layout)
+
+    if stats is not None:
+        stats.report(sys.stderr)
@@ -0,0 +1,350 @@
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from hexmap.cartographer import builder
+from hexmap.cartographer.index import EntropyHeap, IndexedSet, update_candidates
+from hexmap.cartographer.location import Location
+from hexmap.cartographer.trail import Contradiction
+from hexmap.math import hexbatch
+from hexmap.math.hexgrid import Hex, make_hex
+
+
+def is_single(domains):
+    """
+    Checks which domains have exactly one option
+    :param numpy.ndarray domains: Domain bitmasks
+    :return: True where the domain has exactly one option
+    :rtype: numpy.ndarray
+    """
+    return (domains != 0) & ((domains & (domains - 1)) == 0)
+
+
+class ArrayGrid:
+    """
+    Rectangle map stored as arrays indexed by dense cell index, in the same row order as a Grid
+    Holds q and r coordinate arrays, a domain bitmask array and an (N, 6) neighbour index array,
+    with -1 for neighbours that are off the map
+    Cells are addressed by Hex position through the same builder functions as a Positions map,
+    and the undetermined and candidate indexes are kept in the same order, so the same seed
+    produces the same map with either backend
+    """
+
+    def __init__(self, height, width, ruleset, domains=None, determined=None):
+        """
+        :param int height: Height of the map
+        :param int width: Width of the map
+        :param Ruleset ruleset: The compiled ruleset every cell uses
+        :param domains: Domain of each cell, every cell has every option if None
+        :type domains: numpy.ndarray or None
+        :param determined: If each cell is determined, derived from domains if None
+        :type determined: numpy.ndarray or None
+        """
+        if np is None:
+            raise ImportError("The array backend requires numpy")
+        if not isinstance(ruleset.supports, list):
+            raise ValueError(f"The array backend supports rulesets of at most {len(ruleset.supports)} terrains")
+        self.height = height
+        self.width = width
+        self.ruleset = ruleset
+        self.longest = ruleset.longest
+        # Same bounds as hexgrid.build_rectangle_of_size
+        self.top = -height // 2 + 1
+        self.left = -width // 2 + 1
+        self.q, self.r = hexbatch.build_rectangle_of_size(height, width)
+        if domains is None:
+            domains = np.full(height * width, ruleset.full, dtype=np.int64)
+        self.domains = np.asarray(domains, dtype=np.int64)
+        self.determined = is_single(self.domains) if determined is None else np.asarray(determined, dtype=bool)
+        self.neighbours = self._build_neighbours()
+        self.supports = np.array(ruleset.supports, dtype=np.int64)
+        self.undetermined = IndexedSet(np.flatnonzero(~self.determined).tolist())
+        self.entropy = None
+        self.candidates = None
+        self.rng = random
+        self.trail = None
+        self.contradictions = 0
+        self.backtracks = 0
+        self.restarts = 0
+        self.stats = None
+
+    def __len__(self):
+        return self.height * self.width
+
+    def __contains__(self, position):
+        return self.index_of(position) >= 0
+
+    def __str__(self):
+        return str(self.to_grid())
+
+    def _build_neighbours(self):
+        q, r = hexbatch.hex_neighbors(self.q, self.r)
+        row = r - self.top
+        column = q + np.floor_divide(r, 2) - self.left
+        on_map = (row >= 0) & (row < self.height) & (column >= 0) & (column < self.width)
+        return np.where(on_map, row * self.width + column, -1)
+
+    def index_of(self, position):
+        """
+        Gets the dense index of a position
+        :param Hex position: The position to look up
+        :return: The index of the position, -1 if it is not on the map
+        :rtype: int
+        """
+        row = position.r - self.top
+        column = position.q + position.r // 2 - self.left
+        if 0 <= row < self.height and 0 <= column < self.width:
+            return row * self.width + column
+        return -1
+
+    def hex_at(self, index):
+        """
+        Gets the position of a dense index
+        :param int index: The index to look up
+        :rtype: Hex
+        """
+        return make_hex(int(self.q[index]), int(self.r[index]))
+
+    def is_complete(self):
+        """
+        Checks if every cell has terrain determined
+        :return: True if all cells have their terrain determined, else false
+        """
+        return len(self.undetermined) == 0
+
+    def undetermined_count(self):
+        """
+        Counts the cells that do not have determined terrain
+        :rtype: int
+        """
+        return int(np.count_nonzero(~self.determined))
+
+    def get_undetermined_positions(self):
+        """
+        Gets all positions that do not have determined terrain
+        :rtype: list[Hex]
+        """
+        return [self.hex_at(index) for index in np.flatnonzero(~self.determined)]
+
+    def cell_state(self, index):
+        """
+        :param int index: The cell to look up
+        :return: The domain of the cell and if it is determined
+        :rtype: tuple[int, bool]
+        """
+        return int(self.domains[index]), bool(self.determined[index])
+
+    def set_domain(self, index, domain, determined):
+        """
+        Sets the domain of a cell, and updates the indexes
+        :param int index: The cell to change
+        :param int domain: The new domain of the cell
+        :param bool determined: If the cell is determined
+        """
+        old_domain = int(self.domains[index])
+        self.domains[index] = domain
+        self.determined[index] = determined
+        self.cell_changed(index, old_domain)
+
+    def track_entropy(self):
+        """
+        Starts keeping a heap of undetermined cells ordered by how many options they have left, as Positions does
+        """
+        if self.entropy is None:
+            self.entropy = EntropyHeap()
+            for index in self.undetermined:
+                self.entropy.push_domain(index, int(self.domains[index]))
+
+    def unsupported_cells(self, cells):
+        """
+        Finds determined cells that a determined neighbour doesn't allow, as builder.unsupported_neighbours
+        :param numpy.ndarray cells: The cells to check
+        :return: The cells that are not allowed
+        :rtype: numpy.ndarray
+        """
+        cells = cells[self.determined[cells]]
+        neighbours = self.neighbours[cells]
+        on_map = neighbours >= 0
+        neighbours = np.where(on_map, neighbours, 0)
+        unsupported = (on_map & self.determined[neighbours]
+                       & (self.domains[neighbours] & self.supports[self.domains[cells]][:, None] == 0))
+        return cells[unsupported.any(axis=1)]
+
+    def cell_changed(self, index, old_domain):
+        """
+        Updates the indexes after the domain of a cell changes
+        :param int index: The cell that changed
+        :param int old_domain: The cell's domain before it changed
+        """
+        was_undetermined = index in self.undetermined
+        determined = bool(self.determined[index])
+        if determined:
+            self.undetermined.discard(index)
+        else:
+            self.undetermined.add(index)
+            if self.entropy is not None:
+                self.entropy.push_domain(index, int(self.domains[index]))
+        if self.candidates is not None:
+            update_candidates(self.candidates, index, old_domain if was_undetermined else 0,
+                              0 if determined else int(self.domains[index]))
+
+    def propagate(self, indexes):
+        """
+        Revises the specified cells until no more terrain options can be removed
+        Each round revises the whole frontier at once against all six neighbours,
+        and the next frontier is the neighbours of cells whose domain shrank
+        If the grid has a trail, changes are recorded and contradictions raised as builder.propagate
+        :param indexes: The cells to be revised first
+        :return: The number of revisions made
+        :rtype: int
+        :raises Contradiction: If the grid has a trail and the propagation leads to a contradiction
+        """
+        frontier = np.unique(np.asarray(indexes, dtype=np.int64))
+        frontier = frontier[frontier >= 0]
+        changed_cells, changed_domains = [], []
+        revisions = 0
+        contradiction = None
+        stats = self.stats.current if self.stats is not None else None
+        depth = 0
+        while frontier.size:
+            frontier = frontier[~self.determined[frontier]]
+            revisions += frontier.size
+            if stats is not None and frontier.size:
+                stats.revisions += int(frontier.size)
+                stats.constraint_checks += int(np.count_nonzero(self.neighbours[frontier] >= 0))
+            neighbours = self.neighbours[frontier]
+            supports = np.where(neighbours >= 0, self.supports[self.domains[neighbours]], self.ruleset.full)
+            old = self.domains[frontier]
+            new = old & np.bitwise_and.reduce(supports, axis=1)
+            shrunk = new != old
+            cells = frontier[shrunk]
+            if stats is not None and cells.size:
+                depth += 1
+                stats.domain_changes += int(cells.size)
+                stats.deepest_cascade = max(stats.deepest_cascade, depth)
+            changed_cells.append(cells)
+            changed_domains.append(old[shrunk])
+            self.domains[cells] = new[shrunk]
+            self.determined[cells] = is_single(new[shrunk])
+            if self.trail is not None:
+                for index, old_domain in zip(cells.tolist(), old[shrunk].tolist()):
+                    self.trail.record(index, old_domain, False)
+                if not new[shrunk].all():
+                    contradiction = self.hex_at(cells[new[shrunk] == 0][0])
+                    break
+            elif not new[shrunk].all():
+                self.contradictions += int(np.count_nonzero(new[shrunk] == 0))
+            neighbours = self.neighbours[cells].ravel()
+            frontier = np.unique(neighbours[neighbours >= 0])
+        if changed_cells:
+            # Report each cell once with its domain from before this propagation, in row order
+            cells, first = np.unique(np.concatenate(changed_cells), return_index=True)
+            old_domains = np.concatenate(changed_domains)[first]
+            if self.trail is not None:
+                if contradiction is None:
+                    unsupported = self.unsupported_cells(cells)
+                    if unsupported.size:
+                        contradiction = self.hex_at(unsupported[0])
+                if contradiction is not None:
+                    # Changes are not reported, they are restored when the trail is undone
+                    self.contradictions += 1
+                    raise Contradiction(contradiction)
+            for index, old_domain in zip(cells.tolist(), old_domains.tolist()):
+                self.cell_changed(index, old_domain)
+        return int(revisions)
+
+    def set_terrain_for_location(self, position, terrain_option, update=True):
+        """
+        Places terrain at specified position, as builder.set_terrain_for_location
+        :param position: The position to place the terrain, chosen randomly if None
+        :type position: Hex or None
+        :param terrain_option: The Terrain Type to set, chosen randomly from the cell's options if None
+        :type terrain_option: Terrain or None
+        :param boolean update: If true propagate the change to the rest of the map
+        :return: The placement, which is truthy if the cell had its terrain set
+        :rtype: builder.Placement
+        """
+        if position is None:
+            index = self.undetermined.choice(self.rng)
+            position = self.hex_at(index)
+        else:
+            index = self.index_of(position)
+        if index < 0 or self.determined[index]:
+            return builder.Placement(position, False)
+        old_domain = int(self.domains[index])
+        if self.trail is not None:
+            self.trail.record(index, old_domain, False)
+        if terrain_option is None:
+            if old_domain:
+                self.domains[index] = self.ruleset.bit(self.ruleset.choose(old_domain, self.rng))
+        else:
+            self.domains[index] = self.ruleset.bit(terrain_option)
+        self.determined[index] = True
+        self.cell_changed(index, old_domain)
+        if self.stats is not None:
+            self.stats.current.collapsed += 1
+        if self.trail is not None and (not self.domains[index] or self.unsupported_cells(np.array([index])).size):
+            self.contradictions += 1
+            raise Contradiction(position)
+        revisions = self.propagate(self.neighbours[index]) if update else 0
+        return builder.Placement(position, True, revisions)
+
+    def get_positions_for_terrain(self, terrain_option):
+        """
+        Gets the undetermined cells that could have the terrain option
+        :param Terrain terrain_option: The terrain option to find cells for
+        :return: The indexes of the cells
+        :rtype: IndexedSet or list[int]
+        """
+        if terrain_option.name not in self.ruleset.ids:
+            return []
+        if self.candidates is None:
+            undetermined = np.array(self.undetermined.items, dtype=np.int64)
+            domains = self.domains[undetermined]
+            self.candidates = [IndexedSet(undetermined[domains & (1 << terrain_id) != 0].tolist())
+                               for terrain_id in range(len(self.ruleset))]
+        return self.candidates[self.ruleset.ids[terrain_option.name]]
+
+    def get_random_position_for_terrain(self, terrain_option):
+        """
+        Gets random position that could have the terrain option
+        :param Terrain terrain_option: The terrain option to find a position for
+        :return: position that could be specified terrain, None if there are no such positions
+        :rtype: Hex or None
+        """
+        candidates = self.get_positions_for_terrain(terrain_option)
+        if not candidates:
+            return None
+        return self.hex_at(candidates.choice(self.rng))
+
+    def to_grid(self):
+        """
+        Converts to a Grid backed by a Positions map
+        :rtype: builder.Grid
+        """
+        positions = builder.Positions(
+            (Hex(q, r), Location.from_domain(self.ruleset, domain, determined))
+            for q, r, domain, determined in zip(self.q.tolist(), self.r.tolist(),
+                                                self.domains.tolist(), self.determined.tolist()))
+        return builder.Grid(positions, self.height, self.width)
+
+    @classmethod
+    def from_grid(cls, grid):
+        """
+        Converts from a rectangle Grid, as created by builder.create_rectangle_hexmap
+        :param builder.Grid grid: The grid to convert
+        :rtype: ArrayGrid
+        """
+        locations = list(grid.grid.values())
+        ruleset = locations[0].ruleset
+        array_grid = cls(grid.height, grid.width, ruleset,
+                         np.array([location.domain for location in locations], dtype=np.int64),
+                         np.array([location.determined for location in locations], dtype=bool))
+        q = np.array([position.q for position in grid.grid], dtype=np.int64)
+        r = np.array([position.r for position in grid.grid], dtype=np.int64)
+        if not (np.array_equal(q, array_grid.q) and np.array_equal(r, array_grid.r)):
+            raise ValueError("Grid positions are not a rectangle of its height and width")
+        return array_grid
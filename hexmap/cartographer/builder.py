@@ -1,9 +1,137 @@
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
+import math
 import random
+from hexmap.cartographer import arraygrid, editing
+from hexmap.cartographer.index import IndexedSet, EntropyHeap, update_candidates
 from hexmap.cartographer.location import Location
+from hexmap.cartographer.trail import Contradiction, Trail
 from hexmap.math import hexgrid
+from hexmap.render import text
 from hexmap.math.hexgrid import Hex
 from hexmap.features.terrain import Terrain
+from hexmap.features.ruleset import compile_ruleset
+
+# Most choices complete_with_backtracking will undo before giving up
+DEFAULT_BACKTRACK_LIMIT = 1000
+# Choices complete_with_backtracking undoes in order before it restarts the area around a contradiction instead
+RESTART_BACKTRACKS = 8
+# Distance from a contradiction of the cells whose choices a restart undoes
+RESTART_RADIUS = 2
+# Restarts that can run into a contradiction in the cells of the last restart before the distance is doubled
+STALLED_RESTARTS = 2
+# Cells of the map for each restart that can go by without leaving fewer cells undetermined than ever before,
+# before the whole map is started again
+RESTART_PATIENCE = 32
+
+
+class Positions(dict):
+    """
+    Map of Hex positions to Locations that keeps indexes of its undetermined positions
+    The builder functions keep the indexes up to date, Locations changed directly
+    must be reported with location_changed
+    Random choices made by the builder functions use rng, the random module unless it is replaced
+    While a trail is set every change the builder functions make to a location is recorded on it,
+    locations replaced by assigning to the map are not recorded
+    While stats are set the builder functions count their work in them, see profiling.enable
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rng = random
+        self.undetermined = IndexedSet(position for position, location in self.items() if not location.determined)
+        self.entropy = None
+        self.candidates = None
+        self.changed = None
+        self.trail = None
+        self.contradictions = 0
+        self.backtracks = 0
+        self.restarts = 0
+        self.stats = None
+
+    def __setitem__(self, position, location):
+        old_location = self.get(position)
+        super().__setitem__(position, location)
+        self.location_changed(position, location, old_location.domain if old_location is not None else 0)
+
+    def __reduce__(self):
+        # The indexes are rebuilt from the locations rather than pickled
+        return Positions, (list(self.items()),)
+
+    def __delitem__(self, position):
+        super().__delitem__(position)
+        self.undetermined.discard(position)
+        if self.candidates is not None:
+            for candidates in self.candidates:
+                candidates.discard(position)
+
+    def cell_state(self, position):
+        """
+        :param Hex position: The position to look up
+        :return: The domain of the location at the position and if it is determined
+        :rtype: tuple[int, bool]
+        """
+        location = self[position]
+        return location.domain, location.determined
+
+    def set_domain(self, position, domain, determined):
+        """
+        Sets the terrain options of the location at a position, and updates the indexes
+        :param Hex position: The position to change
+        :param int domain: The new domain of the location
+        :param bool determined: If the location is determined
+        """
+        location = self[position]
+        old_domain = location.domain
+        location.domain = domain
+        location.determined = determined
+        self.location_changed(position, location, old_domain)
+
+    def track_entropy(self):
+        """
+        Starts keeping a heap of undetermined positions ordered by how many options they have left
+        """
+        if self.entropy is None:
+            self.entropy = EntropyHeap({position: self[position] for position in self.undetermined})
+
+    def track_candidates(self, ruleset):
+        """
+        Starts keeping, for each terrain in the ruleset, the set of undetermined positions that could still be it
+        :param Ruleset ruleset: The ruleset shared by the locations
+        """
+        if self.candidates is None:
+            self.candidates = [IndexedSet(position for position in self.undetermined if self[position].domain & bit)
+                               for bit in (1 << terrain_id for terrain_id in range(len(ruleset)))]
+
+    def track_changes(self):
+        """
+        Starts keeping the set of positions whose locations changed, for its user to read and clear
+        :return: The set of changed positions
+        :rtype: set[Hex]
+        """
+        if self.changed is None:
+            self.changed = set()
+        return self.changed
+
+    def location_changed(self, position, location, old_domain):
+        """
+        Updates the indexes after the terrain options of a location change
+        :param Hex position: The position that changed
+        :param Location location: The location at the position
+        :param int old_domain: The location's domain before it changed
+        """
+        was_undetermined = position in self.undetermined
+        if location.determined:
+            self.undetermined.discard(position)
+        else:
+            self.undetermined.add(position)
+            if self.entropy is not None:
+                self.entropy.push(position, location)
+        if self.candidates is not None:
+            update_candidates(self.candidates, position, old_domain if was_undetermined else 0,
+                              0 if location.determined else location.domain)
+        if self.changed is not None:
+            self.changed.add(position)
 
 
 @dataclass()
@@ -11,34 +139,86 @@ class Grid:
     grid: dict[Hex, Location]
     height: int
     width: int
+    history: "editing.EditHistory" = field(default=None, repr=False, compare=False)
 
     def is_complete(self):
         """
         Checks if every position in the grid has terrain determined
         :return: True if all positions on grid have their terrain determined, else false
         """
+        if isinstance(self.grid, Positions):
+            return len(self.grid.undetermined) == 0
         for location in list(self.grid.values()):
             if not location.determined:
                 return False
         return True
 
     def __str__(self):
-        i = 0
-        out, positions, locations = ("",) * 3
-        offset = -self.height//2 % 2 == 0
-        for position, location in self.grid.items():
-            locations += str(location)
-            positions += position.axial_string(location.longest)
-            i += 1
-            if i % self.width == 0:
-                leading_whitespace = f" {'':^{location.longest/2 + location.longest%2}}" if offset else ''
-                out += f"{leading_whitespace}{locations}\n{leading_whitespace}{positions}\n"
-                positions, locations = ("",) * 2
-                offset = not offset
-        return out
-
-
-def create_rectangle_hexmap(height, width, terrain_options):
+        return "".join(f"{line}\n" for line in text.render_lines(self))
+
+    def set_terrain(self, positions, terrain_option):
+        """
+        Sets the terrain of a position or region, determining the cells around it again where they don't allow it
+        :param positions: The position or positions to set
+        :type positions: Hex or Iterable[Hex]
+        :param Terrain terrain_option: The Terrain Type to set
+        :return: The changes made
+        :rtype: editing.Edit
+        """
+        return editing.set_terrain(self, positions, terrain_option)
+
+    def clear(self, positions):
+        """
+        Clears a position or region, leaving it with every option its neighbours allow
+        :param positions: The position or positions to clear
+        :type positions: Hex or Iterable[Hex]
+        :return: The changes made
+        :rtype: editing.Edit
+        """
+        return editing.clear(self, positions)
+
+    def reroll(self, positions):
+        """
+        Determines the terrain of a position or region again randomly
+        :param positions: The position or positions to re-roll
+        :type positions: Hex or Iterable[Hex]
+        :return: The changes made
+        :rtype: editing.Edit
+        """
+        return editing.reroll(self, positions)
+
+    def undo(self):
+        """
+        Undoes the last edit
+        :return: The edit undone, None if there are no edits to undo
+        :rtype: editing.Edit or None
+        """
+        return editing.undo(self)
+
+    def redo(self):
+        """
+        Redoes the last undone edit
+        :return: The edit redone, None if there are no edits to redo
+        :rtype: editing.Edit or None
+        """
+        return editing.redo(self)
+
+
+@dataclass()
+class Placement:
+    """
+    The result of placing terrain at a position
+    Truthy if the terrain was placed
+    """
+    position: Hex
+    placed: bool
+    revisions: int = 0
+
+    def __bool__(self):
+        return self.placed
+
+
+def create_rectangle_hexmap(height, width, terrain_options, backend="dict", rng=None):
     """
     Creates a grid of Hex positions to Terrain objects with
     the possible terrains passed in by terrain_options
@@ -47,12 +227,72 @@ def create_rectangle_hexmap(height, width, terrain_options):
     :param int height: The position to place the terrain
     :param int width: The map of Hex positions to Locations
     :param list[Terrain] terrain_options: The possible Terrain Types
+    :param str backend: "dict" for a Positions map of Locations, "array" for a numpy backed ArrayGrid
+    :param rng: The random number generator used when building on the map, the random module if None
+    :type rng: random.Random or None
     :return: Hex Positions to Locations
-    :rtype: dict[Hex, Location]
+    :rtype: Positions or ArrayGrid
+    """
+    # Compile the ruleset once so every Location on the map shares the same compatibility table
+    ruleset = compile_ruleset(terrain_options)
+    if backend == "array":
+        positions = arraygrid.ArrayGrid(height, width, ruleset)
+    elif backend == "dict":
+        # Dicts are ordered, so we can turn a list of positions into a dict of
+        # position to location, and know that the order will be maintained for printing later
+        domain = ruleset.mask_of(terrain_options)
+        determined = len(terrain_options) == 1
+        positions = Positions((position, Location.from_domain(ruleset, domain, determined))
+                              for position in hexgrid.build_rectangle_of_size(height, width))
+    else:
+        raise ValueError(f"Unknown map backend: {backend}")
+    if rng is not None:
+        positions.rng = rng
+    return positions
+
+
+def row_major(position):
+    """
+    Sort key that orders positions the same way as a rectangle map, by row then column
+    :param Hex position: The position to get the key for
+    :rtype: tuple[int, int]
+    """
+    return position.r, position.q
+
+
+def get_rng(positions):
+    """
+    Gets the random number generator used for random choices on the map
+    :param positions: The map of Hex positions to Locations
+    :return: The map's rng, the random module if it does not have one
+    :rtype: random.Random
+    """
+    return getattr(positions, "rng", random)
+
+
+def get_ruleset(positions):
+    """
+    Gets the compiled ruleset shared by the locations on the map
+    :param positions: The map of Hex positions to Locations
+    :return: The map's ruleset, None if the map is empty
+    :rtype: Ruleset or None
+    """
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.ruleset
+    return next(iter(positions.values())).ruleset if positions else None
+
+
+def get_cell_state(position, positions):
     """
-    # Dicts are ordered, so we can turn a list of positions into a dict of
-    # position to location, and know that the order will be maintained for printing later
-    return {position: Location(terrain_options) for position in hexgrid.build_rectangle_of_size(height, width)}
+    Gets the domain at a position and if it is determined
+    :param Hex position: The position to look up, which must be on the map
+    :param positions: The map of Hex positions to Locations
+    :rtype: tuple[int, bool]
+    """
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.cell_state(positions.index_of(position))
+    location = positions[position]
+    return location.domain, location.determined
 
 
 def get_neighbours(position, positions):
@@ -66,15 +306,112 @@ def get_neighbours(position, positions):
     return [neighbour for neighbour in hexgrid.hex_neighbors(position) if neighbour in positions]
 
 
+def unsupported_neighbours(changed, positions):
+    """
+    Checks that determined positions changed by a propagation are allowed by their determined neighbours
+    Revising a position only removes its own options, so a neighbour determined earlier may not
+    allow the terrain the position ends up with
+    :param list[Hex] changed: The positions that changed
+    :param dict[Hex, Location] positions: The map of Hex positions to Locations
+    :return: The first changed position a determined neighbour doesn't allow, None if there are none
+    :rtype: Hex or None
+    """
+    for position in changed:
+        location = positions[position]
+        if not location.determined:
+            continue
+        supports = location.ruleset.supports[location.domain]
+        for neighbour in get_neighbours(position, positions):
+            neighbour_location = positions[neighbour]
+            if neighbour_location.determined and not neighbour_location.domain & supports:
+                return position
+    return None
+
+
+def propagate(positions_to_update, positions):
+    """
+    Revises the specified positions until no more terrain options can be removed
+    Uses a de-duplicated worklist rather than recursion, and only the neighbours of
+    positions whose terrain options actually changed are revisited
+    If positions has a trail, every change is recorded on it, and a position left with no options,
+    or with terrain a determined neighbour doesn't allow, is a contradiction
+    :param positions_to_update: The positions to be revised first
+    :param dict[Hex, Location] positions: The map of Hex positions to Locations
+    :return: The number of revisions made
+    :rtype: int
+    :raises Contradiction: If positions has a trail and the propagation leads to a contradiction
+    """
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.propagate([positions.index_of(position) for position in positions_to_update])
+    queue = deque()
+    queued = set()
+    for position in positions_to_update:
+        if position not in queued:
+            queued.add(position)
+            queue.append(position)
+    tracked = isinstance(positions, Positions)
+    trail = positions.trail if tracked else None
+    stats = positions.stats.current if tracked and positions.stats is not None else None
+    # Steps each queued position is from the positions the propagation started at, only kept when profiling
+    depths = {} if stats is not None else None
+    changes = {}
+    contradiction = None
+    revisions = 0
+    while queue:
+        position = queue.popleft()
+        queued.discard(position)
+        location = positions[position]
+        if location.determined:
+            continue
+        old_domain = location.domain
+        revisions += 1
+        neighbours = get_neighbours(position, positions)
+        if stats is not None:
+            stats.revisions += 1
+            stats.constraint_checks += len(neighbours)
+        if location.revise([positions[neighbour] for neighbour in neighbours]):
+            if stats is not None:
+                stats.domain_changes += 1
+                depth = depths.get(position, 0) + 1
+                stats.deepest_cascade = max(stats.deepest_cascade, depth)
+            if tracked:
+                changes.setdefault(position, old_domain)
+                if trail is not None:
+                    trail.record(position, old_domain, False)
+                    # The contradiction is undone, so the rest of the map doesn't need updating
+                    if not location.domain:
+                        contradiction = position
+                        break
+                elif not location.domain:
+                    positions.contradictions += 1
+            for neighbour in neighbours:
+                if neighbour not in queued and not positions[neighbour].determined:
+                    queued.add(neighbour)
+                    queue.append(neighbour)
+                    if depths is not None:
+                        depths[neighbour] = depth
+    if trail is not None:
+        if contradiction is None:
+            contradiction = unsupported_neighbours(sorted(changes, key=row_major), positions)
+        if contradiction is not None:
+            # Changes are not reported, they are restored when the trail is undone
+            positions.contradictions += 1
+            raise Contradiction(contradiction)
+    # Report changes in row order, so the indexes end up the same whatever order the worklist ran in
+    for position in sorted(changes, key=row_major):
+        positions.location_changed(position, positions[position], changes[position])
+    return revisions
+
+
 def update_positions(positions_to_update, positions):
     """
-    Updates the specified positions
+    Updates the specified positions, and any positions affected by their changes
     :param positions_to_update: The positions to be updated
     :param positions: The whole collection of positions
-    :return:
+    :return: The number of revisions made
+    :rtype: int
     """
-    for position in positions_to_update:
-        update_terrain_options_for_position(position, positions)
+    return propagate(positions_to_update, positions)
 
 
 def update_neighbours(position, positions):
@@ -82,8 +419,10 @@ def update_neighbours(position, positions):
     Updates the locations of the position's neighbours
     :param position: Position to get neighbours of
     :param positions: Positions to get the neighbours from
+    :return: The number of revisions made
+    :rtype: int
     """
-    update_positions(get_neighbours(position, positions), positions)
+    return propagate(get_neighbours(position, positions), positions)
 
 
 def set_terrain_for_location(position, positions, terrain_option, update=True):
@@ -98,20 +437,32 @@ def set_terrain_for_location(position, positions, terrain_option, update=True):
     :param Terrain terrain_option: The Terrain Type to set
     :type terrain_option: Terrain or None
     :param boolean update: If true update all after setting terrain
-    :return: True if the location had its terrain set, false otherwise
-    :rtype: bool
+    :return: The placement, which is truthy if the location had its terrain set
+    :rtype: Placement
     """
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.set_terrain_for_location(position, terrain_option, update)
     if position is None:
-        position = random.choice(get_undetermined_positions(positions))
+        position = get_random_undetermined_position(positions)
     if position not in positions:
-        return False
+        return Placement(position, False)
     location = positions[position]
     if location.determined:
-        return False
-    location.determine_terrain_options(terrain_option)
-    if update:
-        update_neighbours(position, positions)
-    return True
+        return Placement(position, False)
+    old_domain = location.domain
+    if isinstance(positions, Positions) and positions.trail is not None:
+        positions.trail.record(position, old_domain, False)
+    location.determine_terrain_options(terrain_option, get_rng(positions))
+    if isinstance(positions, Positions):
+        positions.location_changed(position, location, old_domain)
+        if positions.stats is not None:
+            positions.stats.current.collapsed += 1
+        if positions.trail is not None and (not location.domain
+                                            or unsupported_neighbours([position], positions) is not None):
+            positions.contradictions += 1
+            raise Contradiction(position)
+    revisions = update_neighbours(position, positions) if update else 0
+    return Placement(position, True, revisions)
 
 
 def update_terrain_options_for_position(position, positions):
@@ -120,15 +471,185 @@ def update_terrain_options_for_position(position, positions):
     If the position is updated, updates neighbours
     :param Hex position: The position to place the terrain
     :param dict[Hex, Location] positions: The map of Hex positions to Locations
+    :return: The number of revisions made
+    :rtype: int
     """
-    changed = False
-    location = positions[position]
-    neighbours = get_neighbours(position, positions)
-    for neighbour in neighbours:
-        if location.update_terrain_options(positions[neighbour]):
-            changed = True
-    if changed:
-        update_positions(neighbours, positions)
+    return propagate([position], positions)
+
+
+def refute_choice(cell, positions, alternatives):
+    """
+    Narrows a cell to the options its undone choice did not take, and propagates the change
+    :param cell: The cell of the undone choice
+    :param positions: The map, with a trail
+    :type positions: Positions or ArrayGrid
+    :param int alternatives: Domain of the options that were not chosen
+    :return: True if the change propagated without a contradiction
+    :rtype: bool
+    """
+    positions.trail.record(cell, *positions.cell_state(cell))
+    positions.set_domain(cell, alternatives, not alternatives & (alternatives - 1))
+    position = positions.hex_at(cell) if isinstance(positions, arraygrid.ArrayGrid) else cell
+    try:
+        propagate([position] + get_neighbours(position, positions), positions)
+    except Contradiction:
+        return False
+    return True
+
+
+def backtrack(positions, limit):
+    """
+    Undoes choices until one can be refuted without a contradiction
+    The last choice is undone and its other options are tried, if none are left the choice before it is undone
+    :param positions: The map, with a trail
+    :type positions: Positions or ArrayGrid
+    :param int limit: Most choices to undo
+    :return: The number of choices undone
+    :rtype: int
+    :raises Contradiction: If there are no choices left to undo, or the limit is reached
+    """
+    key = None if isinstance(positions, arraygrid.ArrayGrid) else row_major
+    undone = 0
+    while undone < limit:
+        choice = positions.trail.undo(positions, key)
+        if choice is None:
+            raise Contradiction(None, "The map has no valid terrain, there are no choices left to undo")
+        undone += 1
+        positions.backtracks += 1
+        cell, alternatives = choice
+        if alternatives and refute_choice(cell, positions, alternatives):
+            return undone
+    raise Contradiction(None, "Reached the backtrack limit")
+
+
+def restart_area(positions, centre, radius):
+    """
+    Undoes every choice that changed a cell near a position, and makes the choices elsewhere on the map again
+    Choices are undone in order back to the first one in the area, then the later choices outside it are made again
+    as new choice points, which can't contradict as they were consistent with more choices than they are now
+    :param positions: The map, with a trail
+    :type positions: Positions or ArrayGrid
+    :param Hex centre: The position to restart around
+    :param float radius: Distance from the centre of the cells whose choices are undone, math.inf for the whole map
+    :return: The cells changed by the choices undone and not made again
+    :rtype: set[Hex]
+    """
+    is_array = isinstance(positions, arraygrid.ArrayGrid)
+    key = None if is_array else row_major
+    trail = positions.trail
+    hex_of = positions.hex_at if is_array else None
+    # The propagation of the last choice stopped part way at a contradiction, where depends on the backend,
+    # so only the cell of the choice is counted
+    ends = [start for start, _, _ in trail.choices[1:]] + [trail.choices[-1][0] + 1 if trail.choices else 0]
+    changed = [{hex_of(cell) if is_array else cell for cell, _, _ in trail.changes[start:end]}
+               for (start, _, _), end in zip(trail.choices, ends)]
+    near = [any(hexgrid.hex_distance(position, centre) <= radius for position in cells) for cells in changed]
+    # The last choice is always undone, as a failed backtrack leaves its cells part way through propagating
+    first = next((i for i, is_near in enumerate(near) if is_near), max(len(near) - 1, 0))
+    # The first change of a choice is its cell's domain before the choice
+    redo = [(hex_of(cell) if is_array else cell, trail.changes[start][1] & ~alternatives)
+            for (start, cell, alternatives), is_near in zip(trail.choices[first:], near[first:]) if not is_near]
+    restarted = set().union(*(cells for cells, is_near in zip(changed[first:], near[first:]) if is_near))
+    while len(trail) > first:
+        trail.undo(positions, key)
+    for position, chosen in redo:
+        cell = positions.index_of(position) if is_array else position
+        domain, determined = positions.cell_state(cell)
+        if determined or not domain & chosen:
+            continue
+        ruleset = positions.ruleset if is_array else positions[position].ruleset
+        trail.choose(cell, domain & ~chosen)
+        set_terrain_for_location(position, positions, ruleset.terrains[chosen.bit_length() - 1])
+    return restarted
+
+
+def complete_with_backtracking(positions, backtrack_limit=DEFAULT_BACKTRACK_LIMIT, lowest_entropy=False):
+    """
+    Determines every remaining position, undoing choices that lead to a contradiction
+    Makes the same random choices as repeatedly setting random terrain at random positions,
+    so maps that never hit a contradiction come out the same
+    The choice that caused a contradiction can be long before it, after many choices elsewhere on the map,
+    so once backtracking has undone RESTART_BACKTRACKS choices without getting past a contradiction
+    the choices around it are undone with restart_area instead, and made again by the carrying on random number
+    generator. The area is doubled when contradictions keep coming back to the cells it restarted, and the whole map
+    is started again when restarts stop getting any further, as some rulesets can only be completed one way
+    Contradictions, backtracks and restarts are counted on positions
+    :param positions: The map of Hex positions to Locations
+    :type positions: Positions or ArrayGrid
+    :param int backtrack_limit: Most choices to undo before giving up, counting those undone by restarts
+    :param bool lowest_entropy: If true choose the position with the fewest options left, else a random position
+    :return: The number of choices undone
+    :rtype: int
+    :raises Contradiction: If the map can't be completed within the backtrack limit
+    """
+    is_array = isinstance(positions, arraygrid.ArrayGrid)
+    rng = get_rng(positions)
+    trail = positions.trail = Trail()
+    backtracks = 0
+    restart_backtracks = 0
+    restarted = set()
+    fewest_undetermined = len(positions.undetermined)
+    unimproved = 0
+    patience = max(len(positions) // RESTART_PATIENCE, 1)
+    radius = RESTART_RADIUS
+    stalled = 0
+    try:
+        while positions.undetermined:
+            if lowest_entropy:
+                position = get_lowest_entropy_position(positions)
+            else:
+                position = get_random_undetermined_position(positions)
+            cell = positions.index_of(position) if is_array else position
+            domain, _ = positions.cell_state(cell)
+            ruleset = positions.ruleset if is_array else positions[position].ruleset
+            try:
+                if not domain:
+                    positions.contradictions += 1
+                    raise Contradiction(position)
+                terrain_option = ruleset.choose(domain, rng)
+                trail.choose(cell, domain & ~ruleset.bit(terrain_option))
+                set_terrain_for_location(position, positions, terrain_option)
+            except Contradiction:
+                limit = min(RESTART_BACKTRACKS - restart_backtracks, backtrack_limit - backtracks)
+                undone = positions.backtracks
+                try:
+                    undone = backtrack(positions, limit)
+                except Contradiction:
+                    undone = positions.backtracks - undone
+                    backtracks += undone
+                    # Running out of choices before the limit means every choice has been tried
+                    if undone < limit or backtracks >= backtrack_limit:
+                        raise
+                    positions.restarts += 1
+                    # The cell a propagation stops at depends on the backend, the cell that was chosen doesn't
+                    centre = position
+                    if len(positions.undetermined) < fewest_undetermined:
+                        fewest_undetermined = len(positions.undetermined)
+                        unimproved = 0
+                    unimproved += 1
+                    # Contradictions that come back to the cells of the last restart can't be fixed that locally
+                    if centre in restarted:
+                        stalled += 1
+                        if stalled > STALLED_RESTARTS:
+                            radius *= 2
+                            stalled = 0
+                    else:
+                        radius = RESTART_RADIUS
+                        stalled = 0
+                    restarted = restart_area(positions, centre, math.inf if unimproved > patience else radius)
+                    if not trail.choices:
+                        # The whole map was started again
+                        fewest_undetermined = len(positions.undetermined)
+                        unimproved = stalled = 0
+                        radius = RESTART_RADIUS
+                        restarted = set()
+                    restart_backtracks = 0
+                else:
+                    backtracks += undone
+                    restart_backtracks += undone
+    finally:
+        positions.trail = None
+    return backtracks
 
 
 def get_undetermined_positions(positions):
@@ -138,20 +659,92 @@ def get_undetermined_positions(positions):
     :return: positions that do not have determined terrain
     :rtype: dict[Hex, Location]
     """
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.get_undetermined_positions()
     return [position for position in positions if not positions[position].determined]
 
 
+def get_random_undetermined_position(positions):
+    """
+    Gets a random position that does not have determined terrain
+    Uses the undetermined index if positions keeps one, otherwise scans every position
+    :param dict[Hex, Location] positions: The map of Hex positions to Locations
+    :return: A random undetermined position
+    :rtype: Hex
+    """
+    rng = get_rng(positions)
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.hex_at(positions.undetermined.choice(rng))
+    if isinstance(positions, Positions):
+        return positions.undetermined.choice(rng)
+    return rng.choice(get_undetermined_positions(positions))
+
+
+def get_lowest_entropy_position(positions):
+    """
+    Gets the undetermined position with the fewest terrain options left
+    :param positions: The map of Hex positions to Locations
+    :type positions: Positions or ArrayGrid
+    :return: The most constrained position, None if every position is determined
+    :rtype: Hex or None
+    """
+    positions.track_entropy()
+    if isinstance(positions, arraygrid.ArrayGrid):
+        index = positions.entropy.pop(positions)
+        return positions.hex_at(index) if index is not None else None
+    return positions.entropy.pop(positions)
+
+
+def get_positions_for_terrain(terrain_option, positions):
+    """
+    Gets the undetermined positions that could have the terrain option
+    Uses the per-terrain candidate index if positions keeps one, otherwise scans every position
+    :param Terrain terrain_option: The terrain option to find positions for
+    :param dict[Hex, Location] positions: The map of Hex positions to Locations
+    :return: positions that could be specified terrain
+    :rtype: IndexedSet or list[Hex]
+    """
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.get_positions_for_terrain(terrain_option)
+    if isinstance(positions, Positions):
+        if not positions:
+            return []
+        ruleset = get_ruleset(positions)
+        positions.track_candidates(ruleset)
+        if terrain_option.name not in ruleset.ids:
+            return []
+        return positions.candidates[ruleset.ids[terrain_option.name]]
+    undetermined = get_undetermined_positions(positions)
+    return [position for position in undetermined if terrain_option in positions[position].terrain_options]
+
+
+def count_positions_for_terrain(terrain_option, positions):
+    """
+    Counts how many undetermined positions could still have the terrain option
+    :param Terrain terrain_option: The terrain option to count positions for
+    :param dict[Hex, Location] positions: The map of Hex positions to Locations
+    :return: The number of positions that could be specified terrain
+    :rtype: int
+    """
+    return len(get_positions_for_terrain(terrain_option, positions))
+
+
 def get_random_position_for_terrain(terrain_option, positions):
     """
     Gets random position that could have the terrain option
     :param Terrain terrain_option: The terrain option to find a position for
     :param dict[Hex, Location] positions: The map of Hex positions to Locations
-    :return: position that could be specified terrain
-    :rtype: Hex
+    :return: position that could be specified terrain, None if there are no such positions
+    :rtype: Hex or None
     """
-    undetermined = get_undetermined_positions(positions)
-    terrain_positions = [position for position in undetermined if terrain_option in positions[position].terrain_options]
-    return random.choice(terrain_positions)
+    if isinstance(positions, arraygrid.ArrayGrid):
+        return positions.get_random_position_for_terrain(terrain_option)
+    terrain_positions = get_positions_for_terrain(terrain_option, positions)
+    if not terrain_positions:
+        return None
+    if isinstance(terrain_positions, IndexedSet):
+        return terrain_positions.choice(get_rng(positions))
+    return get_rng(positions).choice(terrain_positions)
 
 
 def set_terrain_in_random_valid_position(terrain_option, positions):
@@ -159,14 +752,20 @@ def set_terrain_in_random_valid_position(terrain_option, positions):
     Places the specified terrain in a random valid position
     :param Terrain terrain_option: The Terrain Type to set
     :param dict[Hex, Location] positions: The map of Hex positions to Locations
+    :return: The placement, which is falsy if no position could have the terrain
+    :rtype: Placement
     """
-    set_terrain_for_location(get_random_position_for_terrain(terrain_option, positions), positions, terrain_option)
+    position = get_random_position_for_terrain(terrain_option, positions)
+    if position is None:
+        return Placement(position, False)
+    return set_terrain_for_location(position, positions, terrain_option)
 
 
 def place_terrain_hex_shape(terrain_option, positions, radius, center=None):
     """
     Places a hex shaped pattern of terrain, starting at the specified center
     If no center is specified then a position will be chosen randomly
+    Cells that are already determined are skipped, use stamping.stamp_features to have them reported
     :param Terrain terrain_option: The Terrain Type to set
     :param dict[Hex, Location] positions: The map of Hex positions to Locations
     :param int radius: The radius of the hex pattern
@@ -176,8 +775,13 @@ def place_terrain_hex_shape(terrain_option, positions, radius, center=None):
     """
     if not center:
         center = get_random_position_for_terrain(terrain_option, positions)
-    for position in hexgrid.get_all_hexes_within_range(center, radius):
-        set_terrain_for_location(position, positions, terrain_option, False)
+        if center is None:
+            return
+    placed = [position for position in hexgrid.get_all_hexes_within_range(center, radius)
+              if set_terrain_for_location(position, positions, terrain_option, False)]
+    # Propagate once from around the whole shape, rather than after every cell
+    frontier = {neighbour for position in placed for neighbour in get_neighbours(position, positions)}
+    propagate(sorted(frontier.difference(placed), key=row_major), positions)
 
 
 def place_terrain_staggered_wall_shape(terrain_option, positions, steps,
@@ -198,6 +802,8 @@ def place_terrain_staggered_wall_shape(terrain_option, positions, steps,
     # Choose position randomly if no position is given
     if start is None:
         current_position = get_random_position_for_terrain(terrain_option, positions)
+        if current_position is None:
+            return
     else:
         current_position = start
 
@@ -205,6 +811,8 @@ def place_terrain_staggered_wall_shape(terrain_option, positions, steps,
     if not set_terrain_for_location(current_position, positions, terrain_option):
         return
 
+    rng = get_rng(positions)
+
     # For each step:
     #   Take step in direction
     #   Set the current position terrain
@@ -216,12 +824,12 @@ def place_terrain_staggered_wall_shape(terrain_option, positions, steps,
         current_position = hexgrid.hex_neighbor(current_position, direction)
         if not set_terrain_for_location(current_position, positions, terrain_option):
             return
-        if random.random() <= spawn_chance:
+        if rng.random() <= spawn_chance:
             spawn_chance = spawn_chance / 2
-            if random.random() <= turn_chance:
-                new_direction = (direction + 1 if random.random() < 0.5 else -1) % 6
+            if rng.random() <= turn_chance:
+                new_direction = (direction + 1 if rng.random() < 0.5 else -1) % 6
             else:
                 new_direction = direction
-            new_start = hexgrid.hex_neighbor(current_position, (direction + random.choice([1, 2, 4, 5])) % 6)
+            new_start = hexgrid.hex_neighbor(current_position, (direction + rng.choice([1, 2, 4, 5])) % 6)
             place_terrain_staggered_wall_shape(terrain_option, positions, steps, new_direction, spawn_chance,
                                                turn_chance, new_start)
@@ -0,0 +1,314 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import functools
+import itertools
+import os
+import random
+from hexmap.cartographer import builder
+from hexmap.cartographer.location import Location
+from hexmap.cartographer.trail import Contradiction
+from hexmap.features import terrain
+from hexmap.features.ruleset import compile_ruleset
+from hexmap.math import hexgrid
+from hexmap.math.hexgrid import Hex
+
+
+@dataclass()
+class Chunk:
+    """
+    A square block of a chunked map
+    Covers rows row * size to (row + 1) * size - 1 and columns column * size to (column + 1) * size - 1,
+    in the same offset layout as hexgrid.build_rectangle
+    stamped holds the cells determined by populate, such as towns, which reconciling the seams leaves alone
+    """
+    column: int
+    row: int
+    size: int
+    positions: dict[Hex, Location]
+    stamped: set[Hex] = field(default_factory=set)
+
+    @property
+    def top(self):
+        return self.row * self.size
+
+    @property
+    def left(self):
+        return self.column * self.size
+
+
+def chunk_positions(column, row, size):
+    """
+    Gets the positions in a chunk
+    :param int column: Column of the chunk
+    :param int row: Row of the chunk
+    :param int size: Width and height of every chunk
+    :return: The positions in the chunk, in row order
+    :rtype: list[Hex]
+    """
+    return hexgrid.build_rectangle(row * size, (row + 1) * size - 1, column * size, (column + 1) * size - 1)
+
+
+def offset_column(position):
+    """
+    :param Hex position:
+    :return: The column of the position in the offset layout used by chunks
+    :rtype: int
+    """
+    return position.q + position.r // 2
+
+
+def chunk_rng(seed, column, row, stage="chunk"):
+    """
+    Creates the random number generator for one stage of one chunk
+    The generator only depends on the master seed and the chunk coordinates,
+    so a chunk comes out the same whichever process or order it is generated in
+    :param seed: The master seed of the map
+    :param int column: Column of the chunk
+    :param int row: Row of the chunk
+    :param str stage: What the generator is used for, e.g. "chunk" or "seam"
+    :rtype: random.Random
+    """
+    return random.Random(f"{seed}:{stage}:{column}:{row}")
+
+
+def fill_positions(cells, fixed, terrain_options, rng=None, populate=None):
+    """
+    Determines the terrain of new cells, constrained by the fixed cells next to them
+    :param list[Hex] cells: The positions to determine
+    :param dict[Hex, Location] fixed: Determined cells the new cells must be valid next to
+    :param list[Terrain] terrain_options: The possible Terrain Types
+    :param rng: The random number generator to use, the random module if None
+    :type rng: random.Random or None
+    :param populate: Called with the positions to place features before they are completed
+    :type populate: callable or None
+    :return: The determined cells
+    :rtype: builder.Positions
+    """
+    ruleset = compile_ruleset(terrain_options)
+    positions = builder.Positions((position, Location(terrain_options, ruleset)) for position in cells)
+    if rng is not None:
+        positions.rng = rng
+    # Fixed cells are added as determined positions, so the builder never changes them
+    ghosts = {}
+    for position in cells:
+        for neighbour in hexgrid.hex_neighbors(position):
+            if neighbour in fixed and neighbour not in positions:
+                ghosts[neighbour] = fixed[neighbour]
+    positions.update(ghosts)
+    builder.update_positions([position for position in cells
+                              if any(neighbour in ghosts for neighbour in hexgrid.hex_neighbors(position))],
+                             positions)
+    if populate is not None:
+        populate(positions)
+    builder.complete_with_backtracking(positions)
+    for ghost in ghosts:
+        del positions[ghost]
+    return positions
+
+
+def generate_chunk(column, row, size, terrain_options, border, populate=None, rng=None):
+    """
+    Generates a single chunk, constrained by the already determined border cells of its neighbours
+    :param int column: Column of the chunk
+    :param int row: Row of the chunk
+    :param int size: Width and height of every chunk
+    :param list[Terrain] terrain_options: The possible Terrain Types
+    :param dict[Hex, Location] border: Determined cells of neighbouring chunks, that this chunk may touch
+    :param populate: Called with the chunk's positions to place features before it is completed
+    :type populate: callable or None
+    :param rng: The random number generator to use, the random module if None
+    :type rng: random.Random or None
+    :return: The completed chunk
+    :rtype: Chunk
+    """
+    cells = chunk_positions(column, row, size)
+    stamped = set()
+
+    def populate_chunk(positions):
+        populate(positions)
+        stamped.update(position for position in cells if positions[position].determined)
+    positions = fill_positions(cells, border, terrain_options, rng, populate_chunk if populate is not None else None)
+    return Chunk(column, row, size, positions, stamped)
+
+
+def update_border(border, chunk, columns):
+    """
+    Adds the edges of a completed chunk to the border, and drops cells no later chunk can touch
+    Only the bottom row of the previous row of chunks and the right edges of the current row are kept,
+    so the border never holds more than about two map widths of cells
+    :param dict[Hex, Location] border: Determined cells of completed chunks
+    :param Chunk chunk: The chunk just completed
+    :param int columns: Number of chunks in each row
+    """
+    bottom = chunk.top + chunk.size - 1
+    right = chunk.left + chunk.size - 1
+    border.update((position, location) for position, location in chunk.positions.items()
+                  if position.r == bottom or offset_column(position) == right)
+    if chunk.column == columns - 1:
+        for position in [position for position in border if position.r != bottom]:
+            del border[position]
+
+
+def chunk_coordinates(columns, rows):
+    """
+    :param int columns: Number of chunks in each row
+    :param rows: Number of rows of chunks, forever if None
+    :type rows: int or None
+    :return: (column, row) of every chunk, in row order
+    :rtype: Iterator[tuple[int, int]]
+    """
+    for row in itertools.count() if rows is None else range(rows):
+        for column in range(columns):
+            yield column, row
+
+
+def generate_chunks(size, columns, rows=None, terrain_options=None, populate=None, seed=None):
+    """
+    Generates a map chunk by chunk, in row order, yielding each chunk once it is complete
+    Only the cells along the bottom and right edges of generated chunks are kept to constrain
+    later chunks, so memory stays bounded by the map width however many rows are generated
+    :param int size: Width and height of every chunk
+    :param int columns: Number of chunks in each row
+    :param rows: Number of rows of chunks, generate rows forever if None
+    :type rows: int or None
+    :param terrain_options: The possible Terrain Types, the default terrain if None
+    :type terrain_options: list[Terrain] or None
+    :param populate: Called with each chunk's positions to place features before it is completed
+    :type populate: callable or None
+    :param seed: Master seed each chunk's random number generator is derived from, the random module if None
+    :return: Generator of completed chunks
+    :rtype: Iterator[Chunk]
+    """
+    if terrain_options is None:
+        terrain_options = terrain.get_default_terrain()
+    border = {}
+    for column, row in chunk_coordinates(columns, rows):
+        rng = chunk_rng(seed, column, row) if seed is not None else None
+        chunk = generate_chunk(column, row, size, terrain_options, border, populate, rng)
+        update_border(border, chunk, columns)
+        yield chunk
+
+
+def generate_independent_chunk(coordinates, size, terrain_options, populate, seed):
+    """
+    Generates a chunk without any border, for generate_chunks_parallel
+    :param tuple[int, int] coordinates: (column, row) of the chunk
+    :param int size: Width and height of every chunk
+    :param list[Terrain] terrain_options: The possible Terrain Types
+    :param populate: Called with the chunk's positions to place features before it is completed
+    :type populate: callable or None
+    :param seed: Master seed of the map
+    :rtype: Chunk
+    """
+    column, row = coordinates
+    return generate_chunk(column, row, size, terrain_options, {}, populate, chunk_rng(seed, column, row))
+
+
+def compatible(location, neighbour):
+    """
+    Checks two neighbouring locations allow each other
+    :param Location location:
+    :param Location neighbour:
+    :return: True if each location has an option the other's options can sit next to
+    :rtype: bool
+    """
+    supports = location.ruleset.supports
+    return bool(location.domain & supports[neighbour.domain]) and bool(neighbour.domain & supports[location.domain])
+
+
+def reconcile_chunk(chunk, border, terrain_options, rng=None):
+    """
+    Fixes the seams between a chunk generated on its own and the completed chunks around it
+    Cells of the chunk that conflict with a border cell are cleared and determined again, with the border and the
+    rest of the chunk held fixed, growing the cleared band a ring of the chunk's cells at a time only while it
+    can't be determined, so a seam costs about as much as its conflicts
+    Stamped cells are never added to the band, only cleared if they conflict with the border themselves,
+    as the border is already complete
+    :param Chunk chunk: The chunk to reconcile
+    :param dict[Hex, Location] border: Determined cells of completed neighbouring chunks
+    :param list[Terrain] terrain_options: The possible Terrain Types
+    :param rng: The random number generator to use, the random module if None
+    :type rng: random.Random or None
+    :return: The number of cells that were determined again
+    :rtype: int
+    :raises Contradiction: If the band can't be determined even once it covers every unstamped cell of the chunk
+    """
+    band = {position for position, location in chunk.positions.items()
+            if any(neighbour in border and not compatible(location, border[neighbour])
+                   for neighbour in hexgrid.hex_neighbors(position))}
+    if not band:
+        return 0
+    chunk.stamped -= band
+    fixed = dict(border)
+    fixed.update(chunk.positions)
+    while True:
+        try:
+            filled = fill_positions(sorted(band, key=builder.row_major), fixed, terrain_options, rng)
+            break
+        except Contradiction:
+            ring = {neighbour for position in band for neighbour in hexgrid.hex_neighbors(position)
+                    if neighbour in chunk.positions and neighbour not in band and neighbour not in chunk.stamped}
+            if not ring:
+                raise
+            band |= ring
+    chunk.positions.update(filled)
+    return len(band)
+
+
+def map_in_order(function, items, workers):
+    """
+    Maps function over items in a process pool, yielding results in order
+    Only a few tasks per worker are submitted ahead, so unbounded items do not queue up in memory
+    :param function: Picklable function to call with each item
+    :param items: Items to map over
+    :param int workers: Number of worker processes, the function is called in this process if 1 or less
+    :return: Generator of results
+    """
+    if workers <= 1:
+        yield from map(function, items)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_chunks_parallel(size, columns, rows=None, seed=None, workers=None, terrain_options=None,
+                             populate=None):
+    """
+    Generates a map in a process pool, yielding each chunk in row order once its seams are reconciled
+    Every chunk is generated independently from its own random number generator, derived from the
+    master seed and its coordinates, then reconciled against its completed neighbours with another
+    derived generator, so the map for a seed is the same whatever the number of workers
+    :param int size: Width and height of every chunk
+    :param int columns: Number of chunks in each row
+    :param rows: Number of rows of chunks, generate rows forever if None
+    :type rows: int or None
+    :param seed: Master seed of the map, chosen randomly if None
+    :param workers: Number of worker processes, the number of CPUs if None
+    :type workers: int or None
+    :param terrain_options: The possible Terrain Types, the default terrain if None
+    :type terrain_options: list[Terrain] or None
+    :param populate: Picklable function called with each chunk's positions to place features
+    :type populate: callable or None
+    :return: Generator of completed chunks
+    :rtype: Iterator[Chunk]
+    """
+    if terrain_options is None:
+        terrain_options = terrain.get_default_terrain()
+    if seed is None:
+        seed = random.randrange(1 << 63)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    task = functools.partial(generate_independent_chunk, size=size, terrain_options=terrain_options,
+                             populate=populate, seed=seed)
+    border = {}
+    for chunk in map_in_order(task, chunk_coordinates(columns, rows), workers):
+        reconcile_chunk(chunk, border, terrain_options, chunk_rng(seed, chunk.column, chunk.row, "seam"))
+        update_border(border, chunk, columns)
+        yield chunk
@@ -0,0 +1,299 @@
+"""
+Editing maps after they are generated
+An edit sets, clears or re-rolls cells, then relaxes only the neighbouring cells that conflict with it and determines
+them again, growing the relaxed area a ring at a time only while it can't be made consistent,
+so the cost of an edit depends on the size of the edit rather than the size of the map
+Each edit is kept as the domain changes it made, which are undone and redone without propagating again
+"""
+from dataclasses import dataclass, field
+from hexmap.cartographer import builder
+from hexmap.cartographer.trail import Contradiction, Trail
+from hexmap.math.hexgrid import Hex
+
+# Most rings of neighbouring cells an edit relaxes before giving up
+DEFAULT_RELAX_LIMIT = 8
+# Most edits kept to undo
+DEFAULT_HISTORY_LIMIT = 100
+
+
+@dataclass()
+class Edit:
+    """
+    The changes an edit made, as (position, old domain, old determined, new domain, new determined) in row order
+    """
+    changes: list[tuple[Hex, int, bool, int, bool]]
+    # Number of cells around the edited cells that were relaxed and determined again
+    relaxed: int = 0
+
+
+@dataclass()
+class EditHistory:
+    """
+    Edits that can be undone, and undone edits that can be redone
+    """
+    undo: list[Edit] = field(default_factory=list)
+    redo: list[Edit] = field(default_factory=list)
+    limit: int = DEFAULT_HISTORY_LIMIT
+
+    def push(self, edit):
+        """
+        Records a new edit, which can't be followed by redoing earlier undone edits
+        :param Edit edit:
+        """
+        self.undo.append(edit)
+        if len(self.undo) > self.limit:
+            del self.undo[:len(self.undo) - self.limit]
+        self.redo.clear()
+
+
+def history_of(grid):
+    """
+    :param builder.Grid grid: The map
+    :return: The map's edit history, created on first use
+    :rtype: EditHistory
+    """
+    if grid.history is None:
+        grid.history = EditHistory()
+    return grid.history
+
+
+def editable_positions(grid):
+    """
+    Gets the map's positions, replacing a plain dict with Positions so the builder functions keep its indexes
+    :param builder.Grid grid: The map
+    :rtype: builder.Positions
+    """
+    if not isinstance(grid.grid, builder.Positions):
+        grid.grid = builder.Positions(grid.grid)
+    return grid.grid
+
+
+def conflicts_with(position, positions, ignored):
+    """
+    Gets the determined neighbours of a determined position that don't allow it, or that it doesn't allow
+    :param Hex position:
+    :param builder.Positions positions: The map of Hex positions to Locations
+    :param ignored: Neighbours to leave out
+    :type ignored: set[Hex] or dict[Hex, object]
+    :rtype: list[Hex]
+    """
+    location = positions[position]
+    supports = location.ruleset.supports
+    conflicts = []
+    for neighbour in builder.get_neighbours(position, positions):
+        neighbour_location = positions[neighbour]
+        if (neighbour not in ignored and neighbour_location.determined
+                and not (neighbour_location.domain & supports[location.domain]
+                         and location.domain & supports[neighbour_location.domain])):
+            conflicts.append(neighbour)
+    return conflicts
+
+
+def complete_cells(cells, positions, backtrack_limit):
+    """
+    Determines the undetermined cells of a part of the map, the same way as builder.complete_with_backtracking
+    :param list[Hex] cells: The cells to determine, in row order
+    :param builder.Positions positions: The map, with a trail
+    :param int backtrack_limit: Most choices to undo before giving up
+    :raises Contradiction: If the cells can't be determined within the backtrack limit
+    """
+    rng = builder.get_rng(positions)
+    backtracks = 0
+    while True:
+        remaining = [cell for cell in cells if not positions[cell].determined]
+        if not remaining:
+            return
+        position = rng.choice(remaining)
+        location = positions[position]
+        try:
+            if not location.domain:
+                positions.contradictions += 1
+                raise Contradiction(position)
+            terrain_option = location.ruleset.choose(location.domain, rng)
+            positions.trail.choose(position, location.domain & ~location.ruleset.bit(terrain_option))
+            builder.set_terrain_for_location(position, positions, terrain_option)
+        except Contradiction:
+            backtracks += builder.backtrack(positions, backtrack_limit - backtracks)
+
+
+def edit_cells(grid, states, complete, relax_limit=DEFAULT_RELAX_LIMIT, backtrack_limit=None):
+    """
+    Changes cells of a map, and relaxes and determines again the cells around them that conflict with the change
+    The relaxed cells start as the determined neighbours that conflict with the edited cells, and grow by a ring
+    of determined cells each time they can't be determined consistently
+    :param builder.Grid grid: The map
+    :param dict[Hex, tuple[int, bool]] states: The new domain of each edited position, and if it is determined
+    :param bool complete: If true determine the edited positions left undetermined
+    :param int relax_limit: Most rings of cells to relax
+    :param backtrack_limit: Most choices to undo while determining each ring, builder.DEFAULT_BACKTRACK_LIMIT if None
+    :type backtrack_limit: int or None
+    :return: The changes made, which are added to the map's edit history
+    :rtype: Edit
+    :raises ValueError: If an edited position is not on the map
+    :raises Contradiction: If the edit can't be made within the relax limit, the map is left unchanged
+    """
+    if backtrack_limit is None:
+        backtrack_limit = builder.DEFAULT_BACKTRACK_LIMIT
+    positions = editable_positions(grid)
+    edited = sorted(states, key=builder.row_major)
+    for position in edited:
+        if position not in positions:
+            raise ValueError(f"{position} is not on the map")
+        domain, determined = states[position]
+        if determined:
+            # Relaxing cells around the edit can't fix edited cells that don't allow each other
+            supports = positions[position].ruleset.supports[domain]
+            for neighbour in builder.get_neighbours(position, positions):
+                if neighbour in states and states[neighbour][1] and not states[neighbour][0] & supports:
+                    raise Contradiction(position, f"The terrain set at {position} doesn't allow the terrain set "
+                                                  f"at {neighbour}")
+    trail = positions.trail = Trail()
+    relaxed = set()
+    try:
+        for _ in range(relax_limit + 1):
+            # Every change of an attempt is undone through this choice point if it fails
+            trail.choose(None, 0)
+            try:
+                for position in edited:
+                    trail.record(position, *positions.cell_state(position))
+                    positions.set_domain(position, *states[position])
+                for position in edited:
+                    if positions[position].determined:
+                        relaxed.update(conflicts_with(position, positions, states))
+                relaxed_cells = sorted(relaxed, key=builder.row_major)
+                for position in relaxed_cells:
+                    trail.record(position, *positions.cell_state(position))
+                    positions.set_domain(position, positions[position].ruleset.full, False)
+                frontier = edited + relaxed_cells
+                builder.propagate(frontier + [neighbour for position in frontier
+                                              for neighbour in builder.get_neighbours(position, positions)],
+                                  positions)
+                for position in edited:
+                    if positions[position].determined and conflicts_with(position, positions, ()):
+                        raise Contradiction(position)
+                complete_cells(frontier if complete else relaxed_cells, positions, backtrack_limit)
+                break
+            except Contradiction:
+                while trail.choices:
+                    trail.undo(positions, builder.row_major)
+                # Relax the next ring of determined cells around the edit
+                relaxed.update(neighbour for position in edited + list(relaxed)
+                               for neighbour in builder.get_neighbours(position, positions)
+                               if neighbour not in states and positions[neighbour].determined)
+        else:
+            raise Contradiction(None, f"The edit can't be made by relaxing {relax_limit} rings of the map around it")
+        old_states = {}
+        for cell, domain, determined in trail.changes:
+            old_states.setdefault(cell, (domain, determined))
+    finally:
+        positions.trail = None
+    changes = []
+    for position in sorted(old_states, key=builder.row_major):
+        new_state = positions.cell_state(position)
+        if new_state != old_states[position]:
+            changes.append((position, *old_states[position], *new_state))
+    edit = Edit(changes, len(relaxed))
+    history_of(grid).push(edit)
+    return edit
+
+
+def on_map(grid, positions):
+    """
+    :param builder.Grid grid: The map
+    :param positions: A position or positions
+    :type positions: Hex or Iterable[Hex]
+    :return: The positions that are on the map
+    :rtype: list[Hex]
+    """
+    map_positions = editable_positions(grid)
+    return [position for position in ([positions] if isinstance(positions, Hex) else positions)
+            if position in map_positions]
+
+
+def set_terrain(grid, positions, terrain_option, **limits):
+    """
+    Sets the terrain of positions, and determines again the cells around them that don't allow it
+    Positions that are not on the map are ignored
+    :param builder.Grid grid: The map
+    :param positions: The position or positions to set
+    :type positions: Hex or Iterable[Hex]
+    :param Terrain terrain_option: The Terrain Type to set
+    :param limits: relax_limit and backtrack_limit for edit_cells
+    :rtype: Edit
+    """
+    return edit_cells(grid, {position: (grid.grid[position].ruleset.bit(terrain_option), True)
+                             for position in on_map(grid, positions)}, False, **limits)
+
+
+def clear(grid, positions, **limits):
+    """
+    Clears positions, leaving them with every option their neighbours allow
+    Positions that are not on the map are ignored
+    :param builder.Grid grid: The map
+    :param positions: The position or positions to clear
+    :type positions: Hex or Iterable[Hex]
+    :param limits: relax_limit and backtrack_limit for edit_cells
+    :rtype: Edit
+    """
+    return edit_cells(grid, {position: (grid.grid[position].ruleset.full, False)
+                             for position in on_map(grid, positions)}, False, **limits)
+
+
+def reroll(grid, positions, **limits):
+    """
+    Clears positions and determines them again randomly
+    Positions that are not on the map are ignored
+    :param builder.Grid grid: The map
+    :param positions: The position or positions to re-roll
+    :type positions: Hex or Iterable[Hex]
+    :param limits: relax_limit and backtrack_limit for edit_cells
+    :rtype: Edit
+    """
+    return edit_cells(grid, {position: (grid.grid[position].ruleset.full, False)
+                             for position in on_map(grid, positions)}, True, **limits)
+
+
+def apply_changes(grid, edit, undo):
+    """
+    :param builder.Grid grid: The map
+    :param Edit edit: The edit to apply or undo
+    :param bool undo: If true restore the old states, else set the new states
+    """
+    positions = editable_positions(grid)
+    for position, old_domain, old_determined, new_domain, new_determined in edit.changes:
+        if undo:
+            positions.set_domain(position, old_domain, old_determined)
+        else:
+            positions.set_domain(position, new_domain, new_determined)
+
+
+def undo(grid):
+    """
+    Undoes the last edit
+    :param builder.Grid grid: The map
+    :return: The edit undone, None if there are no edits to undo
+    :rtype: Edit or None
+    """
+    history = history_of(grid)
+    if not history.undo:
+        return None
+    edit = history.undo.pop()
+    apply_changes(grid, edit, True)
+    history.redo.append(edit)
+    return edit
+
+
+def redo(grid):
+    """
+    Redoes the last undone edit
+    :param builder.Grid grid: The map
+    :return: The edit redone, None if there are no edits to redo
+    :rtype: Edit or None
+    """
+    history = history_of(grid)
+    if not history.redo:
+        return None
+    edit = history.redo.pop()
+    apply_changes(grid, edit, False)
+    history.undo.append(edit)
+    return edit
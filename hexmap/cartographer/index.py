@@ -0,0 +1,135 @@
+import heapq
+import random
+
+
+class IndexedSet:
+    """
+    A set of positions that supports O(1) add, removal, membership tests and random choice
+    Items are held in an array, with a map from item to array index, and removed by swapping
+    the last item into the removed item's slot
+    """
+
+    def __init__(self, items=()):
+        self.items = list(dict.fromkeys(items))
+        self.indexes = {item: index for index, item in enumerate(self.items)}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.indexes
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def add(self, item):
+        """
+        Adds an item to the set, does nothing if it is already present
+        :param item: The item to add
+        """
+        if item not in self.indexes:
+            self.indexes[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        """
+        Removes an item from the set, does nothing if it is not present
+        :param item: The item to remove
+        """
+        index = self.indexes.pop(item, None)
+        if index is None:
+            return
+        last = self.items.pop()
+        if index < len(self.items):
+            self.items[index] = last
+            self.indexes[last] = index
+
+    def choice(self, rng=random):
+        """
+        Chooses a random item from the set
+        :param rng: The random number generator to choose with
+        :type rng: random.Random
+        :return: A random item
+        """
+        return rng.choice(self.items)
+
+
+def update_candidates(candidates, item, old_members, new_members):
+    """
+    Moves an item between per-terrain candidate sets after its domain changes
+    Only the terrain bits that were added or removed are walked
+    :param list[IndexedSet] candidates: The candidate set for each terrain ID
+    :param item: The item that changed
+    :param int old_members: Domain of terrains the item was a candidate for
+    :param int new_members: Domain of terrains the item is now a candidate for
+    """
+    changed = old_members ^ new_members
+    while changed:
+        bit = changed & -changed
+        changed ^= bit
+        if new_members & bit:
+            candidates[bit.bit_length() - 1].add(item)
+        else:
+            candidates[bit.bit_length() - 1].discard(item)
+
+
+class EntropyHeap:
+    """
+    Min-heap of undetermined positions ordered by how many terrain options they have left
+    Entries are not removed when a position changes, instead a new entry is pushed and
+    stale entries are skipped when they reach the top of the heap
+    """
+
+    def __init__(self, positions=None):
+        """
+        :param positions: Positions to add to the heap
+        :type positions: dict[Hex, Location] or None
+        """
+        self.heap = []
+        self.pushes = 0
+        if positions is not None:
+            for position, location in positions.items():
+                self.push(position, location)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, position, location):
+        """
+        Adds an entry for the position with the location's current terrain options
+        :param Hex position: The position that changed
+        :param Location location: The location at the position
+        """
+        if not location.determined:
+            self.push_domain(position, location.domain)
+
+    def push_domain(self, item, domain):
+        """
+        Adds an entry for an undetermined position or cell with its current domain
+        :param item: The position, or the cell index of an ArrayGrid
+        :param int domain: The domain of the position
+        """
+        # The push count breaks ties so positions themselves are never compared
+        self.pushes += 1
+        heapq.heappush(self.heap, (domain.bit_count(), self.pushes, item, domain))
+
+    def pop(self, positions):
+        """
+        Removes and returns the undetermined position with the fewest terrain options
+        :param positions: The map of Hex positions to Locations, or the ArrayGrid whose cell indexes are in the heap
+        :type positions: dict[Hex, Location] or ArrayGrid
+        :return: The most constrained position or cell index, None if no positions are undetermined
+        :rtype: Hex or int or None
+        """
+        while self.heap:
+            _, _, item, domain = heapq.heappop(self.heap)
+            if isinstance(positions, dict):
+                location = positions.get(item)
+                if location is None:
+                    continue
+                current, determined = location.domain, location.determined
+            else:
+                current, determined = positions.cell_state(item)
+            if not determined and current == domain:
+                return item
+        return None
@@ -1,13 +1,63 @@
 import random
 
-from hexmap.features import terrain
+from hexmap.features.ruleset import compile_ruleset
 
 
 class Location:
-    def __init__(self, terrain_options):
-        self.terrain_options = terrain_options
-        self.longest = len(max(terrain_options, key=len))
-        self.determined = len(self.terrain_options) == 1
+    """
+    The terrain options of one position on a map
+    Only the ruleset, domain and determined flag are kept on each Location, in slots rather than an instance dict,
+    the terrain options and name lengths are looked up in the ruleset every Location of a map shares
+    """
+    __slots__ = ("ruleset", "domain", "determined")
+
+    def __init__(self, terrain_options, ruleset=None):
+        """
+        :param list[Terrain] terrain_options: The possible Terrain Types for this Location
+        :param ruleset: The compiled ruleset the terrain options belong to, compiled from terrain_options if None
+        :type ruleset: Ruleset or None
+        """
+        if ruleset is None:
+            ruleset = compile_ruleset(terrain_options)
+        self.ruleset = ruleset
+        self.domain = ruleset.mask_of(terrain_options)
+        self.determined = len(terrain_options) == 1
+
+    @classmethod
+    def from_domain(cls, ruleset, domain, determined):
+        """
+        Creates a Location directly from a compiled domain
+        :param Ruleset ruleset: The compiled ruleset the domain belongs to
+        :param int domain: Domain bitmask of the possible Terrain Types
+        :param bool determined: If the Location's terrain is determined
+        :rtype: Location
+        """
+        location = cls.__new__(cls)
+        location.ruleset = ruleset
+        location.domain = domain
+        location.determined = determined
+        return location
+
+    @property
+    def longest(self):
+        """
+        Length of the longest terrain name in the ruleset, the width every Location of a map is rendered at
+        :rtype: int
+        """
+        return self.ruleset.longest
+
+    @property
+    def terrain_options(self):
+        """
+        The Terrain Types this Location could still be, in ruleset order
+        Shared by every Location with the same domain, so it must not be changed
+        :rtype: tuple[Terrain, ...]
+        """
+        return self.ruleset.terrains_of(self.domain)
+
+    @terrain_options.setter
+    def terrain_options(self, terrain_options):
+        self.domain = self.ruleset.mask_of(terrain_options)
 
     def __repr__(self):
         if self.determined:
@@ -17,23 +67,28 @@ class Location:
 
     def __str__(self):
         if self.determined:
-            terrain_string = str(self.terrain_options[0])
-            size = self.longest + len(terrain_string) - len(self.terrain_options[0])
+            terrain_option = self.terrain_options[0]
+            terrain_string = str(terrain_option)
+            size = self.longest + len(terrain_string) - len(terrain_option)
             return f"({terrain_string:^{size}})"
         else:
             return f"({'?':^{self.longest}})"
 
-    def determine_terrain_options(self, terrain_option):
+    def determine_terrain_options(self, terrain_option, rng=random):
         """
         Sets the terrain_options to a single option
-        If option specified is None, select the option from available options
+        If option specified is None, select the option from available options by weight
         :param terrain_option: The terrain to set for this location
         :type terrain_option: Terrain or None
+        :param rng: The random number generator to select the option with
+        :type rng: random.Random
         :return:
         """
-        if terrain_option is None and self.terrain_options:
-            terrain_option = random.choice(self.terrain_options)
-        self.terrain_options = [terrain_option]
+        if terrain_option is None:
+            if self.domain:
+                self.domain = self.ruleset.bit(self.ruleset.choose(self.domain, rng))
+        else:
+            self.domain = self.ruleset.bit(terrain_option)
         self.determined = True
 
     def set_terrain_options(self, terrain_options):
@@ -41,23 +96,44 @@ class Location:
         Set the terrain options for this Location
         :param list[Terrain] terrain_options: The Terrain Types to set for this Location
         """
-        self.terrain_options = terrain_options
-        self.determined = len(self.terrain_options) == 1
+        self.domain = self.ruleset.mask_of(terrain_options)
+        self.determined = len(terrain_options) == 1
 
     def update_terrain_options(self, neighbour):
         """
         Update the possible terrain options based on the neighbour's options
         :param Location neighbour: The neighbour to compare to
+        :return: True if the terrain options changed
+        :rtype: bool
         """
         # If it's already determined, don't update it
         if self.determined:
             return False
-        old_options = self.terrain_options
-        new_options = []
-        for option in old_options:
-            possible = option.possible_neighbours
-            if terrain.valid_neighbour(possible, neighbour.terrain_options):
-                new_options.append(option)
-        self.set_terrain_options(new_options)
-        self.determined = len(self.terrain_options) == 1
-        return old_options != new_options
+        # Keep only the options that have at least one valid neighbour in the neighbour's options
+        domain = self.domain & self.ruleset.supports[neighbour.domain]
+        if domain == self.domain:
+            return False
+        self.domain = domain
+        self.determined = domain != 0 and not domain & (domain - 1)
+        return True
+
+    def revise(self, neighbours):
+        """
+        Update the possible terrain options based on the options of all of the neighbours at once
+        Unlike calling update_terrain_options for each neighbour, a location that becomes determined
+        part way through is still checked against the rest of the neighbours
+        :param list[Location] neighbours: The neighbours to compare to
+        :return: True if the terrain options changed
+        :rtype: bool
+        """
+        if self.determined:
+            return False
+        supports = self.ruleset.supports
+        domain = self.domain
+        for neighbour in neighbours:
+            domain &= supports[neighbour.domain]
+        if domain == self.domain:
+            return False
+        self.domain = domain
+        self.determined = domain != 0 and not domain & (domain - 1)
+        return True
@@ -0,0 +1,273 @@
+"""
+Binary map files
+A map file is a fixed size header, a JSON table of the map's Terrain types in ruleset order,
+then one fixed width cell per position in row order, holding the cell's domain bitmask with
+its determined flag in the bit above the domain
+Cells are found by offset, so single cells and windows are read through mmap without loading the whole map
+"""
+import array
+import json
+import mmap
+import pickle
+import struct
+import sys
+from hexmap.cartographer import builder
+from hexmap.cartographer.location import Location
+from hexmap.features import terrain
+from hexmap.features.ruleset import compile_ruleset
+from hexmap.features.terrain import Terrain
+from hexmap.math import hexgrid
+from hexmap.math.hexgrid import make_hex
+
+MAGIC = b"HEXMAP"
+VERSION = 1
+# magic, version, cell size, has seed, height, width, top, left, seed, terrain table length
+HEADER = struct.Struct("<6sHBBIIiiqI")
+# Array typecodes of the unsigned integer sizes a cell can be stored in
+CELL_TYPES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+
+def cell_size_for(terrain_count):
+    """
+    Gets the smallest cell size that holds a domain of the ruleset and its determined flag
+    :param int terrain_count: Number of Terrain types in the ruleset
+    :return: The cell size in bytes
+    :rtype: int
+    """
+    for size in CELL_TYPES:
+        if terrain_count + 1 <= size * 8:
+            return size
+    raise ValueError(f"Map files support rulesets of at most {8 * max(CELL_TYPES) - 1} terrains")
+
+
+def data_offset(table_length, cell_size):
+    """
+    :param int table_length: Length of the terrain table in bytes
+    :param int cell_size: Size of each cell in bytes
+    :return: The offset of the first cell, aligned to the cell size
+    :rtype: int
+    """
+    offset = HEADER.size + table_length
+    return offset + -offset % cell_size
+
+
+def encode_terrains(terrains):
+    """
+    :param list[Terrain] terrains: The Terrain types of a ruleset
+    :return: The terrain table
+    :rtype: bytes
+    """
+    return json.dumps([terrain.terrain_to_dict(terrain_option) for terrain_option in terrains]).encode("utf-8")
+
+
+def decode_terrains(table):
+    """
+    :param bytes table: The terrain table
+    :return: The Terrain types of the ruleset
+    :rtype: list[Terrain]
+    """
+    return [terrain.terrain_from_dict(entry) for entry in json.loads(table.decode("utf-8"))]
+
+
+def save_map(path, grid, seed=None):
+    """
+    Saves a rectangle map to a map file
+    :param str path: The file to write
+    :param builder.Grid grid: The map, with positions in row order as hexgrid.build_rectangle
+    :param seed: The seed the map was generated from
+    :type seed: int or None
+    """
+    positions = list(grid.grid)
+    locations = list(grid.grid.values())
+    if not positions:
+        raise ValueError("Cannot save an empty map")
+    ruleset = locations[0].ruleset
+    top = positions[0].r
+    left = positions[0].q + top // 2
+    if positions != hexgrid.build_rectangle(top, top + grid.height - 1, left, left + grid.width - 1):
+        raise ValueError("Grid positions are not a rectangle of its height and width")
+    if any(location.ruleset is not ruleset for location in locations):
+        raise ValueError("Every location in a saved map must share one ruleset")
+    cell_size = cell_size_for(len(ruleset))
+    determined_flag = 1 << len(ruleset)
+    table = encode_terrains(ruleset.terrains)
+    header = HEADER.pack(MAGIC, VERSION, cell_size, seed is not None, grid.height, grid.width, top, left,
+                         seed or 0, len(table))
+    cells = array.array(CELL_TYPES[cell_size],
+                        (location.domain | (determined_flag if location.determined else 0) for location in locations))
+    if sys.byteorder == "big":
+        cells.byteswap()
+    with open(path, "wb") as outfile:
+        outfile.write(header)
+        outfile.write(table)
+        outfile.write(bytes(data_offset(len(table), cell_size) - HEADER.size - len(table)))
+        outfile.write(cells.tobytes())
+
+
+def is_map_file(path):
+    """
+    Checks if a file starts with the map file magic
+    :param str path: The file to check
+    :rtype: bool
+    """
+    with open(path, "rb") as infile:
+        return infile.read(len(MAGIC)) == MAGIC
+
+
+class MapFile:
+    """
+    A map file opened for random access through mmap
+    Rows and columns are in the offset layout of hexgrid.build_rectangle, the same as the saved map
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: The map file to open
+        """
+        with open(path, "rb") as infile:
+            self.map = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.cell_size, has_seed, self.height, self.width, self.top, self.left, seed,
+             table_length) = HEADER.unpack_from(self.map)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a map file")
+            if version != VERSION:
+                raise ValueError(f"Unsupported map file version {version}")
+            self.seed = seed if has_seed else None
+            self.ruleset = compile_ruleset(decode_terrains(self.map[HEADER.size:HEADER.size + table_length]))
+            self.offset = data_offset(table_length, self.cell_size)
+            if len(self.map) < self.offset + self.height * self.width * self.cell_size:
+                raise ValueError(f"{path} is truncated")
+        except (struct.error, ValueError):
+            self.map.close()
+            raise
+        self.determined_flag = 1 << len(self.ruleset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.map.close()
+
+    def _read_cells(self, index, count):
+        cells = array.array(CELL_TYPES[self.cell_size])
+        start = self.offset + index * self.cell_size
+        cells.frombytes(self.map[start:start + count * self.cell_size])
+        if sys.byteorder == "big":
+            cells.byteswap()
+        return cells
+
+    def _location(self, cell):
+        return Location.from_domain(self.ruleset, cell & (self.determined_flag - 1), bool(cell & self.determined_flag))
+
+    def index_of(self, position):
+        """
+        Gets the cell index of a position
+        :param Hex position: The position to look up
+        :return: The index of the position, -1 if it is not on the map
+        :rtype: int
+        """
+        row = position.r - self.top
+        column = position.q + position.r // 2 - self.left
+        if 0 <= row < self.height and 0 <= column < self.width:
+            return row * self.width + column
+        return -1
+
+    def __getitem__(self, position):
+        index = self.index_of(position)
+        if index < 0:
+            raise KeyError(position)
+        return self._location(self._read_cells(index, 1)[0])
+
+    def __contains__(self, position):
+        return self.index_of(position) >= 0
+
+    def read_window(self, top, left, height, width):
+        """
+        Reads a rectangle of the map, only touching the pages of the file the rectangle is stored in
+        :param int top: Top row of the window
+        :param int left: Left column of the window
+        :param int height: Height of the window
+        :param int width: Width of the window
+        :return: The window, with positions in row order
+        :rtype: builder.Grid
+        """
+        if (top < self.top or left < self.left or top + height > self.top + self.height
+                or left + width > self.left + self.width):
+            raise ValueError("Window is not inside the map")
+        positions = builder.Positions()
+        for r in range(top, top + height):
+            cells = self._read_cells((r - self.top) * self.width + left - self.left, width)
+            for column, cell in enumerate(cells, left):
+                positions[make_hex(column - r // 2, r)] = self._location(cell)
+        return builder.Grid(positions, height, width)
+
+    def to_grid(self):
+        """
+        Reads the whole map
+        :rtype: builder.Grid
+        """
+        return self.read_window(self.top, self.left, self.height, self.width)
+
+
+def load_map(path):
+    """
+    Loads a whole map from a map file
+    :param str path: The file to read
+    :rtype: builder.Grid
+    """
+    with MapFile(path) as map_file:
+        return map_file.to_grid()
+
+
+class _LegacyObject:
+    """ Stand in for the classes in a legacy pickle, holding only their attributes """
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """
+    Unpickler for maps saved with pickle, before the map file format
+    Only the classes a pickled map was made of can be loaded, and they are loaded as plain attribute holders
+    """
+
+    allowed = {
+        ("hexmap.cartographer.builder", "Grid"),
+        ("hexmap.cartographer.location", "Location"),
+        ("hexmap.features.terrain", "Terrain"),
+        ("hexmap.math.hexgrid", "Hex"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self.allowed:
+            raise pickle.UnpicklingError(f"{module}.{name} is not part of a legacy map")
+        return _LegacyObject
+
+
+def import_pickle(path):
+    """
+    Imports a map saved with pickle by older versions
+    :param str path: The pickle file to read
+    :rtype: builder.Grid
+    """
+    with open(path, "rb") as infile:
+        legacy = _LegacyUnpickler(infile).load()
+    if not isinstance(legacy, _LegacyObject) or not isinstance(getattr(legacy, "grid", None), dict):
+        raise ValueError(f"{path} is not a saved map")
+    # Older versions determined a cell with no options left as [None], it is imported with an empty domain
+    options = {position: [terrain_option for terrain_option in location.terrain_options if terrain_option is not None]
+               for position, location in legacy.grid.items()}
+    # Terrain types of the legacy map are kept, in the default order where they are default terrains
+    terrains = {terrain_option.name: terrain_option for terrain_option in terrain.get_default_terrain()}
+    for terrain_options in options.values():
+        for terrain_option in terrain_options:
+            terrains[terrain_option.name] = Terrain(terrain_option.name, terrain_option.possible_neighbours,
+                                                    terrain_option.colour_code)
+    ruleset = compile_ruleset(list(terrains.values()))
+    positions = builder.Positions(
+        (make_hex(position.q, position.r),
+         Location.from_domain(ruleset, ruleset.mask_of(options[position]), location.determined))
+        for position, location in legacy.grid.items())
+    return builder.Grid(positions, legacy.height, legacy.width)
@@ -0,0 +1,207 @@
+"""
+Travel costs and pathfinding over generated maps
+Moving onto a cell costs that cell's terrain's movement cost, so the cost of a path is the cost of
+every cell on it after the start, and terrain with no cost can't be entered at all
+"""
+import heapq
+from dataclasses import dataclass
+from hexmap.cartographer import builder
+from hexmap.math import hexgrid
+
+# Cost of moving onto each default terrain, None for terrain that can't be entered
+DEFAULT_MOVEMENT_COSTS = {
+    "plains": 1,
+    "valley": 1,
+    "town": 1,
+    "mountains": 3,
+    "water": None,
+}
+
+
+@dataclass()
+class Path:
+    """
+    A route between two positions, including both ends
+    """
+    positions: list
+    cost: float
+
+
+class DistanceField:
+    """
+    Travel cost from every reachable position to the nearest of a set of sources
+    Built once with a multi-source Dijkstra search, after which the nearest source
+    and the route to it are looked up without searching again
+    """
+
+    def __init__(self, costs, sources):
+        """
+        :param dict[Hex, float] costs: Cost of moving onto each passable position
+        :param sources: The positions to measure to, positions that can't be entered are ignored
+        :type sources: Iterable[Hex]
+        """
+        self.distances = {}
+        self.nearest = {}
+        # next_step[position] is the neighbour to move to from position on the way to its nearest source
+        self.next_step = {}
+        heap = []
+        for source in sources:
+            if source in costs and source not in self.distances:
+                self.distances[source] = 0
+                self.nearest[source] = source
+                heap.append((0, len(heap), source))
+        heapq.heapify(heap)
+        pushes = len(heap)
+        while heap:
+            distance, _, position = heapq.heappop(heap)
+            if distance > self.distances[position]:
+                continue
+            # Moving from a neighbour onto this position costs this position's cost
+            distance += costs[position]
+            for neighbour in hexgrid.hex_neighbors(position):
+                if neighbour in costs and distance < self.distances.get(neighbour, float("inf")):
+                    self.distances[neighbour] = distance
+                    self.nearest[neighbour] = self.nearest[position]
+                    self.next_step[neighbour] = position
+                    pushes += 1
+                    heapq.heappush(heap, (distance, pushes, neighbour))
+
+    def distance(self, position):
+        """
+        :param Hex position: The position to travel from
+        :return: The cost of travelling to the nearest source, None if no source can be reached
+        :rtype: float or None
+        """
+        return self.distances.get(position)
+
+    def path(self, position):
+        """
+        Gets the cheapest route from a position to its nearest source
+        :param Hex position: The position to travel from
+        :return: The route, None if no source can be reached
+        :rtype: Path or None
+        """
+        if position not in self.distances:
+            return None
+        positions = [position]
+        while positions[-1] in self.next_step:
+            positions.append(self.next_step[positions[-1]])
+        return Path(positions, self.distances[position])
+
+
+class TravelMap:
+    """
+    Movement costs of a completed map, with pathfinding and cached distance fields
+    Costs are read from the map when it is created, undetermined positions can't be entered,
+    so the TravelMap must be created again if the map changes
+    """
+
+    def __init__(self, grid, movement_costs=None):
+        """
+        :param grid: The map, a Grid or a map of Hex positions to Locations
+        :type grid: builder.Grid or dict[Hex, Location]
+        :param movement_costs: Cost of moving onto each terrain by name, None or missing for impassable terrain,
+            DEFAULT_MOVEMENT_COSTS if None
+        :type movement_costs: dict[str, float or None] or None
+        """
+        if movement_costs is None:
+            movement_costs = DEFAULT_MOVEMENT_COSTS
+        positions = getattr(grid, "grid", grid)
+        self.terrain = {}
+        self.costs = {}
+        for position, location in positions.items():
+            if not location.determined or not location.domain:
+                continue
+            name = location.terrain_options[0].name
+            self.terrain[position] = name
+            cost = movement_costs.get(name)
+            if cost is not None:
+                if cost <= 0:
+                    raise ValueError(f"Movement cost of {name} must be positive")
+                self.costs[position] = cost
+        # The cheapest cost scales hex_distance into a heuristic that never overestimates
+        self.min_cost = min(self.costs.values(), default=1)
+        self.fields = {}
+
+    def cost(self, position):
+        """
+        :param Hex position:
+        :return: The cost of moving onto the position, None if it can't be entered
+        :rtype: float or None
+        """
+        return self.costs.get(position)
+
+    def find_path(self, start, goal):
+        """
+        Finds the cheapest route between two positions with A*
+        :param Hex start: The position to start from
+        :param Hex goal: The position to travel to
+        :return: The route, None if the goal can't be reached
+        :rtype: Path or None
+        """
+        if start not in self.costs or goal not in self.costs:
+            return None
+        costs = self.costs
+        distances = {start: 0}
+        previous = {}
+        heap = [(self.min_cost * hexgrid.hex_distance(start, goal), 0, start)]
+        pushes = 0
+        while heap:
+            _, _, position = heapq.heappop(heap)
+            if position == goal:
+                positions = [goal]
+                while positions[-1] in previous:
+                    positions.append(previous[positions[-1]])
+                positions.reverse()
+                return Path(positions, distances[goal])
+            distance = distances[position]
+            for neighbour in hexgrid.hex_neighbors(position):
+                cost = costs.get(neighbour)
+                if cost is None:
+                    continue
+                neighbour_distance = distance + cost
+                if neighbour_distance < distances.get(neighbour, float("inf")):
+                    distances[neighbour] = neighbour_distance
+                    previous[neighbour] = position
+                    pushes += 1
+                    estimate = neighbour_distance + self.min_cost * hexgrid.hex_distance(neighbour, goal)
+                    heapq.heappush(heap, (estimate, pushes, neighbour))
+        return None
+
+    def distance_field(self, sources):
+        """
+        Gets the distance field to a set of positions, built on first use and cached
+        :param sources: The positions to measure to
+        :type sources: Iterable[Hex]
+        :rtype: DistanceField
+        """
+        key = frozenset(sources)
+        field = self.fields.get(key)
+        if field is None:
+            field = self.fields[key] = DistanceField(self.costs, sorted(key, key=builder.row_major))
+        return field
+
+    def terrain_field(self, terrain_name):
+        """
+        Gets the distance field to every position of a terrain, built on first use and cached
+        :param str terrain_name: Name of the terrain
+        :rtype: DistanceField
+        """
+        field = self.fields.get(terrain_name)
+        if field is None:
+            sources = [position for position, name in self.terrain.items() if name == terrain_name]
+            field = self.fields[terrain_name] = DistanceField(self.costs, sources)
+        return field
+
+    def nearest(self, position, terrain_name):
+        """
+        Finds the nearest position of a terrain by travel cost
+        :param Hex position: The position to travel from
+        :param str terrain_name: Name of the terrain to find
+        :return: The nearest position of the terrain and the cost of travelling there, None if none can be reached
+        :rtype: tuple[Hex, float] or None
+        """
+        field = self.terrain_field(terrain_name)
+        if position not in field.distances:
+            return None
+        return field.nearest[position], field.distances[position]
@@ -0,0 +1,156 @@
+"""
+Optional instrumentation of map generation
+A map is profiled by setting its stats to a GenerationStats, the builder functions only count
+anything when a map has stats, so maps that aren't profiled pay for a None check and nothing more
+"""
+import contextlib
+import time
+from dataclasses import dataclass, fields, asdict
+
+
+@dataclass()
+class PhaseStats:
+    """
+    Counters for one phase of generation
+    """
+    seconds: float = 0.0
+    # Cells given terrain by set_terrain_for_location
+    collapsed: int = 0
+    # Neighbours compared while revising cells
+    constraint_checks: int = 0
+    # Cells revised against their neighbours
+    revisions: int = 0
+    # Revisions that removed options from a cell
+    domain_changes: int = 0
+    # Most steps a propagation spread from the cells it started at
+    deepest_cascade: int = 0
+    # Calls made to the random number generator
+    random_picks: int = 0
+
+    def add(self, other):
+        """
+        Adds another phase's counters to these, keeping the deepest cascade of the two
+        :param PhaseStats other: The counters to add
+        """
+        for counter in fields(self):
+            if counter.name == "deepest_cascade":
+                self.deepest_cascade = max(self.deepest_cascade, other.deepest_cascade)
+            else:
+                setattr(self, counter.name, getattr(self, counter.name) + getattr(other, counter.name))
+
+
+class GenerationStats:
+    """
+    Wall time and counters for each phase of generating a map
+    Counters go to the phase that is running, or to the "other" phase outside of any phase
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.current = self.phases["other"] = PhaseStats()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Times a phase, and counts everything that happens during it towards the phase
+        A phase can be entered more than once, its time and counters add up
+        :param str name: Name of the phase
+        """
+        previous = self.current
+        self.current = self.phases.setdefault(name, PhaseStats())
+        start = time.perf_counter()
+        try:
+            yield self.current
+        finally:
+            self.current.seconds += time.perf_counter() - start
+            self.current = previous
+
+    def total(self):
+        """
+        :return: The counters of every phase added up
+        :rtype: PhaseStats
+        """
+        total = PhaseStats()
+        for phase_stats in self.phases.values():
+            total.add(phase_stats)
+        return total
+
+    def as_dict(self):
+        """
+        :return: The counters of each phase and the total, by name
+        :rtype: dict[str, dict]
+        """
+        result = {name: asdict(phase_stats) for name, phase_stats in self.phases.items()}
+        result["total"] = asdict(self.total())
+        return result
+
+    def report(self, stream):
+        """
+        Writes a table of the counters of each phase
+        :param stream: File-like object to write to
+        """
+        names = [counter.name for counter in fields(PhaseStats)]
+        rows = [(name, phase_stats) for name, phase_stats in self.phases.items()
+                if phase_stats != PhaseStats()] + [("total", self.total())]
+        width = max(len(name) for name, _ in rows)
+        stream.write(f"{'phase':<{width}} " + " ".join(f"{name:>17}" for name in names) + "\n")
+        for name, phase_stats in rows:
+            values = [f"{phase_stats.seconds:>17.4f}"] + [f"{getattr(phase_stats, counter):>17}"
+                                                          for counter in names[1:]]
+            stream.write(f"{name:<{width}} " + " ".join(values) + "\n")
+
+
+class CountingRandom:
+    """
+    Wraps a random number generator, counting calls to it as random picks
+    """
+
+    def __init__(self, rng, stats):
+        """
+        :param rng: The random number generator to wrap
+        :type rng: random.Random
+        :param GenerationStats stats: The stats to count picks in
+        """
+        self.rng = rng
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attribute = getattr(self.rng, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.stats.current.random_picks += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+
+def enable(positions, stats=None):
+    """
+    Starts profiling a map
+    :param positions: The map to profile
+    :type positions: Positions or ArrayGrid
+    :param stats: The stats to count in, new stats if None
+    :type stats: GenerationStats or None
+    :return: The stats
+    :rtype: GenerationStats
+    """
+    if stats is None:
+        stats = GenerationStats()
+    positions.stats = stats
+    if not isinstance(positions.rng, CountingRandom):
+        positions.rng = CountingRandom(positions.rng, stats)
+    return stats
+
+
+def phase(positions, name):
+    """
+    Times a phase of generating a map, if the map is being profiled
+    :param positions: The map
+    :param str name: Name of the phase
+    :return: Context manager for the phase
+    """
+    stats = getattr(positions, "stats", None)
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name)
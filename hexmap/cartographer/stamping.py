@@ -0,0 +1,235 @@
+"""
+Batch placement of features
+Every feature in a batch is resolved to its cells and stamped without propagating, then one
+propagation is run over the neighbours of everything stamped
+A feature that can't be stamped as a whole is reported as a conflict and none of its cells are stamped
+Features are HexBlob, StaggeredWall, Line and Single, or any object with the same attributes and cells method
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+from hexmap.cartographer import builder, profiling
+from hexmap.features.terrain import Terrain
+from hexmap.math import hexgrid
+from hexmap.math.hexgrid import Hex
+
+# Times a randomly placed feature is placed again before it is reported as a conflict
+RANDOM_PLACEMENT_ATTEMPTS = 10
+
+
+@dataclass()
+class HexBlob:
+    """
+    A hex shaped blob of terrain, centered on a random valid position if center is None
+    """
+    terrain_option: Terrain
+    radius: int
+    center: Optional[Hex] = None
+
+    @property
+    def placed_randomly(self):
+        return self.center is None
+
+    def cells(self, positions):
+        """
+        :param positions: The map of Hex positions to Locations
+        :return: The cells of the blob that are on the map, empty if no center could be found
+        :rtype: list[Hex]
+        """
+        center = self.center
+        if center is None:
+            center = builder.get_random_position_for_terrain(self.terrain_option, positions)
+            if center is None:
+                return []
+        return [position for position in hexgrid.get_all_hexes_within_range(center, self.radius)
+                if position in positions]
+
+
+@dataclass()
+class StaggeredWall:
+    """
+    Lines of terrain as builder.place_terrain_staggered_wall_shape, starting at a random valid position if start is None
+    A line stops where it leaves the map or reaches a determined cell or a cell already in the wall
+    """
+    terrain_option: Terrain
+    steps: int
+    direction: int
+    spawn_chance: float
+    turn_chance: float
+    start: Optional[Hex] = None
+
+    @property
+    def placed_randomly(self):
+        return self.start is None
+
+    def cells(self, positions):
+        """
+        :param positions: The map of Hex positions to Locations
+        :return: The cells of the wall, empty if no start could be found
+        :rtype: list[Hex]
+        """
+        start = self.start
+        if start is None:
+            start = builder.get_random_position_for_terrain(self.terrain_option, positions)
+            if start is None:
+                return []
+        cells = {}
+        self._add_line(positions, cells, builder.get_rng(positions), start, self.direction, self.spawn_chance)
+        return list(cells)
+
+    def _open(self, positions, cells, position):
+        return position in positions and position not in cells and not builder.get_cell_state(position, positions)[1]
+
+    def _add_line(self, positions, cells, rng, position, direction, spawn_chance):
+        if not self._open(positions, cells, position):
+            return
+        cells[position] = None
+        for _ in range(self.steps):
+            position = hexgrid.hex_neighbor(position, direction)
+            if not self._open(positions, cells, position):
+                return
+            cells[position] = None
+            if rng.random() <= spawn_chance:
+                spawn_chance = spawn_chance / 2
+                if rng.random() <= self.turn_chance:
+                    new_direction = (direction + 1 if rng.random() < 0.5 else -1) % 6
+                else:
+                    new_direction = direction
+                new_start = hexgrid.hex_neighbor(position, (direction + rng.choice([1, 2, 4, 5])) % 6)
+                self._add_line(positions, cells, rng, new_start, new_direction, spawn_chance)
+
+
+@dataclass()
+class Line:
+    """
+    A line of terrain between two positions, as drawn by hexgrid.hex_linedraw
+    """
+    terrain_option: Terrain
+    start: Hex
+    end: Hex
+
+    @property
+    def placed_randomly(self):
+        return False
+
+    def cells(self, positions):
+        """
+        :param positions: The map of Hex positions to Locations
+        :return: The cells of the line that are on the map
+        :rtype: list[Hex]
+        """
+        return [position for position in hexgrid.hex_linedraw(self.start, self.end) if position in positions]
+
+
+@dataclass()
+class Single:
+    """
+    A single cell of terrain, such as a town, at a random valid position if position is None
+    """
+    terrain_option: Terrain
+    position: Optional[Hex] = None
+
+    @property
+    def placed_randomly(self):
+        return self.position is None
+
+    def cells(self, positions):
+        """
+        :param positions: The map of Hex positions to Locations
+        :return: The cell, empty if it is off the map or no position could be found
+        :rtype: list[Hex]
+        """
+        position = self.position
+        if position is None:
+            position = builder.get_random_position_for_terrain(self.terrain_option, positions)
+        return [position] if position is not None and position in positions else []
+
+
+@dataclass()
+class Conflict:
+    """
+    A feature that was not stamped, and the cells that stopped it
+    No cells means the feature had nowhere to go
+    """
+    feature: object
+    positions: list[Hex]
+
+
+@dataclass()
+class StampReport:
+    """
+    The result of stamping a batch of features
+    """
+    placed: list = field(default_factory=list)
+    conflicts: list[Conflict] = field(default_factory=list)
+    revisions: int = 0
+
+
+def find_conflicts(cells, terrain_option, positions):
+    """
+    Finds the cells that can't take the terrain
+    A cell conflicts if it is determined as another terrain, can't be the terrain, or is next to
+    a determined cell or another cell of the feature that the terrain can't sit next to
+    :param list[Hex] cells: The cells of a feature
+    :param Terrain terrain_option: The terrain of the feature
+    :param positions: The map of Hex positions to Locations
+    :return: The conflicting cells
+    :rtype: list[Hex]
+    """
+    ruleset = builder.get_ruleset(positions)
+    if terrain_option.name not in ruleset.ids:
+        return list(cells)
+    bit = ruleset.bit(terrain_option)
+    supports = ruleset.supports
+    own = set(cells)
+    conflicts = []
+    for position in cells:
+        domain, determined = builder.get_cell_state(position, positions)
+        if not domain & bit or (determined and domain != bit):
+            conflicts.append(position)
+            continue
+        for neighbour in builder.get_neighbours(position, positions):
+            if neighbour in own:
+                neighbour_domain = bit
+            else:
+                neighbour_domain, neighbour_determined = builder.get_cell_state(neighbour, positions)
+                if not neighbour_determined:
+                    continue
+            if not (bit & supports[neighbour_domain] and neighbour_domain & supports[bit]):
+                conflicts.append(position)
+                break
+    return conflicts
+
+
+def stamp_features(features, positions):
+    """
+    Stamps a batch of features, then propagates the changes once
+    Features are resolved and stamped in order, so later features see the cells of earlier ones,
+    and randomly placed features are tried in a few places before they are reported as conflicts
+    When the map is profiled each kind of feature and the propagation are timed as separate phases
+    :param list features: The features to place,
+        each with a terrain_option, placed_randomly and a cells(positions) method
+    :param positions: The map of Hex positions to Locations
+    :return: The features placed, the features that conflicted and the number of revisions made
+    :rtype: StampReport
+    """
+    report = StampReport()
+    stamped = set()
+    for feature in features:
+        with profiling.phase(positions, f"{type(feature).__name__} {feature.terrain_option.name}"):
+            for _ in range(RANDOM_PLACEMENT_ATTEMPTS if feature.placed_randomly else 1):
+                cells = feature.cells(positions)
+                conflicts = find_conflicts(cells, feature.terrain_option, positions)
+                if cells and not conflicts:
+                    break
+            if not cells or conflicts:
+                report.conflicts.append(Conflict(feature, conflicts))
+                continue
+            for position in cells:
+                builder.set_terrain_for_location(position, positions, feature.terrain_option, False)
+            stamped.update(cells)
+            report.placed.append(feature)
+    with profiling.phase(positions, "propagate features"):
+        frontier = {neighbour for position in stamped for neighbour in builder.get_neighbours(position, positions)
+                    if neighbour not in stamped}
+        report.revisions = builder.propagate(sorted(frontier, key=builder.row_major), positions)
+    return report
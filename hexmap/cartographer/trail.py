@@ -0,0 +1,69 @@
+class Contradiction(Exception):
+    """
+    Raised when a position is left with no terrain options, or when a contradiction cannot be backtracked out of
+    """
+
+    def __init__(self, position, message=None):
+        """
+        :param position: The position left with no terrain options
+        :type position: Hex or None
+        :param message: Description of the contradiction, describes the position if None
+        :type message: str or None
+        """
+        super().__init__(message or f"No terrain options left at {position}")
+        self.position = position
+
+
+class Trail:
+    """
+    Record of changes made to a map's cells since the first choice point, used to undo choices
+    Every change is recorded as the cell's domain and determined flag before the change,
+    and each choice point remembers how many changes came before it, so undoing a choice only
+    touches the changes made since it
+    Cells are whatever the map addresses them by, Hex positions for a Positions map and dense
+    indexes for an ArrayGrid
+    """
+
+    def __init__(self):
+        self.changes = []
+        self.choices = []
+
+    def __len__(self):
+        return len(self.choices)
+
+    def record(self, cell, domain, determined):
+        """
+        Records a cell's state before a change
+        :param cell: The cell about to change
+        :param int domain: The cell's domain before the change
+        :param bool determined: If the cell was determined before the change
+        """
+        self.changes.append((cell, domain, determined))
+
+    def choose(self, cell, alternatives):
+        """
+        Starts a choice point, before the chosen terrain is set
+        :param cell: The cell terrain is being chosen for
+        :param int alternatives: Domain of the options that were not chosen
+        """
+        self.choices.append((len(self.changes), cell, alternatives))
+
+    def undo(self, positions, key=None):
+        """
+        Restores every cell changed since the last choice point, and removes the choice point
+        Cells are restored in sorted order, so the map's indexes end up the same whatever order the changes were made in
+        :param positions: The map, restored through its set_domain method
+        :param key: Sort key for the cells
+        :return: The cell of the choice and the options that were not chosen, None if there are no choices
+        :rtype: tuple[object, int] or None
+        """
+        if not self.choices:
+            return None
+        start, cell, alternatives = self.choices.pop()
+        restored = {}
+        for changed_cell, domain, determined in reversed(self.changes[start:]):
+            restored[changed_cell] = (domain, determined)
+        del self.changes[start:]
+        for changed_cell in sorted(restored, key=key):
+            positions.set_domain(changed_cell, *restored[changed_cell])
+        return cell, alternatives
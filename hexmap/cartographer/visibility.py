@@ -0,0 +1,54 @@
+"""
+Sight over generated maps, with some terrain blocking sight
+"""
+from hexmap.math import fov
+
+# Terrain that blocks sight by default
+DEFAULT_OPAQUE_TERRAIN = ("mountains",)
+
+
+class SightMap:
+    """
+    The positions of a completed map that block sight
+    Positions off the map don't block sight, and the SightMap must be created again if the map changes
+    """
+
+    def __init__(self, grid, opaque_terrain=DEFAULT_OPAQUE_TERRAIN):
+        """
+        :param grid: The map, a Grid or a map of Hex positions to Locations
+        :type grid: builder.Grid or dict[Hex, Location]
+        :param opaque_terrain: Names of the terrain that blocks sight
+        :type opaque_terrain: Iterable[str]
+        """
+        opaque_terrain = set(opaque_terrain)
+        self.positions = getattr(grid, "grid", grid)
+        self.opaque = {position for position, location in self.positions.items()
+                       if location.determined and location.domain
+                       and location.terrain_options[0].name in opaque_terrain}
+
+    def blocks_sight(self, position):
+        """
+        :param Hex position:
+        :rtype: bool
+        """
+        return position in self.opaque
+
+    def visible(self, center, radius):
+        """
+        Finds every position on the map visible from a centre
+        :param Hex center: The position to look from
+        :param int radius: The furthest distance to look
+        :return: The visible positions, nearest first
+        :rtype: list[Hex]
+        """
+        return [position for position in fov.field_of_view(center, radius, self.opaque.__contains__)
+                if position in self.positions]
+
+    def line_of_sight(self, a, b):
+        """
+        :param Hex a: The position to look from
+        :param Hex b: The position to look at
+        :return: True if b is visible from a
+        :rtype: bool
+        """
+        return fov.line_of_sight(a, b, self.opaque.__contains__)
@@ -0,0 +1,167 @@
+# Rulesets up to this size have their domain tables fully built up front, larger ones fill them in on demand
+EAGER_SUPPORT_LIMIT = 12
+
+
+class Ruleset:
+    """
+    A list of Terrain types compiled into integer IDs and neighbour bitmasks
+    Terrain IDs are the index of the terrain in the list, and a set of terrains (a domain)
+    is held as an int with bit (1 << id) set for each terrain in the set
+    """
+
+    def __init__(self, terrains):
+        """
+        :param list[Terrain] terrains: The Terrain types in this ruleset
+        """
+        self.terrains = list(terrains)
+        self.ids = {terrain.name: terrain_id for terrain_id, terrain in enumerate(self.terrains)}
+        self.full = (1 << len(self.terrains)) - 1
+        self.longest = len(max(self.terrains, key=len))
+        # neighbour_masks[id] is the set of terrains that terrain id may sit next to
+        self.neighbour_masks = [self.mask_of_names(terrain.possible_neighbours) for terrain in self.terrains]
+        # supports[mask] is the set of terrains that can sit next to a neighbour whose domain is mask
+        # options[mask] is the tuple of terrains in domain mask, one tuple shared by every location with that domain
+        # aliases[mask] is the alias table to choose a terrain of domain mask by weight, None if the weights are equal
+        if len(self.terrains) <= EAGER_SUPPORT_LIMIT:
+            self.supports = [self._compile_support(mask) for mask in range(self.full + 1)]
+            self.options = [self._compile_options(mask) for mask in range(self.full + 1)]
+            self.aliases = [self._compile_alias(mask) for mask in range(self.full + 1)]
+        else:
+            self.supports = _LazyTable(self._compile_support)
+            self.options = _LazyTable(self._compile_options)
+            self.aliases = _LazyTable(self._compile_alias)
+
+    def __len__(self):
+        return len(self.terrains)
+
+    def _compile_support(self, mask):
+        support = 0
+        for terrain_id, neighbour_mask in enumerate(self.neighbour_masks):
+            if neighbour_mask & mask:
+                support |= 1 << terrain_id
+        return support
+
+    def _compile_options(self, mask):
+        return tuple(terrain for terrain_id, terrain in enumerate(self.terrains) if mask >> terrain_id & 1)
+
+    def _compile_alias(self, mask):
+        # Walker's alias method: column i of the table is kept with probability thresholds[i],
+        # else replaced by column aliases[i], so a weighted choice takes one random number and one lookup
+        weights = [terrain.weight for terrain in self.options[mask]]
+        if len(set(weights)) <= 1:
+            return None
+        count = len(weights)
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+        thresholds = [1.0] * count
+        aliases = list(range(count))
+        small = [column for column, value in enumerate(scaled) if value < 1]
+        large = [column for column, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            column = small.pop()
+            alias = large[-1]
+            thresholds[column] = scaled[column]
+            aliases[column] = alias
+            scaled[alias] -= 1 - scaled[column]
+            if scaled[alias] < 1:
+                small.append(large.pop())
+        # Columns left over are only short of 1 by rounding error, so they are always kept
+        return tuple(thresholds), tuple(aliases)
+
+    def mask_of_names(self, names):
+        """
+        Gets the domain containing the named terrains, names not in the ruleset are ignored
+        :param list[str] names: Terrain names
+        :return: Domain bitmask
+        :rtype: int
+        """
+        mask = 0
+        for name in names:
+            if name in self.ids:
+                mask |= 1 << self.ids[name]
+        return mask
+
+    def mask_of(self, terrains):
+        """
+        Gets the domain containing the specified terrains
+        :param list[Terrain] terrains: Terrain types in this ruleset
+        :return: Domain bitmask
+        :rtype: int
+        """
+        return self.mask_of_names([terrain.name for terrain in terrains])
+
+    def bit(self, terrain):
+        """
+        Gets the single bit domain for the specified terrain
+        :param Terrain terrain: A Terrain type in this ruleset
+        :return: Domain bitmask with only this terrain set
+        :rtype: int
+        """
+        return 1 << self.ids[terrain.name]
+
+    def terrains_of(self, mask):
+        """
+        Gets the Terrain types in a domain, in ruleset order
+        :param int mask: Domain bitmask
+        :return: The terrains in the domain, shared by every caller so it must not be changed
+        :rtype: tuple[Terrain, ...]
+        """
+        return self.options[mask]
+
+    def choose(self, mask, rng):
+        """
+        Chooses a random terrain from a domain, with chance proportional to its weight
+        Domains whose terrains all have the same weight are chosen from uniformly with rng.choice
+        :param int mask: Domain bitmask, must not be empty
+        :param random.Random rng: The random number generator to choose with
+        :return: The chosen terrain
+        :rtype: Terrain
+        """
+        options = self.options[mask]
+        alias_table = self.aliases[mask]
+        if alias_table is None:
+            return rng.choice(options)
+        thresholds, aliases = alias_table
+        position = rng.random() * len(options)
+        column = int(position)
+        return options[column] if position - column < thresholds[column] else options[aliases[column]]
+
+
+class _LazyTable(dict):
+    """ Table of domain entries that compiles each entry the first time it is looked up """
+
+    def __init__(self, compile_entry):
+        super().__init__()
+        self.compile_entry = compile_entry
+
+    def __missing__(self, mask):
+        entry = self[mask] = self.compile_entry(mask)
+        return entry
+
+
+_compiled = {}
+
+
+def ruleset_key(terrains):
+    """
+    Gets a hashable key identifying a list of Terrain types
+    :param list[Terrain] terrains: The Terrain types
+    :rtype: tuple
+    """
+    return tuple((terrain.name, tuple(terrain.possible_neighbours), terrain.colour_code, terrain.weight)
+                 for terrain in terrains)
+
+
+def compile_ruleset(terrains):
+    """
+    Compiles a list of Terrain types into a Ruleset
+    Rulesets are cached, so every map using the same terrains shares one compiled table
+    :param list[Terrain] terrains: The Terrain types
+    :return: The compiled ruleset
+    :rtype: Ruleset
+    """
+    key = ruleset_key(terrains)
+    ruleset = _compiled.get(key)
+    if ruleset is None:
+        ruleset = _compiled[key] = Ruleset(terrains)
+    return ruleset
@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+import json
+import math
 from hexmap.cli.colors import Colors
 
 
@@ -7,6 +9,8 @@ class Terrain:
     name: str
     possible_neighbours: list[str]
     colour_code: str
+    # Relative chance of the terrain being chosen when a location is determined at random
+    weight: float = 1
 
     def __len__(self):
         return len(self.name)
@@ -47,6 +51,72 @@ def get_default_terrain():
     return terrains
 
 
+def terrain_from_dict(entry):
+    """
+    Creates a Terrain type from its JSON form
+    The colour_code is an ANSI code or the name of one of Colors, and the weight defaults to 1
+    :param dict entry: The name, possible_neighbours, and optionally colour_code and weight of the terrain
+    :rtype: Terrain
+    :raises ValueError: If the entry is missing a name, has a field of the wrong type or a weight that isn't positive
+    """
+    if not isinstance(entry, dict) or not entry.get("name"):
+        raise ValueError(f"Terrain {entry!r} has no name")
+    name = entry["name"]
+    if not isinstance(name, str):
+        raise ValueError(f"Terrain name {name!r} must be a string")
+    possible_neighbours = entry.get("possible_neighbours", [])
+    if not isinstance(possible_neighbours, list) or not all(isinstance(value, str) for value in possible_neighbours):
+        raise ValueError(f"Terrain {name} possible_neighbours must be a list of names")
+    colour_code = entry.get("colour_code", "")
+    if not isinstance(colour_code, str):
+        raise ValueError(f"Terrain {name} colour_code {colour_code!r} must be a string")
+    colour_code = getattr(Colors, colour_code.upper(), colour_code) if colour_code.isidentifier() else colour_code
+    weight = entry.get("weight", 1)
+    if (isinstance(weight, bool) or not isinstance(weight, (int, float)) or not weight > 0
+            or not math.isfinite(weight)):
+        raise ValueError(f"Terrain {name} has weight {weight!r}, weights must be positive finite numbers")
+    return Terrain(name, list(possible_neighbours), colour_code, weight)
+
+
+def terrain_to_dict(terrain):
+    """
+    Gets the JSON form of a Terrain type, leaving out the weight if it is the default
+    :param Terrain terrain:
+    :rtype: dict
+    """
+    entry = {"name": terrain.name,
+             "possible_neighbours": terrain.possible_neighbours,
+             "colour_code": terrain.colour_code}
+    if terrain.weight != 1:
+        entry["weight"] = terrain.weight
+    return entry
+
+
+def load_terrain(path):
+    """
+    Loads a list of Terrain types from a JSON file, a list of terrains as terrain_from_dict
+    :param str path: The JSON file
+    :return: The Terrain types, in file order
+    :rtype: list[Terrain]
+    :raises ValueError: If the file isn't a list of valid terrains, repeats a name or names an unknown neighbour
+    """
+    with open(path, encoding="utf-8") as infile:
+        entries = json.load(infile)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must hold a list of terrains")
+    terrains = [terrain_from_dict(entry) for entry in entries]
+    names = set()
+    for terrain in terrains:
+        if terrain.name in names:
+            raise ValueError(f"Terrain {terrain.name} is defined more than once")
+        names.add(terrain.name)
+    for terrain in terrains:
+        unknown = [name for name in terrain.possible_neighbours if name not in names]
+        if unknown:
+            raise ValueError(f"Terrain {terrain.name} has unknown neighbours {', '.join(unknown)}")
+    return terrains
+
+
 def valid_neighbour(possible_neighbours, neighbours_options):
     """
     Checks if the terrain is possible based on what the neighbours' options are
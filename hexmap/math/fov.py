@@ -0,0 +1,75 @@
+"""
+Line of sight and field of view
+A hex is visible from a centre if no hex strictly between them on the line drawn by hexgrid.hex_linedraw from Hex(0, 0)
+to the hex's offset, moved to the centre, blocks sight, so hexes that block sight are visible themselves but hide what
+is behind them
+Lines drawn from Hex(0, 0) are the same relative to any centre, so the lines of each radius are drawn once and reused,
+where hex_linedraw itself can choose differently between two hexes a line runs between at other positions
+"""
+from dataclasses import dataclass
+import functools
+from hexmap.math import hexgrid
+from hexmap.math.hexgrid import make_hex
+
+
+@dataclass(frozen=True)
+class RaySet:
+    """
+    The lines from a centre to every hex within a radius, as offsets from the centre
+    blockers[i] is a bitmask of the indexes of the offsets between the centre and offsets[i]
+    """
+    radius: int
+    offsets: tuple[tuple[int, int], ...]
+    blockers: tuple[int, ...]
+
+
+@functools.lru_cache(maxsize=None)
+def ray_set(radius):
+    """
+    Gets the lines to every hex within a radius, drawn on first use and cached
+    :param int radius: The furthest distance from the centre
+    :rtype: RaySet
+    """
+    origin = make_hex(0, 0)
+    hexes = sorted(hexgrid.get_all_hexes_within_range(origin, radius),
+                   key=lambda position: (hexgrid.hex_length(position), position.r, position.q))
+    index = {position: i for i, position in enumerate(hexes)}
+    blockers = []
+    for position in hexes:
+        mask = 0
+        for between in hexgrid.hex_linedraw(origin, position)[1:-1]:
+            mask |= 1 << index[between]
+        blockers.append(mask)
+    return RaySet(radius, tuple((position.q, position.r) for position in hexes), tuple(blockers))
+
+
+def field_of_view(center, radius, blocks_sight):
+    """
+    Finds every hex visible from a centre
+    :param Hex center: The hex to look from
+    :param int radius: The furthest distance to look
+    :param blocks_sight: Called with a Hex, returns True if it blocks sight
+    :type blocks_sight: Callable[[Hex], bool]
+    :return: The visible hexes, nearest first
+    :rtype: list[Hex]
+    """
+    rays = ray_set(radius)
+    q, r = center.q, center.r
+    hexes = [make_hex(q + dq, r + dr) for dq, dr in rays.offsets]
+    # Bit i of opaque is set if hexes[i] blocks sight, built as a string as ORing in each bit is quadratic
+    opaque = int("".join("1" if blocks_sight(position) else "0" for position in reversed(hexes)), 2)
+    return [position for position, blockers in zip(hexes, rays.blockers) if not blockers & opaque]
+
+
+def line_of_sight(a, b, blocks_sight):
+    """
+    Checks if b is visible from a, the same as field_of_view
+    :param Hex a: The hex to look from
+    :param Hex b: The hex to look at
+    :param blocks_sight: Called with a Hex, returns True if it blocks sight
+    :type blocks_sight: Callable[[Hex], bool]
+    :rtype: bool
+    """
+    q, r = a.q, a.r
+    return not any(blocks_sight(make_hex(q + position.q, r + position.r))
+                   for position in hexgrid.hex_linedraw(make_hex(0, 0), hexgrid.hex_subtract(b, a))[1:-1])
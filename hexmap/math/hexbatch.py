@@ -0,0 +1,293 @@
+"""
+Batch versions of the hexgrid functions, working on numpy arrays of axial coordinates
+Positions are passed and returned as separate q and r arrays, with s derived as -q - r,
+and every function gives exactly the same results as its scalar version in hexgrid
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from hexmap.math import hexgrid
+from hexmap.math.hexgrid import make_hex
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Batch hex operations require numpy")
+
+
+def from_hexes(hexes):
+    """
+    Converts a list of Hex into coordinate arrays
+    :param list[Hex] hexes: The hexes to convert
+    :return: q and r arrays
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    coordinates = np.array([(h.q, h.r) for h in hexes], dtype=np.int64).reshape(-1, 2)
+    return coordinates[:, 0], coordinates[:, 1]
+
+
+def to_hexes(q, r):
+    """
+    Converts coordinate arrays into a list of Hex
+    :param numpy.ndarray q:
+    :param numpy.ndarray r:
+    :rtype: list[Hex]
+    """
+    return [make_hex(hq, hr) for hq, hr in zip(q.tolist(), r.tolist())]
+
+
+def hex_length(q, r):
+    """
+    :param numpy.ndarray q:
+    :param numpy.ndarray r:
+    :return: The distance of each hex from the origin
+    :rtype: numpy.ndarray
+    """
+    return (np.abs(q) + np.abs(r) + np.abs(q + r)) // 2
+
+
+def hex_distance(aq, ar, bq, br):
+    """
+    Gets the distance between each pair of hexes
+    :param numpy.ndarray aq:
+    :param numpy.ndarray ar:
+    :param numpy.ndarray bq:
+    :param numpy.ndarray br:
+    :return: Distance between a[i] and b[i]
+    :rtype: numpy.ndarray
+    """
+    _require_numpy()
+    return hex_length(np.subtract(aq, bq), np.subtract(ar, br))
+
+
+def pairwise_distance(aq, ar, bq, br):
+    """
+    Gets the distance between every hex in a and every hex in b
+    :param numpy.ndarray aq:
+    :param numpy.ndarray ar:
+    :param numpy.ndarray bq:
+    :param numpy.ndarray br:
+    :return: (len(a), len(b)) array of distances between a[i] and b[j]
+    :rtype: numpy.ndarray
+    """
+    _require_numpy()
+    return hex_distance(np.asarray(aq)[:, None], np.asarray(ar)[:, None], np.asarray(bq)[None, :],
+                        np.asarray(br)[None, :])
+
+
+def hex_round(q, r, s):
+    """
+    Finds the closest hex to each float position, with the same tie breaking as hexgrid.hex_round
+    :param numpy.ndarray q:
+    :param numpy.ndarray r:
+    :param numpy.ndarray s:
+    :return: q and r arrays of the closest hexes
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    # rint rounds halves to even, the same as round()
+    qi = np.rint(q)
+    ri = np.rint(r)
+    si = np.rint(s)
+    q_diff = np.abs(qi - q)
+    r_diff = np.abs(ri - r)
+    s_diff = np.abs(si - s)
+    fix_q = (q_diff > r_diff) & (q_diff > s_diff)
+    fix_r = ~fix_q & (r_diff > s_diff)
+    qi = np.where(fix_q, -ri - si, qi)
+    ri = np.where(fix_r, -qi - si, ri)
+    return qi.astype(np.int64), ri.astype(np.int64)
+
+
+def hex_to_pixel(layout, q, r):
+    """
+    Gets the pixel position of the centre of each hex, the same as Layout.hex_to_pixel
+    :param Layout layout: The pixel geometry of the hexes
+    :param numpy.ndarray q:
+    :param numpy.ndarray r:
+    :return: x and y arrays
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    o = layout.orientation
+    q = np.asarray(q)
+    r = np.asarray(r)
+    x = (o.f0 * q + o.f1 * r) * layout.size[0]
+    y = (o.f2 * q + o.f3 * r) * layout.size[1]
+    return x + layout.origin[0], y + layout.origin[1]
+
+
+def pixel_to_fractional_hex(layout, x, y):
+    """
+    Gets the fractional axial coordinates of each pixel position, the same as Layout.pixel_to_fractional_hex
+    :param Layout layout: The pixel geometry of the hexes
+    :param numpy.ndarray x:
+    :param numpy.ndarray y:
+    :return: q and r float arrays
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    o = layout.orientation
+    x = (np.asarray(x, dtype=np.float64) - layout.origin[0]) / layout.size[0]
+    y = (np.asarray(y, dtype=np.float64) - layout.origin[1]) / layout.size[1]
+    return o.b0 * x + o.b1 * y, o.b2 * x + o.b3 * y
+
+
+def pixel_to_hex(layout, x, y):
+    """
+    Finds the hex containing each pixel position
+    Works out the same float coordinates and rounds them the same as Layout.pixel_to_hex,
+    so gives exactly the same hexes
+    :param Layout layout: The pixel geometry of the hexes
+    :param numpy.ndarray x:
+    :param numpy.ndarray y:
+    :return: q and r arrays
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    q, r = pixel_to_fractional_hex(layout, x, y)
+    return hex_round(q, r, -q - r)
+
+
+def hex_lerp(aq, ar, a_s, bq, br, bs, t):
+    """
+    Lerp between each pair of float hexes
+    :param numpy.ndarray aq:
+    :param numpy.ndarray ar:
+    :param numpy.ndarray a_s:
+    :param numpy.ndarray bq:
+    :param numpy.ndarray br:
+    :param numpy.ndarray bs:
+    :param numpy.ndarray t:
+    :return: q, r and s arrays calculated from lerp
+    :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    return (aq * (1.0 - t) + bq * t,
+            ar * (1.0 - t) + br * t,
+            a_s * (1.0 - t) + bs * t)
+
+
+def hex_linedraw(aq, ar, bq, br):
+    """
+    Draws a line between each pair of hexes, in the same exact integer arithmetic as hexgrid.hex_linedraw,
+    with the same float arithmetic as hexgrid.nudged_lerp_round where a line runs along the edge between two hexes
+    The lines are concatenated, line i is q[offsets[i]:offsets[i + 1]], r[offsets[i]:offsets[i + 1]]
+    :param numpy.ndarray aq:
+    :param numpy.ndarray ar:
+    :param numpy.ndarray bq:
+    :param numpy.ndarray br:
+    :return: q and r arrays of every line, and the offset of each line
+    :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    aq, ar, bq, br = (np.asarray(coordinate, dtype=np.int64) for coordinate in (aq, ar, bq, br))
+    steps = hex_distance(aq, ar, bq, br)
+    lengths = steps + 1
+    offsets = np.zeros(len(steps) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    line = np.repeat(np.arange(len(steps)), lengths)
+    i = np.arange(offsets[-1]) - offsets[line]
+    # Lines of a single hex are drawn with one step, which keeps them on the start hex
+    n = np.maximum(steps, 1)[line]
+    q = aq[line] * n + (bq - aq)[line] * i
+    r = ar[line] * n + (br - ar)[line] * i
+    s = -q - r
+    qi = (2 * q + n) // (2 * n)
+    ri = (2 * r + n) // (2 * n)
+    si = -((n - 2 * s) // (2 * n))
+    q_diff = qi * n - q
+    r_diff = ri * n - r
+    s_diff = si * n - s
+    q_diff = np.where(q_diff > 0, 5 * q_diff - 1, 1 - 5 * q_diff)
+    r_diff = np.where(r_diff > 0, 5 * r_diff - 1, 1 - 5 * r_diff)
+    s_diff = np.where(s_diff >= 0, 5 * s_diff + 2, -2 - 5 * s_diff)
+    fix_q = (q_diff > r_diff) & (q_diff > s_diff)
+    fix_r = ~fix_q & (r_diff > s_diff)
+    qi = np.where(fix_q, -ri - si, qi)
+    ri = np.where(fix_r, -qi - si, ri)
+    ties = np.flatnonzero((q_diff == r_diff) & (q_diff > s_diff))
+    if len(ties):
+        tie_line = line[ties]
+        t = 1.0 / n[ties] * i[ties]
+        a_s = -aq[tie_line] - ar[tie_line]
+        b_s = -bq[tie_line] - br[tie_line]
+        qi[ties], ri[ties] = hex_round((aq[tie_line] + 1e-06) * (1.0 - t) + (bq[tie_line] + 1e-06) * t,
+                                       (ar[tie_line] + 1e-06) * (1.0 - t) + (br[tie_line] + 1e-06) * t,
+                                       (a_s - 2e-06) * (1.0 - t) + (b_s - 2e-06) * t)
+    return qi, ri, offsets
+
+
+def hex_rotate_left(q, r):
+    """
+    :param numpy.ndarray q:
+    :param numpy.ndarray r:
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    return q + r, -q
+
+
+def hex_rotate_right(q, r):
+    """
+    :param numpy.ndarray q:
+    :param numpy.ndarray r:
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    return -r, q + r
+
+
+def hex_neighbors(q, r):
+    """
+    Gets all the neighbours of each hex, in hexgrid.hex_directions order
+    :param numpy.ndarray q:
+    :param numpy.ndarray r:
+    :return: (N, 6) q and r arrays of the neighbours
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    direction_q = np.array([direction.q for direction in hexgrid.hex_directions], dtype=np.int64)
+    direction_r = np.array([direction.r for direction in hexgrid.hex_directions], dtype=np.int64)
+    return np.asarray(q)[:, None] + direction_q, np.asarray(r)[:, None] + direction_r
+
+
+def get_all_hexes_within_range(center_q, center_r, steps):
+    """
+    Gets all the hexes within range of each center, in the same order as hexgrid.get_all_hexes_within_range
+    :param numpy.ndarray center_q:
+    :param numpy.ndarray center_r:
+    :param int steps: Steps to take from the centers to find hexes
+    :return: (N, K) q and r arrays of the hexes within range of each center
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    offset_q, offset_r = from_hexes(hexgrid.get_all_hexes_within_range(make_hex(0, 0), steps))
+    return np.asarray(center_q)[:, None] + offset_q, np.asarray(center_r)[:, None] + offset_r
+
+
+def build_rectangle(top, bottom, left, right):
+    """
+    Build a rectangle of hexes, in the same order as hexgrid.build_rectangle
+    :param int top: Top limit of the rectangle
+    :param int bottom: Bottom limit of the rectangle
+    :param int left: Left limit of the rectangle
+    :param int right: Right limit of the rectangle
+    :return: q and r arrays of the hexes in the specified rectangle
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    _require_numpy()
+    width = right - left + 1
+    r = np.repeat(np.arange(top, bottom + 1, dtype=np.int64), width)
+    q = np.tile(np.arange(left, right + 1, dtype=np.int64), bottom - top + 1) - np.floor_divide(r, 2)
+    return q, r
+
+
+def build_rectangle_of_size(height, width):
+    """
+    Build a rectangle of hexes of specified height and width, as hexgrid.build_rectangle_of_size
+    :param int height: Height of the rectangle
+    :param int width: Width of the rectangle
+    :return: q and r arrays of the hexes in the specified rectangle
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    return build_rectangle(-height // 2 + 1, height // 2, -width // 2 + 1, width // 2)
@@ -1,25 +1,30 @@
 import math
+from operator import itemgetter
 
 
-class Hex:
-    def __init__(self, q, r, s=None):
+# Offset added to q and r when packing them into a key, so keys of negative coordinates stay positive
+KEY_OFFSET = 1 << 31
+
+
+class Hex(tuple):
+    """
+    Immutable cube coordinate, stored as a (q, r, s) tuple so hashing and equality run in C
+    Integer coordinates can also be packed into a single 64-bit int key with hex_key
+    """
+    __slots__ = ()
+
+    def __new__(cls, q, r, s=None):
         if s is None:
             s = -q - r
         assert not (round(q + r + s) != 0), "q + r + s must be 0"
-        self.q = q
-        self.r = r
-        self.s = s
+        return _new(cls, (q, r, s))
 
-    def __hash__(self):
-        return hash((self.q, self.r))
+    def __getnewargs__(self):
+        return tuple(self)
 
-    def __eq__(self, other):
-        return (
-            self.__class__ == other.__class__
-            and self.q == other.q
-            and self.r == other.r
-            and self.s == other.s
-        )
+    q = property(itemgetter(0))
+    r = property(itemgetter(1))
+    s = property(itemgetter(2))
 
     def __repr__(self):
         return f'Hex({self.q}, {self.r}, {self.s})'
@@ -27,6 +32,14 @@ class Hex:
     def __str__(self):
         return f'{self.q, self.r, self.s}'
 
+    @property
+    def key(self):
+        """
+        The packed integer key of this Hex, only valid for integer coordinates
+        :rtype: int
+        """
+        return hex_key(self.q, self.r)
+
     def axial_string(self, offset):
         """
         Gets a string with the q and r values in brackets, with an optional offset to the brackets
@@ -37,12 +50,46 @@ class Hex:
         return f"({f'{self.q}, {self.r}':^{offset}})"
 
 
+_new = tuple.__new__
+
+
+def make_hex(q, r):
+    """
+    Creates a Hex from axial coordinates without validating them
+    Used for coordinates generated internally, which always satisfy q + r + s = 0
+    :param int q:
+    :param int r:
+    :rtype: Hex
+    """
+    return _new(Hex, (q, r, -q - r))
+
+
+def hex_key(q, r):
+    """
+    Packs integer axial coordinates into a single int, usable as a dict key in place of a Hex
+    :param int q:
+    :param int r:
+    :return: 64-bit packed key
+    :rtype: int
+    """
+    return (q + KEY_OFFSET) << 32 | (r + KEY_OFFSET)
+
+
+def hex_from_key(key):
+    """
+    Unpacks a key created by hex_key
+    :param int key: 64-bit packed key
+    :rtype: Hex
+    """
+    return make_hex((key >> 32) - KEY_OFFSET, (key & 0xFFFFFFFF) - KEY_OFFSET)
+
+
 def hex_add(a, b):
     """
     :param Hex a:
     :param Hex b:
     """
-    return Hex(a.q + b.q, a.r + b.r, a.s + b.s)
+    return make_hex(a.q + b.q, a.r + b.r)
 
 
 def hex_subtract(a, b):
@@ -50,7 +97,7 @@ def hex_subtract(a, b):
     :param Hex a:
     :param Hex b:
     """
-    return Hex(a.q - b.q, a.r - b.r, a.s - b.s)
+    return make_hex(a.q - b.q, a.r - b.r)
 
 
 def hex_scale(a, k):
@@ -58,21 +105,21 @@ def hex_scale(a, k):
     :param Hex a:
     :param int k:
     """
-    return Hex(a.q * k, a.r * k, a.s * k)
+    return make_hex(a.q * k, a.r * k)
 
 
 def hex_rotate_left(a):
     """
     :param Hex a:
     """
-    return Hex(-a.s, -a.q, -a.r)
+    return make_hex(-a.s, -a.q)
 
 
 def hex_rotate_right(a):
     """
     :param Hex a:
     """
-    return Hex(-a.r, -a.s, -a.q)
+    return make_hex(-a.r, -a.s)
 
 
 hex_directions = [Hex(1, 0, -1), Hex(1, -1, 0), Hex(0, -1, 1),
@@ -115,10 +162,8 @@ def hex_neighbors(position):
     :return: The neighbours of position
     :rtype: list[Hex]
     """
-    neighbours = []
-    for direction in hex_directions:
-        neighbours.append(hex_add(position, direction))
-    return neighbours
+    q, r, s = position
+    return [_new(Hex, (q + dq, r + dr, s + ds)) for dq, dr, ds in hex_directions]
 
 
 hex_diagonals = [Hex(2, -1), Hex(1, -2), Hex(-1, -1),
@@ -182,7 +227,7 @@ def hex_round(h):
     else:
         if r_diff > s_diff:
             ri = -qi - si
-    return Hex(qi, ri)
+    return make_hex(qi, ri)
 
 
 def hex_lerp(a, b, t):
@@ -199,21 +244,66 @@ def hex_lerp(a, b, t):
                a.s * (1.0 - t) + b.s * t)
 
 
+def nudged_lerp_round(a, b, steps, i):
+    """
+    Rounds a point of a line between two hexes nudged by (1e-06, 1e-06, -2e-06), in float arithmetic
+    This is how hex_linedraw used to find every point of a line
+    :param Hex a:
+    :param Hex b:
+    :param int steps: Number of steps in the line, at least 1
+    :param int i: The step to round
+    :rtype: Hex
+    """
+    t = 1.0 / steps * i
+    return hex_round(_new(Hex, ((a.q + 1e-06) * (1.0 - t) + (b.q + 1e-06) * t,
+                                (a.r + 1e-06) * (1.0 - t) + (b.r + 1e-06) * t,
+                                (a.s - 2e-06) * (1.0 - t) + (b.s - 2e-06) * t)))
+
+
 def hex_linedraw(a, b):
     """
     Draw a line between two hexes
+    Gives the same hexes as rounding hex_lerp between a and b nudged by (1e-06, 1e-06, -2e-06),
+    in exact integer arithmetic with the nudge only used to break ties
+    Where the line runs exactly along the edge between two hexes the nudge moves q and r equally and can't break
+    the tie, so the hex there is found with the original float arithmetic, nudged_lerp_round, as it always was
     :param Hex a:
     :param Hex b:
     :return: List of Hex in line between a and b
     :rtype: list[Hex]
     """
     steps = hex_distance(a, b)
-    a_nudge = Hex(a.q + 1e-06, a.r + 1e-06, a.s - 2e-06)
-    b_nudge = Hex(b.q + 1e-06, b.r + 1e-06, b.s - 2e-06)
+    if steps == 0:
+        return [make_hex(a.q, a.r)]
+    # Each point on the line is (q, r, s) / steps, the nudge rounds q and r halves up and s halves down
+    q = a.q * steps
+    r = a.r * steps
+    q_step = b.q - a.q
+    r_step = b.r - a.r
+    double_steps = 2 * steps
     results = []
-    step = 1.0 / max(steps, 1)
-    for i in range(0, steps + 1):
-        results.append(hex_round(hex_lerp(a_nudge, b_nudge, step * i)))
+    for _ in range(steps + 1):
+        s = -q - r
+        qi = (2 * q + steps) // double_steps
+        ri = (2 * r + steps) // double_steps
+        si = -((steps - 2 * s) // double_steps)
+        # Rounding errors in units of 1 / (5 * steps), with the nudge added as the smallest unit
+        q_diff = qi * steps - q
+        r_diff = ri * steps - r
+        s_diff = si * steps - s
+        q_diff = 5 * q_diff - 1 if q_diff > 0 else 1 - 5 * q_diff
+        r_diff = 5 * r_diff - 1 if r_diff > 0 else 1 - 5 * r_diff
+        s_diff = 5 * s_diff + 2 if s_diff >= 0 else -2 - 5 * s_diff
+        if q_diff == r_diff and q_diff > s_diff:
+            results.append(nudged_lerp_round(a, b, steps, len(results)))
+        else:
+            if q_diff > r_diff and q_diff > s_diff:
+                qi = -ri - si
+            elif r_diff > s_diff:
+                ri = -qi - si
+            results.append(make_hex(qi, ri))
+        q += q_step
+        r += r_step
     return results
 
 
@@ -231,7 +321,7 @@ def build_rectangle(top, bottom, left, right):
     for r in range(top, bottom + 1):
         r_offset = math.floor(r / 2.0)
         for q in range(left - r_offset, right - r_offset + 1):
-            rectangle.append(Hex(q, r))
+            rectangle.append(make_hex(q, r))
     return rectangle
 
 
@@ -263,5 +353,5 @@ def get_all_hexes_within_range(center, steps):
     results = []
     for q in range(-steps, steps + 1):
         for r in range(max(-steps, -q - steps), min(steps + 1, -q + steps + 1)):
-            results.append(hex_add(center, Hex(q, r)))
+            results.append(make_hex(center.q + q, center.r + r))
     return results
@@ -0,0 +1,120 @@
+"""
+Conversion between hex coordinates and pixels
+A Layout places hexes on a plane with an orientation, the size of a hex and the pixel position of Hex(0, 0)
+Pointy hexes have their rows offset like the rows of a rectangle map, flat hexes have their columns offset
+hexbatch has versions of hex_to_pixel and pixel_to_hex for numpy arrays of positions
+"""
+from dataclasses import dataclass
+import functools
+import math
+from hexmap.math import hexgrid
+from hexmap.math.hexgrid import make_hex
+
+
+@dataclass(frozen=True)
+class Orientation:
+    """
+    The matrix from axial coordinates to pixels (f0 to f3), its inverse (b0 to b3),
+    and the angle of the first corner in sixths of a turn
+    """
+    f0: float
+    f1: float
+    f2: float
+    f3: float
+    b0: float
+    b1: float
+    b2: float
+    b3: float
+    start_angle: float
+
+
+POINTY = Orientation(math.sqrt(3.0), math.sqrt(3.0) / 2.0, 0.0, 3.0 / 2.0,
+                     math.sqrt(3.0) / 3.0, -1.0 / 3.0, 0.0, 2.0 / 3.0, 0.5)
+FLAT = Orientation(3.0 / 2.0, 0.0, math.sqrt(3.0) / 2.0, math.sqrt(3.0),
+                   2.0 / 3.0, 0.0, -1.0 / 3.0, math.sqrt(3.0) / 3.0, 0.0)
+orientations = {"pointy": POINTY, "flat": FLAT}
+
+
+@dataclass(frozen=True)
+class Layout:
+    """
+    The pixel geometry of a hex grid
+    size is the distance from the centre of a hex to its corners, in x and y
+    """
+    orientation: Orientation = POINTY
+    size: tuple[float, float] = (1.0, 1.0)
+    origin: tuple[float, float] = (0.0, 0.0)
+
+    def hex_to_pixel(self, position):
+        """
+        :param Hex position:
+        :return: The pixel position of the centre of the hex
+        :rtype: tuple[float, float]
+        """
+        o = self.orientation
+        x = (o.f0 * position.q + o.f1 * position.r) * self.size[0]
+        y = (o.f2 * position.q + o.f3 * position.r) * self.size[1]
+        return x + self.origin[0], y + self.origin[1]
+
+    def pixel_to_fractional_hex(self, x, y):
+        """
+        :param float x:
+        :param float y:
+        :return: The fractional axial coordinates of a pixel position
+        :rtype: tuple[float, float]
+        """
+        o = self.orientation
+        x = (x - self.origin[0]) / self.size[0]
+        y = (y - self.origin[1]) / self.size[1]
+        return o.b0 * x + o.b1 * y, o.b2 * x + o.b3 * y
+
+    def pixel_to_hex(self, x, y):
+        """
+        :param float x:
+        :param float y:
+        :return: The hex containing a pixel position
+        :rtype: Hex
+        """
+        return hexgrid.hex_round(make_hex(*self.pixel_to_fractional_hex(x, y)))
+
+    @functools.cached_property
+    def corner_offsets(self):
+        """
+        The corners of a hex relative to its centre, worked out once per layout
+        :rtype: tuple[tuple[float, float], ...]
+        """
+        corners = []
+        for corner in range(6):
+            angle = 2.0 * math.pi * (self.orientation.start_angle + corner) / 6
+            corners.append((self.size[0] * math.cos(angle), self.size[1] * math.sin(angle)))
+        return tuple(corners)
+
+    def polygon_corners(self, position):
+        """
+        :param Hex position:
+        :return: The pixel positions of the corners of the hex
+        :rtype: list[tuple[float, float]]
+        """
+        x, y = self.hex_to_pixel(position)
+        return [(x + dx, y + dy) for dx, dy in self.corner_offsets]
+
+    def bounds(self, positions):
+        """
+        Gets the pixel rectangle covering every corner of the hexes
+        :param Iterable[Hex] positions:
+        :return: Left, top, right and bottom, or None if there are no positions
+        :rtype: tuple[float, float, float, float] or None
+        """
+        left = top = math.inf
+        right = bottom = -math.inf
+        for position in positions:
+            x, y = self.hex_to_pixel(position)
+            left = min(left, x)
+            right = max(right, x)
+            top = min(top, y)
+            bottom = max(bottom, y)
+        if left == math.inf:
+            return None
+        xs = [dx for dx, _ in self.corner_offsets]
+        ys = [dy for _, dy in self.corner_offsets]
+        return left + min(xs), top + min(ys), right + max(xs), bottom + max(ys)
@@ -0,0 +1,96 @@
+"""
+RGB colours of terrain for image output, read from the ANSI colour codes used for text output
+The 16 standard colours use the VGA palette, which the names in Colors follow (0;33 is brown, 1;33 is yellow)
+"""
+# RGB of the foreground colours 30 to 37, and of their bold or bright (90 to 97) versions
+STANDARD_RGB = [(0, 0, 0), (170, 0, 0), (0, 170, 0), (170, 85, 0),
+                (0, 0, 170), (170, 0, 170), (0, 170, 170), (170, 170, 170)]
+BRIGHT_RGB = [(85, 85, 85), (255, 85, 85), (85, 255, 85), (255, 255, 85),
+              (85, 85, 255), (255, 85, 255), (85, 255, 255), (255, 255, 255)]
+# Colour of terrain without a foreground colour, and of undetermined locations
+DEFAULT_RGB = (170, 170, 170)
+UNDETERMINED_RGB = (64, 64, 64)
+
+
+def ansi_to_rgb(colour_code, default=DEFAULT_RGB):
+    """
+    Gets the foreground colour set by ANSI SGR codes
+    Supports the standard and bright colours, 256 colour codes (38;5;n) and true colour codes (38;2;r;g;b)
+    :param str colour_code: One or more escape sequences, such as Colors.GREEN
+    :param tuple[int, int, int] default: The colour if the code doesn't set a foreground colour
+    :rtype: tuple[int, int, int]
+    """
+    colour = None
+    bold = False
+    for sequence in colour_code.split("\033[")[1:]:
+        parameters = [int(value) if value.isdigit() else 0 for value in sequence.partition("m")[0].split(";")]
+        index = 0
+        while index < len(parameters):
+            parameter = parameters[index]
+            if parameter == 0:
+                colour, bold = None, False
+            elif parameter == 1:
+                bold = True
+            elif 30 <= parameter <= 37:
+                colour = parameter - 30
+            elif 90 <= parameter <= 97:
+                colour = BRIGHT_RGB[parameter - 90]
+            elif parameter == 38 and parameters[index + 1:index + 2] == [5] and index + 2 < len(parameters):
+                colour = xterm_rgb(parameters[index + 2])
+                index += 2
+            elif parameter == 38 and parameters[index + 1:index + 2] == [2] and index + 4 < len(parameters):
+                colour = tuple(min(255, value) for value in parameters[index + 2:index + 5])
+                index += 4
+            elif parameter == 39:
+                colour = None
+            index += 1
+    if colour is None:
+        return default
+    if isinstance(colour, int):
+        return (BRIGHT_RGB if bold else STANDARD_RGB)[colour]
+    return colour
+
+
+def xterm_rgb(index):
+    """
+    :param int index: A colour of the xterm 256 colour palette
+    :rtype: tuple[int, int, int]
+    """
+    if index < 8:
+        return STANDARD_RGB[index]
+    if index < 16:
+        return BRIGHT_RGB[index - 8]
+    if index < 232:
+        index -= 16
+        return tuple(0 if level == 0 else 55 + 40 * level for level in (index // 36, index // 6 % 6, index % 6))
+    grey = 8 + 10 * (min(index, 255) - 232)
+    return grey, grey, grey
+
+
+def terrain_rgb(terrain_option):
+    """
+    :param Terrain terrain_option:
+    :return: The colour of the terrain in images
+    :rtype: tuple[int, int, int]
+    """
+    return ansi_to_rgb(terrain_option.colour_code)
+
+
+def location_rgb(location):
+    """
+    :param Location location:
+    :return: The colour of a location in images, its terrain's if it is determined
+    :rtype: tuple[int, int, int]
+    """
+    if location.determined and location.domain:
+        return terrain_rgb(location.terrain_options[0])
+    return UNDETERMINED_RGB
+
+
+def hex_colour(rgb):
+    """
+    :param tuple[int, int, int] rgb:
+    :return: The colour as a CSS hex colour, e.g. '#00aa00'
+    :rtype: str
+    """
+    return "#{:02x}{:02x}{:02x}".format(*rgb)
@@ -0,0 +1,175 @@
+"""
+Raster rendering of maps, written as PPM or PNG images
+Hex centres are put on a lattice of whole pixel steps, the layout's steps rounded, so every hex covers the same
+pixel mask, which is worked out once per lattice, and the masks of neighbouring hexes tile without gaps or overlaps
+Hexes are filled a row of their mask at a time with slice assignment, rather than testing each pixel
+"""
+from dataclasses import dataclass
+import functools
+import math
+import struct
+import zlib
+from hexmap.math.layout import Layout
+from hexmap.render import palette
+
+# Colour of pixels outside every hex
+DEFAULT_BACKGROUND = (0, 0, 0)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@dataclass()
+class Raster:
+    """
+    An RGB image, 3 bytes per pixel in row order
+    """
+    width: int
+    height: int
+    pixels: bytearray
+
+
+def round_steps(whole, half):
+    """
+    Rounds a step of the lattice and a step that should be half of it, keeping it exactly half
+    so the offset rows or columns of the map stay centred between the hexes beside them
+    :param float whole:
+    :param float half:
+    :rtype: tuple[int, int]
+    """
+    if half and math.isclose(whole, 2 * half):
+        half = round(half)
+        return 2 * half, half
+    return round(whole), round(half)
+
+
+def lattice_steps(layout):
+    """
+    Gets the pixel steps between the centres of hexes one step of q and one step of r apart
+    :param Layout layout:
+    :return: The q step and the r step, as x and y
+    :rtype: tuple[tuple[int, int], tuple[int, int]]
+    :raises ValueError: If the hexes are too small to cover any pixels
+    """
+    o = layout.orientation
+    q_x, r_x = round_steps(o.f0 * layout.size[0], o.f1 * layout.size[0])
+    r_y, q_y = round_steps(o.f3 * layout.size[1], o.f2 * layout.size[1])
+    if q_x * r_y - r_x * q_y == 0:
+        raise ValueError(f"Hexes of size {layout.size} are too small to rasterise")
+    return (q_x, q_y), (r_x, r_y)
+
+
+@functools.lru_cache(maxsize=None)
+def pixel_mask(q_step, r_step):
+    """
+    Gets the pixels covered by a hex, the pixels nearer its centre than any neighbour's
+    Pixels as near to a neighbour are given to the centre that is higher, then further left,
+    which is the same for every hex, so each pixel is covered by exactly one hex
+    :param tuple[int, int] q_step: Pixel step between hexes one step of q apart
+    :param tuple[int, int] r_step: Pixel step between hexes one step of r apart
+    :return: The rows of the mask as (dy, first dx, last dx + 1) relative to the hex's centre
+    :rtype: tuple[tuple[int, int, int], ...]
+    """
+    neighbours = [(q * q_step[0] + r * r_step[0], q * q_step[1] + r * r_step[1])
+                  for q, r in ((1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1))]
+    reach = max(abs(value) for neighbour in neighbours for value in neighbour)
+    spans = []
+    for dy in range(-reach, reach + 1):
+        covered = []
+        for dx in range(-reach, reach + 1):
+            distance = dx * dx + dy * dy
+            for x, y in neighbours:
+                neighbour_distance = (dx - x) ** 2 + (dy - y) ** 2
+                if neighbour_distance < distance or (neighbour_distance == distance and (y, x) < (0, 0)):
+                    break
+            else:
+                covered.append(dx)
+        # Hexes are convex, so the covered pixels of a row are contiguous
+        if covered:
+            spans.append((dy, covered[0], covered[-1] + 1))
+    return tuple(spans)
+
+
+def rasterise(grid, layout=None, background=DEFAULT_BACKGROUND):
+    """
+    Renders a map to an RGB image
+    :param builder.Grid grid: The map to render
+    :param layout: The pixel geometry of the hexes, pointy hexes of size 10 if None, its origin is ignored
+    :type layout: Layout or None
+    :param tuple[int, int, int] background: Colour of the pixels outside every hex
+    :rtype: Raster
+    """
+    if layout is None:
+        layout = Layout(size=(10.0, 10.0))
+    (q_x, q_y), (r_x, r_y) = lattice_steps(layout)
+    spans = pixel_mask((q_x, q_y), (r_x, r_y))
+    positions = grid.grid
+    if not positions:
+        return Raster(0, 0, bytearray())
+    left = top = math.inf
+    right = bottom = -math.inf
+    for q, r, _ in positions:
+        x = q * q_x + r * r_x
+        y = q * q_y + r * r_y
+        left = min(left, x)
+        right = max(right, x)
+        top = min(top, y)
+        bottom = max(bottom, y)
+    top += spans[0][0]
+    left += min(first for _, first, _ in spans)
+    width = right + max(end for _, _, end in spans) - left
+    height = bottom + spans[-1][0] + 1 - top
+    pixels = bytearray(bytes(background) * (width * height))
+    # Byte offsets of the rows of the mask from the centre pixel, and the bytes to fill them with in each colour
+    offsets = [((dy * width + first) * 3, (dy * width + end) * 3) for dy, first, end in spans]
+    fills = {}
+    for (q, r, _), location in positions.items():
+        key = (location.ruleset, location.domain, location.determined)
+        fill = fills.get(key)
+        if fill is None:
+            rgb = bytes(palette.location_rgb(location))
+            fill = fills[key] = [(start, end, rgb * ((end - start) // 3)) for start, end in offsets]
+        centre = ((q * q_y + r * r_y - top) * width + q * q_x + r * r_x - left) * 3
+        for start, end, run in fill:
+            pixels[centre + start:centre + end] = run
+    return Raster(width, height, pixels)
+
+
+def write_ppm(raster, stream):
+    """
+    Writes an image as a binary PPM
+    :param Raster raster:
+    :param stream: Binary file-like object to write to
+    """
+    stream.write(f"P6\n{raster.width} {raster.height}\n255\n".encode("ascii"))
+    stream.write(raster.pixels)
+
+
+def png_chunk(chunk_type, data):
+    """
+    :param bytes chunk_type:
+    :param bytes data:
+    :return: The chunk with its length and checksum
+    :rtype: bytes
+    """
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def write_png(raster, stream, level=6):
+    """
+    Writes an image as an 8 bit RGB PNG, compressed a row at a time
+    :param Raster raster:
+    :param stream: Binary file-like object to write to
+    :param int level: zlib compression level
+    """
+    compressor = zlib.compressobj(level)
+    compressed = []
+    row_size = raster.width * 3
+    pixels = memoryview(raster.pixels)
+    for row in range(raster.height):
+        # Each row starts with its filter type, 0 for none
+        compressed.append(compressor.compress(b"\x00"))
+        compressed.append(compressor.compress(pixels[row * row_size:(row + 1) * row_size]))
+    compressed.append(compressor.flush())
+    stream.write(PNG_SIGNATURE)
+    stream.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", raster.width, raster.height, 8, 2, 0, 0, 0)))
+    stream.write(png_chunk(b"IDAT", b"".join(compressed)))
+    stream.write(png_chunk(b"IEND", b""))
@@ -0,0 +1,67 @@
+"""
+SVG rendering of maps
+The hex polygon of each terrain is defined once, and each cell is a <use> of its terrain's polygon at the cell's centre,
+so the output grows by one short element per cell and is written as it is rendered
+"""
+import html
+from hexmap.math.layout import Layout
+from hexmap.render import palette
+
+# Cells written to the stream at a time
+WRITE_BATCH = 4096
+
+
+def polygon_points(layout):
+    """
+    :param Layout layout:
+    :return: The corners of a hex relative to its centre, as the points attribute of a polygon
+    :rtype: str
+    """
+    return " ".join(f"{x:.2f},{y:.2f}" for x, y in layout.corner_offsets)
+
+
+def write_svg(grid, stream, layout=None, outline="#000000"):
+    """
+    Writes a map to a text stream as an SVG image
+    :param builder.Grid grid: The map to render
+    :param stream: File-like object to write to
+    :param layout: The pixel geometry of the hexes, pointy hexes of size 10 if None
+    :type layout: Layout or None
+    :param outline: CSS colour of the hex outlines, None for no outlines
+    :type outline: str or None
+    """
+    if layout is None:
+        layout = Layout(size=(10.0, 10.0))
+    positions = grid.grid
+    left, top, right, bottom = layout.bounds(positions) or (0.0, 0.0, 0.0, 0.0)
+    stream.write(f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                 f'viewBox="{left:.2f} {top:.2f} {right - left:.2f} {bottom - top:.2f}" '
+                 f'width="{right - left:.0f}" height="{bottom - top:.0f}">\n')
+    stroke = (f' stroke="{outline}" stroke-width="{min(layout.size) / 10:.2f}" stroke-linejoin="round"'
+              if outline is not None else "")
+    points = polygon_points(layout)
+    # One polygon per terrain, defined when its first cell is written
+    symbols = {}
+    cells = {}
+    batch = []
+    hex_to_pixel = layout.hex_to_pixel
+    for position, location in positions.items():
+        key = (location.ruleset, location.domain, location.determined)
+        cell = cells.get(key)
+        if cell is None:
+            name = location.terrain_options[0].name if location.determined and location.domain else None
+            symbol = symbols.get(name)
+            if symbol is None:
+                symbol = symbols[name] = f"terrain-{len(symbols)}"
+                label = html.escape(name or "undetermined")
+                colour = palette.hex_colour(palette.location_rgb(location))
+                batch.append(f'<defs><polygon id="{symbol}" class="{label}" points="{points}" fill="{colour}"{stroke}/>'
+                             f'</defs>\n')
+            cell = cells[key] = f'<use xlink:href="#{symbol}" x="'
+        x, y = hex_to_pixel(position)
+        batch.append(f'{cell}{x:.2f}" y="{y:.2f}"/>\n')
+        if len(batch) >= WRITE_BATCH:
+            stream.write("".join(batch))
+            batch.clear()
+    stream.write("".join(batch))
+    stream.write("</svg>\n")
@@ -0,0 +1,70 @@
+"""
+Text rendering of rectangle maps, in the same layout as printing a Grid
+Rows are rendered one at a time, so a map can be written to a stream without building the whole output
+"""
+import itertools
+
+
+def plain_cell(location):
+    """
+    Renders a location without ANSI colour codes
+    :param Location location: The location to render
+    :rtype: str
+    """
+    if location.determined:
+        return f"({location.terrain_options[0].name:^{location.longest}})"
+    return f"({'?':^{location.longest}})"
+
+
+def indent(longest):
+    """
+    :param int longest: Length of the longest terrain name in the row
+    :return: The leading whitespace of an offset row
+    :rtype: str
+    """
+    return " " * (1 + (longest + 1) // 2)
+
+
+def render_lines(grid, colour=True, coordinates=True):
+    """
+    Renders a map line by line
+    Each distinct location is rendered once and reused, so rendering is linear in the size of the map
+    :param builder.Grid grid: The map to render, with positions in row order
+    :param bool colour: If true include ANSI colour codes
+    :param bool coordinates: If true follow each row of terrain with a row of axial coordinates
+    :return: Generator of lines, without line endings
+    :rtype: Iterator[str]
+    """
+    cells = {}
+    render_cell = str if colour else plain_cell
+    items = iter(grid.grid.items())
+    while True:
+        row = list(itertools.islice(items, grid.width))
+        if len(row) < grid.width or not row:
+            return
+        # Odd rows are offset, so windows of a map line up the same as the whole map
+        offset = row[0][0].r % 2 == 1
+        locations = []
+        for _, location in row:
+            key = (location.ruleset, location.domain, location.determined)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = render_cell(location)
+            locations.append(cell)
+        leading_whitespace = indent(row[-1][1].longest) if offset else ""
+        yield leading_whitespace + "".join(locations)
+        if coordinates:
+            yield leading_whitespace + "".join(position.axial_string(location.longest) for position, location in row)
+
+
+def write_grid(grid, stream, colour=True, coordinates=True):
+    """
+    Writes a map to a text stream, one row at a time
+    :param builder.Grid grid: The map to render, with positions in row order
+    :param stream: File-like object to write to
+    :param bool colour: If true include ANSI colour codes
+    :param bool coordinates: If true follow each row of terrain with a row of axial coordinates
+    """
+    for line in render_lines(grid, colour, coordinates):
+        stream.write(line)
+        stream.write("\n")
@@ -0,0 +1,155 @@
+"""
+Text rendering of a scrollable window of a rectangle map, for terminal interfaces
+Rows and columns are in the map's coordinates, the same as mapfile.MapFile.read_window, row r and column q + r // 2
+The rendered rows of the window are cached, and the map reports the positions that change through
+Positions.track_changes, so a frame only renders rows that scrolled into view or changed since the last frame
+"""
+from collections import OrderedDict
+from hexmap.cartographer import editing
+from hexmap.math.hexgrid import make_hex
+from hexmap.render import text
+
+DEFAULT_HEIGHT = 20
+DEFAULT_WIDTH = 40
+# Rendered rows kept for each row of the window, so scrolling back doesn't render them again
+CACHED_SCREENS = 4
+
+
+class Viewport:
+    """
+    A window of a map rendered as text lines, laid out the same as printing the map
+    Only one viewport of a map sees its changes, as each frame clears the map's set of changed positions
+    """
+
+    def __init__(self, grid, height=DEFAULT_HEIGHT, width=DEFAULT_WIDTH, colour=True, coordinates=False):
+        """
+        :param builder.Grid grid: The map, with positions in row order as hexgrid.build_rectangle
+        :param int height: Number of rows in the window
+        :param int width: Number of columns in the window
+        :param bool colour: If true include ANSI colour codes
+        :param bool coordinates: If true follow each row of terrain with a row of axial coordinates
+        """
+        self.grid = grid
+        self.colour = colour
+        self.coordinates = coordinates
+        self.positions = None
+        first = next(iter(grid.grid), None)
+        self.map_top = first.r if first is not None else 0
+        self.map_left = first.q + first.r // 2 if first is not None else 0
+        self.height = self.width = 0
+        self.top, self.left = self.map_top, self.map_left
+        # Rendered lines of each row for the columns in rows_columns, least recently shown first
+        self.rows = OrderedDict()
+        self.rows_columns = None
+        self.cells = {}
+        # Number of rows rendered, rather than taken from the cache
+        self.rendered_rows = 0
+        self.resize(height, width)
+
+    def resize(self, height, width):
+        """
+        Changes the size of the window, keeping its top left corner where it fits
+        :param int height: Number of rows in the window
+        :param int width: Number of columns in the window
+        """
+        self.height = max(0, min(height, self.grid.height))
+        self.width = max(0, min(width, self.grid.width))
+        self.scroll_to(self.top, self.left)
+
+    def scroll_to(self, top, left):
+        """
+        Moves the top left corner of the window, keeping the window inside the map
+        :param int top: Top row of the window
+        :param int left: Left column of the window
+        """
+        top = max(self.map_top, min(top, self.map_top + self.grid.height - self.height))
+        left = max(self.map_left, min(left, self.map_left + self.grid.width - self.width))
+        self.top, self.left = top, left
+
+    def scroll(self, rows, columns):
+        """
+        Moves the window
+        :param int rows: Rows to move down, negative to move up
+        :param int columns: Columns to move right, negative to move left
+        """
+        self.scroll_to(self.top + rows, self.left + columns)
+
+    def invalidate(self, positions=None):
+        """
+        Drops the rendered rows of positions, so they are rendered again on the next frame
+        :param positions: The changed positions, every position if None
+        :type positions: Iterable[Hex] or None
+        """
+        if positions is None:
+            self.rows.clear()
+            return
+        for position in positions:
+            self.rows.pop(position.r, None)
+
+    def _track_changes(self):
+        # Editing the map may replace a plain dict with Positions, which starts tracking again
+        positions = editing.editable_positions(self.grid)
+        if positions is not self.positions:
+            self.positions = positions
+            positions.track_changes()
+            self.rows.clear()
+        changed = positions.changed
+        self.invalidate(changed)
+        changed.clear()
+
+    def render_row(self, r):
+        """
+        Renders the columns of the window in a row of the map
+        :param int r: The row
+        :return: The lines of the row
+        :rtype: tuple[str, ...]
+        """
+        render_cell = str if self.colour else text.plain_cell
+        positions = self.positions
+        cells = self.cells
+        row = [(position, positions[position])
+               for position in (make_hex(column - r // 2, r) for column in range(self.left, self.left + self.width))]
+        rendered = []
+        for _, location in row:
+            key = (location.ruleset, location.domain, location.determined)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = render_cell(location)
+            rendered.append(cell)
+        # Odd rows are offset, the same as text.render_lines
+        leading_whitespace = text.indent(row[-1][1].longest) if r % 2 == 1 else ""
+        lines = (leading_whitespace + "".join(rendered),)
+        if self.coordinates:
+            lines += (leading_whitespace + "".join(position.axial_string(location.longest)
+                                                   for position, location in row),)
+        self.rendered_rows += 1
+        return lines
+
+    def frame(self):
+        """
+        Renders the window, only rendering rows that aren't cached or changed since the last frame
+        :return: The lines of the window
+        :rtype: list[str]
+        """
+        self._track_changes()
+        if not self.width:
+            return []
+        rows = self.rows
+        if self.rows_columns != (self.left, self.width):
+            # Scrolling sideways changes the columns of every row
+            rows.clear()
+            self.rows_columns = (self.left, self.width)
+        lines = []
+        for r in range(self.top, self.top + self.height):
+            row = rows.get(r)
+            if row is None:
+                row = rows[r] = self.render_row(r)
+            else:
+                rows.move_to_end(r)
+            lines.extend(row)
+        while len(rows) > CACHED_SCREENS * self.height:
+            rows.popitem(last=False)
+        return lines
+
+    def __str__(self):
+        return "".join(f"{line}\n" for line in self.frame())
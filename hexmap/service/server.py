@@ -0,0 +1,431 @@
+"""
+Local HTTP tile server
+Keeps maps in memory and serves rectangular windows of them, called tiles, as JSON or text
+Maps are generated in a process pool that is started with the server, and tiles are rendered in a thread,
+so the event loop never waits on either, and rendered tiles are kept in an LRU cache keyed by map, window and format
+Only the parts of HTTP/1.1 a frontend needs are supported: GET and POST without a body, with keep-alive
+
+Routes:
+    GET /maps                   The maps in memory
+    POST /maps?height=&width=&towns=&lakes=&seed=
+                                Generates a map of at most MAX_MAP_CELLS cells, or returns the existing map
+                                generated with the same options
+    GET /maps/<id>              A map's size and seed
+    GET /maps/<id>/tile?top=&left=&height=&width=&format=json|text&coordinates=0|1
+                                A window of a map, rows and columns are in the offset layout of hexgrid.build_rectangle
+    GET /stats                  Cache statistics
+"""
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import json
+import os
+import random
+from urllib.parse import parse_qs, urlsplit
+from hexmap.cartographer import builder
+from hexmap.render import text
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_SIZE = 1024
+# Largest window served in one tile, in cells
+MAX_TILE_CELLS = 256 * 256
+# Largest map generated for one request, in cells
+MAX_MAP_CELLS = 1000 * 1000
+CONTENT_TYPES = {
+    "json": "application/json",
+    "text": "text/plain; charset=utf-8",
+}
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """
+    An error response
+    """
+
+    def __init__(self, status, message):
+        """
+        :param int status: HTTP status code
+        :param str message: Description of the error, sent as the response body
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LRUCache:
+    """
+    A mapping that holds at most maxsize entries, evicting the least recently used
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        """
+        :param int maxsize: Most entries to hold, nothing is cached if 0
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        :param key:
+        :return: The cached value, None if it is not cached
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        :param key:
+        :param value: The value to cache, must not be None
+        """
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+@dataclass()
+class MapEntry:
+    """
+    A rectangle map held in memory, with its positions in row order for finding windows
+    """
+    grid: builder.Grid
+    seed: int
+    positions: list
+    top: int
+    left: int
+
+    @classmethod
+    def from_grid(cls, grid, seed=None):
+        """
+        :param builder.Grid grid: The map, with positions in row order as hexgrid.build_rectangle
+        :param seed: The seed the map was generated from
+        :type seed: int or None
+        :rtype: MapEntry
+        """
+        positions = list(grid.grid)
+        if not positions:
+            raise ValueError("Cannot serve an empty map")
+        top = positions[0].r
+        return cls(grid, seed, positions, top, positions[0].q + top // 2)
+
+    def info(self, map_id):
+        """
+        :param str map_id: The id the map is served under
+        :rtype: dict
+        """
+        return {"id": map_id, "top": self.top, "left": self.left, "height": self.grid.height,
+                "width": self.grid.width, "seed": self.seed}
+
+    def window(self, top, left, height, width):
+        """
+        Gets a rectangle of the map, the same as mapfile.MapFile.read_window
+        :param int top: Top row of the window
+        :param int left: Left column of the window
+        :param int height: Height of the window
+        :param int width: Width of the window
+        :return: The window, with positions in row order
+        :rtype: builder.Grid
+        """
+        if (height <= 0 or width <= 0 or top < self.top or left < self.left
+                or top + height > self.top + self.grid.height or left + width > self.left + self.grid.width):
+            raise ValueError("Window is not inside the map")
+        locations = self.grid.grid
+        window = {}
+        for row in range(top - self.top, top - self.top + height):
+            start = row * self.grid.width + left - self.left
+            for position in self.positions[start:start + width]:
+                window[position] = locations[position]
+        return builder.Grid(window, height, width)
+
+
+def render_tile(window, file_format, coordinates=False):
+    """
+    Renders a window of a map
+    :param builder.Grid window: The window, with positions in row order
+    :param str file_format: "json" for the terrain names of each row, None for undetermined cells,
+        or "text" for the same plain text as printing the map
+    :param bool coordinates: If true follow each row of text with a row of axial coordinates
+    :return: The response body
+    :rtype: bytes
+    """
+    if file_format == "json":
+        names = [location.terrain_options[0].name if location.determined and location.domain else None
+                 for location in window.grid.values()]
+        first = next(iter(window.grid))
+        return json.dumps({"top": first.r, "left": first.q + first.r // 2, "height": window.height,
+                           "width": window.width,
+                           "terrain": [names[start:start + window.width]
+                                       for start in range(0, len(names), window.width)]}).encode("utf-8")
+    if file_format == "text":
+        return "".join(f"{line}\n" for line in text.render_lines(window, False, coordinates)).encode("utf-8")
+    raise HTTPError(400, f"Unknown tile format: {file_format}")
+
+
+def int_parameter(query, name, default=None):
+    """
+    :param dict[str, list[str]] query: Parsed query string
+    :param str name: Name of the parameter
+    :param default: Value if the parameter is missing, the parameter is required if None
+    :rtype: int
+    """
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise HTTPError(400, f"Missing parameter: {name}")
+        return default
+    try:
+        return int(values[-1])
+    except ValueError:
+        raise HTTPError(400, f"Parameter {name} must be an integer") from None
+
+
+class TileServer:
+    """
+    Serves tiles of maps held in memory
+    """
+
+    def __init__(self, generate, cache_size=DEFAULT_CACHE_SIZE, workers=None):
+        """
+        :param generate: Picklable function called in a worker process with height, width, town_count,
+            lake_count and seed that returns a generated builder.Grid
+        :type generate: callable
+        :param int cache_size: Most rendered tiles to cache
+        :param workers: Number of worker processes generating maps, the number of CPUs if None
+        :type workers: int or None
+        """
+        self.generate = generate
+        self.cache = LRUCache(cache_size)
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.maps = {}
+        # Maps being generated and tiles being rendered, so concurrent requests for the same one wait on one task
+        self.pending = {}
+        self.rendering = {}
+        self.executor = None
+        self.server = None
+
+    def add_map(self, map_id, grid, seed=None):
+        """
+        Adds a map to serve, replacing any map with the same id
+        :param str map_id: The id to serve the map under
+        :param builder.Grid grid: The map
+        :param seed: The seed the map was generated from
+        :type seed: int or None
+        """
+        self.maps[map_id] = MapEntry.from_grid(grid, seed)
+        # Tiles rendered from a replaced map are stale
+        for key in [key for key in self.cache.entries if key[0] == map_id]:
+            del self.cache.entries[key]
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Starts the worker processes and begins accepting connections
+        :param str host: Address to listen on
+        :param int port: Port to listen on, any free port if 0
+        :return: The address the server is listening on
+        :rtype: tuple[str, int]
+        """
+        loop = asyncio.get_running_loop()
+        self.executor = ProcessPoolExecutor(self.workers)
+        # Every worker is started now, rather than on the first generation request
+        await asyncio.gather(*(loop.run_in_executor(self.executor, int) for _ in range(self.workers)))
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def generate_map(self, height, width, town_count, lake_count, seed):
+        """
+        Generates a map in the worker processes, unless the same map is already in memory
+        :return: The id of the map
+        :rtype: str
+        :raises HTTPError: If the map is empty or larger than MAX_MAP_CELLS
+        """
+        if height <= 0 or width <= 0:
+            raise HTTPError(400, "Maps must have a positive height and width")
+        if height * width > MAX_MAP_CELLS:
+            raise HTTPError(400, f"Maps are limited to {MAX_MAP_CELLS} cells")
+        map_id = f"{seed}-{height}x{width}-{town_count}-{lake_count}"
+        if map_id in self.maps:
+            return map_id
+        future = self.pending.get(map_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.pending[map_id] = loop.run_in_executor(self.executor, self.generate, height, width,
+                                                                 town_count, lake_count, seed)
+        try:
+            grid = await future
+        except ValueError as error:
+            raise HTTPError(400, str(error)) from None
+        finally:
+            self.pending.pop(map_id, None)
+        if map_id not in self.maps:
+            self.add_map(map_id, grid, seed)
+        return map_id
+
+    def get_entry(self, map_id):
+        entry = self.maps.get(map_id)
+        if entry is None:
+            raise HTTPError(404, f"No map {map_id}")
+        return entry
+
+    async def tile(self, map_id, query):
+        """
+        Gets a rendered tile, from the cache if it was rendered before, else rendered in a thread
+        :param str map_id: The map to get the tile of
+        :param dict[str, list[str]] query: Parsed query string of the request
+        :return: Content type and body
+        :rtype: tuple[str, bytes]
+        """
+        entry = self.get_entry(map_id)
+        top = int_parameter(query, "top", entry.top)
+        left = int_parameter(query, "left", entry.left)
+        height = int_parameter(query, "height", entry.grid.height)
+        width = int_parameter(query, "width", entry.grid.width)
+        file_format = query.get("format", ["json"])[-1]
+        coordinates = query.get("coordinates", ["0"])[-1] not in ("0", "false")
+        if file_format not in CONTENT_TYPES:
+            raise HTTPError(400, f"Unknown tile format: {file_format}")
+        if height * width > MAX_TILE_CELLS:
+            raise HTTPError(400, f"Tiles are limited to {MAX_TILE_CELLS} cells")
+        key = (map_id, top, left, height, width, file_format, coordinates)
+        body = self.cache.get(key)
+        if body is None:
+            try:
+                window = entry.window(top, left, height, width)
+            except ValueError as error:
+                raise HTTPError(400, str(error)) from None
+            future = self.rendering.get(key)
+            if future is None:
+                future = self.rendering[key] = asyncio.ensure_future(
+                    asyncio.to_thread(render_tile, window, file_format, coordinates))
+            try:
+                body = await future
+            finally:
+                self.rendering.pop(key, None)
+            self.cache.put(key, body)
+        return CONTENT_TYPES[file_format], body
+
+    async def respond(self, method, target):
+        """
+        Routes a request
+        :param str method: HTTP method
+        :param str target: Request target, the path and query string
+        :return: Content type and body
+        :rtype: tuple[str, bytes]
+        """
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["maps"] and method == "POST":
+            seed = int_parameter(query, "seed", random.randrange(1 << 32))
+            map_id = await self.generate_map(int_parameter(query, "height", 20), int_parameter(query, "width", 15),
+                                             int_parameter(query, "towns", 5), int_parameter(query, "lakes", 2),
+                                             seed)
+            return CONTENT_TYPES["json"], json.dumps(self.maps[map_id].info(map_id)).encode("utf-8")
+        if method != "GET":
+            raise HTTPError(405, f"{method} is not supported for {url.path}")
+        if parts == ["maps"]:
+            body = {"maps": [entry.info(map_id) for map_id, entry in self.maps.items()]}
+        elif len(parts) == 2 and parts[0] == "maps":
+            body = self.get_entry(parts[1]).info(parts[1])
+        elif len(parts) == 3 and parts[0] == "maps" and parts[2] == "tile":
+            return await self.tile(parts[1], query)
+        elif parts == ["stats"]:
+            body = {"maps": len(self.maps), "cached_tiles": len(self.cache), "cache_hits": self.cache.hits,
+                    "cache_misses": self.cache.misses}
+        else:
+            raise HTTPError(404, f"No route for {url.path}")
+        return CONTENT_TYPES["json"], json.dumps(body).encode("utf-8")
+
+    async def handle(self, reader, writer):
+        """
+        Serves requests on one connection until the client closes it
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.write_response(writer, 400, CONTENT_TYPES["text"], b"Malformed request line", False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                try:
+                    content_type, body = await self.respond(method, target)
+                    status = 200
+                except HTTPError as error:
+                    status, content_type, body = error.status, CONTENT_TYPES["text"], error.message.encode("utf-8")
+                except Exception as error:
+                    status, content_type, body = 500, CONTENT_TYPES["text"], repr(error).encode("utf-8")
+                await self.write_response(writer, status, content_type, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def write_response(writer, status, content_type, body, keep_alive):
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                     f"Content-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                     "\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve_forever(server, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+    """
+    Runs a tile server until cancelled
+    :param TileServer server: The server to run
+    :param str host: Address to listen on
+    :param int port: Port to listen on
+    :param ready: Called with the address once the server is accepting connections
+    :type ready: callable or None
+    """
+    address = await server.start(host, port)
+    if ready is not None:
+        ready(address)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,51 @@
+import random
+import pytest
+from hexmap import app
+from hexmap.cartographer import builder
+from hexmap.cartographer.arraygrid import ArrayGrid
+from hexmap.features import terrain
+from hexmap.math import hexgrid
+
+pytest.importorskip("numpy")
+
+
+def cells(grid):
+    return [(position, location.domain, location.determined) for position, location in grid.grid.items()]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_backends_generate_the_same_map(seed):
+    maps = [app.generate_map(backend, height=14, width=11, town_count=2, lake_count=1, seed=seed)
+            for backend in ("dict", "array")]
+    assert cells(maps[0]) == cells(maps[1])
+
+
+def test_grid_round_trips_through_array():
+    grid = app.generate_map(height=7, width=9, town_count=1, lake_count=1, seed=8)
+    array_grid = ArrayGrid.from_grid(grid)
+    assert array_grid.is_complete() and len(array_grid) == len(grid.grid)
+    assert cells(array_grid.to_grid()) == cells(grid)
+
+
+def test_backends_place_features_the_same():
+    placed = []
+    for backend in ("dict", "array"):
+        positions = builder.create_rectangle_hexmap(10, 10, terrain.get_default_terrain(), backend, random.Random(6))
+        app.place_features(positions, town_count=3, lake_count=2)
+        placed.append([builder.get_cell_state(position, positions)
+                       for position in hexgrid.build_rectangle_of_size(10, 10)])
+    assert placed[0] == placed[1]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_backends_complete_lowest_entropy_the_same(seed):
+    completed = []
+    for backend in ("dict", "array"):
+        positions = builder.create_rectangle_hexmap(10, 10, terrain.get_default_terrain(), backend,
+                                                    random.Random(seed))
+        app.place_features(positions, town_count=2, lake_count=1)
+        app.complete_map(positions, lowest_entropy=True)
+        completed.append([builder.get_cell_state(position, positions)
+                          for position in hexgrid.build_rectangle_of_size(10, 10)])
+    assert all(determined for _, determined in completed[0])
+    assert completed[0] == completed[1]
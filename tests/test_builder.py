@@ -0,0 +1,104 @@
+import random
+import pytest
+from hexmap import app
+from hexmap.cartographer import builder
+from hexmap.cartographer.trail import Contradiction
+from hexmap.features.terrain import Terrain
+
+# Colouring the map with four colours, no two neighbours the same, contradicts often without backtracking
+FOUR_COLOURS = [Terrain(name, [other for other in "abcd" if other != name], "") for name in "abcd"]
+# Three colours and a fourth terrain that can only be next to itself and the first colour
+THREE_COLOURS_AND_LAKES = [Terrain("a", ["b", "c", "d"], ""), Terrain("b", ["a", "c"], ""),
+                           Terrain("c", ["a", "b"], ""), Terrain("d", ["a", "d"], "")]
+
+
+def domains(positions):
+    if isinstance(positions, builder.Positions):
+        return [location.domain for location in positions.values()]
+    return positions.domains.tolist()
+
+
+def assert_valid(positions):
+    ruleset = builder.get_ruleset(positions)
+    for position in positions:
+        domain, determined = builder.get_cell_state(position, positions)
+        assert determined and domain and not domain & (domain - 1), position
+        for neighbour in builder.get_neighbours(position, positions):
+            neighbour_domain, _ = builder.get_cell_state(neighbour, positions)
+            assert ruleset.supports[domain] & neighbour_domain, (position, neighbour)
+
+
+@pytest.mark.parametrize("terrains", [FOUR_COLOURS, THREE_COLOURS_AND_LAKES])
+def test_restrictive_rulesets_complete_within_default_limit(terrains):
+    for seed in range(5):
+        positions = builder.create_rectangle_hexmap(15, 15, terrains, rng=random.Random(seed))
+        backtracks = builder.complete_with_backtracking(positions)
+        assert backtracks <= builder.DEFAULT_BACKTRACK_LIMIT
+        assert_valid(positions)
+
+
+def test_maps_without_contradictions_are_unchanged_by_backtracking():
+    terrains = [Terrain(name, list("abc"), "") for name in "abc"]
+    positions = builder.create_rectangle_hexmap(10, 10, terrains, rng=random.Random(3))
+    assert builder.complete_with_backtracking(positions) == 0
+    assert positions.restarts == 0
+    expected = builder.create_rectangle_hexmap(10, 10, terrains, rng=random.Random(3))
+    while expected.undetermined:
+        builder.set_terrain_for_location(None, expected, None)
+    assert domains(positions) == domains(expected)
+
+
+def test_backends_backtrack_the_same():
+    pytest.importorskip("numpy")
+    for seed in range(4):
+        completed = []
+        for backend in ("dict", "array"):
+            positions = builder.create_rectangle_hexmap(12, 12, FOUR_COLOURS, backend, random.Random(seed))
+            backtracks = builder.complete_with_backtracking(positions)
+            completed.append((backtracks, positions.restarts, domains(positions)))
+        assert completed[0] == completed[1], seed
+
+
+def test_backtrack_limit_raises_contradiction():
+    positions = builder.create_rectangle_hexmap(15, 15, FOUR_COLOURS, rng=random.Random(0))
+    with pytest.raises(Contradiction):
+        builder.complete_with_backtracking(positions, backtrack_limit=0)
+    assert positions.trail is None
+
+
+def test_complete_map_keeps_old_signature():
+    positions = builder.create_rectangle_hexmap(6, 6, FOUR_COLOURS, rng=random.Random(1))
+    app.complete_map(positions, builder.Grid(positions, 6, 6))
+    assert_valid(positions)
+
+
+def revise_until_unchanged(positions):
+    # Revises every position against its neighbours until nothing changes, the slow way propagation has to agree with
+    changed = True
+    while changed:
+        changed = False
+        for position, location in positions.items():
+            neighbours = builder.get_neighbours(position, positions)
+            changed |= location.revise([positions[neighbour] for neighbour in neighbours])
+
+
+def test_propagation_reaches_the_same_fixed_point_as_revising_everything():
+    for seed in range(10):
+        positions = builder.create_rectangle_hexmap(8, 8, THREE_COLOURS_AND_LAKES, rng=random.Random(seed))
+        rng = random.Random(seed)
+        for _ in range(6):
+            if positions.undetermined:
+                builder.set_terrain_for_location(rng.choice(list(positions.undetermined)), positions, None)
+        expected = {position: (location.domain, location.determined) for position, location in positions.items()}
+        revise_until_unchanged(positions)
+        assert {position: (location.domain, location.determined) for position, location in positions.items()} == \
+               expected, seed
+
+
+def test_long_cascades_do_not_recurse():
+    # Two terrains that can only be next to each other force a whole row from one cell
+    terrains = [Terrain("a", ["b"], ""), Terrain("b", ["a"], "")]
+    positions = builder.create_rectangle_hexmap(1, 5000, terrains)
+    builder.set_terrain_for_location(next(iter(positions)), positions, terrains[0])
+    assert not positions.undetermined
+    assert builder.unsupported_neighbours(list(positions), positions) is None
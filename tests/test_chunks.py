@@ -0,0 +1,38 @@
+import functools
+from hexmap import app
+from hexmap.cartographer import chunks
+from hexmap.features import terrain
+from hexmap.math import hexgrid
+
+
+def terrain_names(chunk):
+    return {position: location.terrain_options[0].name for position, location in chunk.positions.items()}
+
+
+def test_reconciled_seams_are_valid_and_keep_stamped_cells():
+    terrains = terrain.get_default_terrain()
+    populate = functools.partial(app.place_features, town_count=2, lake_count=1)
+    for seed in range(20):
+        border = {}
+        for column, row in chunks.chunk_coordinates(3, 3):
+            chunk = chunks.generate_independent_chunk((column, row), 8, terrains, populate, seed)
+            stamped = {position: chunk.positions[position] for position in chunk.stamped}
+            # Stamped cells can only be kept if they allow the completed cells next to them
+            clashing = {position for position, location in stamped.items()
+                        if any(neighbour in border and not chunks.compatible(location, border[neighbour])
+                               for neighbour in hexgrid.hex_neighbors(position))}
+            chunks.reconcile_chunk(chunk, border, terrains, chunks.chunk_rng(seed, column, row, "seam"))
+            for position, location in chunk.positions.items():
+                assert location.determined
+                for neighbour in hexgrid.hex_neighbors(position):
+                    if neighbour in border:
+                        assert chunks.compatible(location, border[neighbour]), (seed, position)
+            for position, location in stamped.items():
+                assert (chunk.positions[position] is location) == (position not in clashing), (seed, position)
+            chunks.update_border(border, chunk, 3)
+
+
+def test_parallel_chunks_do_not_depend_on_workers():
+    generate = functools.partial(chunks.generate_chunks_parallel, 6, 3, 2, seed=7)
+    single = [terrain_names(chunk) for chunk in generate(workers=1)]
+    assert single == [terrain_names(chunk) for chunk in generate(workers=2)]
@@ -0,0 +1,63 @@
+import random
+from hexmap import app
+from hexmap.cartographer import builder, editing
+
+
+def states(grid):
+    return {position: (location.domain, location.determined) for position, location in grid.grid.items()}
+
+
+def terrain_named(grid, name):
+    return next(terrain_option for terrain_option in builder.get_ruleset(grid.grid).terrains
+                if terrain_option.name == name)
+
+
+def assert_valid(grid):
+    positions = grid.grid
+    assert not positions.undetermined
+    assert builder.unsupported_neighbours(list(positions), positions) is None
+
+
+def test_edits_keep_the_map_valid_and_undo_redo():
+    grid = app.generate_map(height=12, width=12, town_count=2, lake_count=1, seed=4)
+    rng = random.Random(4)
+    history = [states(grid)]
+    water = terrain_named(grid, "water")
+    for edit_map in (lambda position: grid.set_terrain(position, water),
+                     lambda position: grid.reroll(position),
+                     lambda position: grid.set_terrain([position] + builder.get_neighbours(position, grid.grid),
+                                                       water)):
+        position = rng.choice(list(grid.grid))
+        edit = edit_map(position)
+        assert_valid(grid)
+        assert {changed for changed, *_ in edit.changes} <= set(grid.grid)
+        history.append(states(grid))
+    for expected in reversed(history[:-1]):
+        assert grid.undo() is not None
+        assert states(grid) == expected
+    assert grid.undo() is None
+    for expected in history[1:]:
+        assert grid.redo() is not None
+        assert states(grid) == expected
+    assert grid.redo() is None
+
+
+def test_clear_leaves_the_options_the_neighbours_allow():
+    grid = app.generate_map(height=8, width=8, town_count=1, lake_count=1, seed=2)
+    position = next(iter(grid.grid))
+    grid.clear(position)
+    location = grid.grid[position]
+    assert not location.determined and position in grid.grid.undetermined
+    for terrain_option in location.terrain_options:
+        for neighbour in builder.get_neighbours(position, grid.grid):
+            assert location.ruleset.supports[grid.grid[neighbour].domain] & location.ruleset.bit(terrain_option)
+
+
+def test_new_edit_drops_redo_history():
+    grid = app.generate_map(height=8, width=8, town_count=1, lake_count=1, seed=5)
+    positions = list(grid.grid)
+    grid.reroll(positions[0])
+    grid.undo()
+    grid.reroll(positions[-1])
+    assert grid.redo() is None
+    assert len(editing.history_of(grid).undo) == 1
@@ -0,0 +1,52 @@
+import random
+import pytest
+from hexmap.math import fov, hexgrid
+from hexmap.math.hexgrid import Hex, make_hex
+
+
+def old_linedraw(a, b):
+    # hex_linedraw before it drew lines in integer arithmetic, nudging the ends off the edges between hexes
+    steps = hexgrid.hex_distance(a, b)
+    a_nudge = Hex(a.q + 1e-06, a.r + 1e-06, a.s - 2e-06)
+    b_nudge = Hex(b.q + 1e-06, b.r + 1e-06, b.s - 2e-06)
+    step = 1.0 / max(steps, 1)
+    return [hexgrid.hex_round(hexgrid.hex_lerp(a_nudge, b_nudge, step * i)) for i in range(steps + 1)]
+
+
+def line_pairs():
+    hexes = hexgrid.get_all_hexes_within_range(make_hex(0, 0), 5)
+    pairs = [(a, b) for a in hexes for b in hexes]
+    rng = random.Random(1)
+    for _ in range(500):
+        # Lines along edges, where the old version's choice depends on where the line is
+        a = make_hex(rng.randint(-1000, 1000), rng.randint(-1000, 1000))
+        length = rng.randint(1, 50)
+        pairs.append((a, hexgrid.hex_add(a, make_hex(length, length))))
+        pairs.append((a, hexgrid.hex_add(a, make_hex(rng.randint(-300, 300), rng.randint(-300, 300)))))
+    return pairs
+
+
+def test_linedraw_matches_old_linedraw():
+    for a, b in line_pairs():
+        assert hexgrid.hex_linedraw(a, b) == old_linedraw(a, b), (a, b)
+
+
+def test_batch_linedraw_matches_linedraw():
+    np = pytest.importorskip("numpy")
+    from hexmap.math import hexbatch
+    pairs = line_pairs()
+    aq, ar, bq, br = (np.array(values) for values in zip(*((a.q, a.r, b.q, b.r) for a, b in pairs)))
+    q, r, offsets = hexbatch.hex_linedraw(aq, ar, bq, br)
+    for i, (a, b) in enumerate(pairs):
+        line = zip(q[offsets[i]:offsets[i + 1]].tolist(), r[offsets[i]:offsets[i + 1]].tolist())
+        assert [make_hex(*position) for position in line] == hexgrid.hex_linedraw(a, b), (a, b)
+
+
+def test_line_of_sight_matches_field_of_view():
+    rng = random.Random(2)
+    center = make_hex(17, -40)
+    opaque = {hexgrid.hex_add(center, position)
+              for position in hexgrid.get_all_hexes_within_range(make_hex(0, 0), 8) if rng.random() < 0.2}
+    visible = set(fov.field_of_view(center, 8, opaque.__contains__))
+    for position in hexgrid.get_all_hexes_within_range(center, 8):
+        assert (position in visible) == fov.line_of_sight(center, position, opaque.__contains__), position
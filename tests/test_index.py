@@ -0,0 +1,77 @@
+import random
+from hexmap.cartographer import builder
+from hexmap.cartographer.index import EntropyHeap, IndexedSet
+from hexmap.cartographer.location import Location
+from hexmap.features import terrain
+from hexmap.math.hexgrid import make_hex
+
+
+def undetermined(positions):
+    return {position for position, location in positions.items() if not location.determined}
+
+
+def test_indexed_set_add_discard_and_choice():
+    items = IndexedSet([3, 1, 3, 2])
+    assert list(items) == [3, 1, 2]
+    items.add(1)
+    items.add(4)
+    assert len(items) == 4
+    items.discard(3)
+    items.discard(5)
+    assert sorted(items) == [1, 2, 4] and 3 not in items
+    for item in items:
+        assert items.items[items.indexes[item]] == item
+    assert {items.choice(random.Random(seed)) for seed in range(50)} == {1, 2, 4}
+
+
+def test_undetermined_index_follows_completion():
+    positions = builder.create_rectangle_hexmap(10, 10, terrain.get_default_terrain(), rng=random.Random(2))
+    for _ in range(20):
+        builder.set_terrain_for_location(None, positions, None)
+        assert set(positions.undetermined) == undetermined(positions)
+    builder.complete_with_backtracking(positions)
+    assert not positions.undetermined and not undetermined(positions)
+
+
+def test_entropy_heap_pops_fewest_options_and_skips_stale_entries():
+    ruleset_terrains = terrain.get_default_terrain()
+    positions = builder.create_rectangle_hexmap(1, 3, ruleset_terrains)
+    first, second, third = positions
+    ruleset = positions[first].ruleset
+    heap = EntropyHeap(positions)
+    # Narrowing a position pushes a new entry, the old one is stale
+    positions.set_domain(second, ruleset.bit(ruleset_terrains[0]) | ruleset.bit(ruleset_terrains[1]), False)
+    heap.push(second, positions[second])
+    assert heap.pop(positions) == second
+    positions.set_domain(first, ruleset.bit(ruleset_terrains[0]), True)
+    assert heap.pop(positions) == third
+    assert heap.pop(positions) is None
+
+
+def test_lowest_entropy_completion_is_valid():
+    positions = builder.create_rectangle_hexmap(10, 10, terrain.get_default_terrain(), rng=random.Random(5))
+    builder.complete_with_backtracking(positions, lowest_entropy=True)
+    assert not undetermined(positions)
+    assert builder.unsupported_neighbours(list(positions), positions) is None
+
+
+def test_plain_dict_maps_still_complete():
+    terrains = terrain.get_default_terrain()
+    positions = {make_hex(q, r): Location(terrains) for q in range(4) for r in range(4)}
+    while undetermined(positions):
+        builder.set_terrain_for_location(None, positions, None)
+    assert all(location.determined for location in positions.values())
+
+
+def test_candidate_index_matches_scan():
+    terrains = terrain.get_default_terrain()
+    positions = builder.create_rectangle_hexmap(10, 10, terrains, rng=random.Random(4))
+    for terrain_option in terrains:
+        assert isinstance(builder.get_positions_for_terrain(terrain_option, positions), IndexedSet)
+    for step in range(40):
+        builder.set_terrain_in_random_valid_position(terrains[step % len(terrains)], positions)
+        for terrain_option in terrains:
+            expected = {position for position in undetermined(positions)
+                        if terrain_option in positions[position].terrain_options}
+            assert set(builder.get_positions_for_terrain(terrain_option, positions)) == expected
+            assert builder.count_positions_for_terrain(terrain_option, positions) == len(expected)
@@ -0,0 +1,41 @@
+import itertools
+import pytest
+from hexmap.math import hexbatch, hexgrid
+from hexmap.math.layout import Layout, FLAT, POINTY
+
+LAYOUTS = [Layout(orientation, size, origin)
+           for orientation, size, origin in itertools.product(
+               (POINTY, FLAT), ((1.0, 1.0), (10.0, 10.0), (7.5, 3.25)), ((0.0, 0.0), (12.5, -40.0)))]
+POSITIONS = hexgrid.build_rectangle(-3, 3, -3, 3)
+
+
+def sample_pixels(layout):
+    # Centres, corners and edge midpoints are exactly between hexes, where rounding has to break ties the same
+    pixels = []
+    for position in POSITIONS:
+        centre = layout.hex_to_pixel(position)
+        corners = layout.polygon_corners(position)
+        pixels.append(centre)
+        pixels += corners
+        pixels += [((ax + bx) / 2, (ay + by) / 2) for (ax, ay), (bx, by) in zip(corners, corners[1:] + corners[:1])]
+        pixels += [((centre[0] + x) / 2, (centre[1] + y) / 2) for x, y in corners]
+    return pixels
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_batch_pixel_to_hex_matches_layout(layout):
+    np = pytest.importorskip("numpy")
+    pixels = sample_pixels(layout)
+    x = np.array([x for x, _ in pixels])
+    y = np.array([y for _, y in pixels])
+    q, r = hexbatch.pixel_to_hex(layout, x, y)
+    assert hexbatch.to_hexes(q, r) == [layout.pixel_to_hex(px, py) for px, py in pixels]
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_pixel_to_hex_finds_hex_centres(layout):
+    pytest.importorskip("numpy")
+    q, r = hexbatch.from_hexes(POSITIONS)
+    x, y = hexbatch.hex_to_pixel(layout, q, r)
+    assert hexbatch.to_hexes(*hexbatch.pixel_to_hex(layout, x, y)) == POSITIONS
+    assert [layout.pixel_to_hex(*layout.hex_to_pixel(position)) for position in POSITIONS] == POSITIONS
@@ -0,0 +1,42 @@
+import pickle
+import pytest
+from hexmap.cartographer import builder
+from hexmap.cartographer.location import Location
+from hexmap.features import terrain
+from hexmap.features.ruleset import compile_ruleset
+
+
+def test_location_has_no_instance_dict():
+    location = Location(terrain.get_default_terrain())
+    assert not hasattr(location, "__dict__")
+    with pytest.raises(AttributeError):
+        location.name = "plains"
+
+
+def test_terrain_options_are_shared_per_domain():
+    terrains = terrain.get_default_terrain()
+    positions = builder.create_rectangle_hexmap(4, 4, terrains)
+    first, second = list(positions.values())[:2]
+    assert first.ruleset is second.ruleset is compile_ruleset(terrains)
+    assert first.terrain_options is second.terrain_options
+    assert first.terrain_options == tuple(terrains)
+    assert first.longest == max(len(terrain_option) for terrain_option in terrains)
+
+
+def test_determined_and_contradicted_locations():
+    terrains = terrain.get_default_terrain()
+    location = Location(terrains)
+    location.determine_terrain_options(terrains[1])
+    assert location.determined and location.terrain_options == (terrains[1],)
+    # A location narrowed to no options is a contradiction, and is not determined
+    contradicted = Location(terrains)
+    contradicted.set_terrain_options([])
+    assert not contradicted.determined and contradicted.terrain_options == ()
+
+
+def test_locations_pickle():
+    terrains = terrain.get_default_terrain()
+    location = Location(terrains)
+    location.determine_terrain_options(terrains[0])
+    copy = pickle.loads(pickle.dumps(location))
+    assert (copy.domain, copy.determined, copy.terrain_options) == (location.domain, True, (terrains[0],))
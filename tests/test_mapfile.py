@@ -0,0 +1,96 @@
+import pickle
+import random
+import pytest
+from hexmap import app
+from hexmap.cartographer import builder, location, mapfile
+from hexmap.features import terrain
+from hexmap.features.terrain import Terrain
+from hexmap.math import hexgrid
+
+
+def cells(grid):
+    return [(position, location.domain, location.determined) for position, location in grid.grid.items()]
+
+
+def test_saved_map_loads_the_same(tmp_path):
+    grid = app.generate_map(height=9, width=7, town_count=1, lake_count=1, seed=3)
+    path = tmp_path / "map.hexmap"
+    mapfile.save_map(path, grid, seed=3)
+    assert mapfile.is_map_file(path)
+    loaded = mapfile.load_map(path)
+    assert (loaded.height, loaded.width) == (grid.height, grid.width)
+    assert cells(loaded) == cells(grid)
+    assert list(builder.get_ruleset(loaded.grid).ids) == list(builder.get_ruleset(grid.grid).ids)
+    with mapfile.MapFile(path) as map_file:
+        assert map_file.seed == 3
+        window = map_file.read_window(map_file.top + 2, map_file.left + 1, 4, 3)
+        assert all(grid.grid[position].domain == location.domain for position, location in window.grid.items())
+
+
+def test_undetermined_cells_and_wide_rulesets_round_trip(tmp_path):
+    # More than eight terrains need two bytes per cell
+    names = [f"terrain{index}" for index in range(10)]
+    terrains = [Terrain(name, names, "") for name in names]
+    positions = builder.create_rectangle_hexmap(4, 5, terrains)
+    builder.set_terrain_for_location(next(iter(positions)), positions, terrains[9])
+    grid = builder.Grid(positions, 4, 5)
+    path = tmp_path / "wide.hexmap"
+    mapfile.save_map(path, grid)
+    with mapfile.MapFile(path) as map_file:
+        assert map_file.cell_size == 2 and map_file.seed is None
+    assert cells(mapfile.load_map(path)) == cells(grid)
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    grid = app.generate_map(height=6, width=6, town_count=1, lake_count=1, seed=1)
+    path = tmp_path / "map.hexmap"
+    mapfile.save_map(path, grid)
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        mapfile.load_map(path)
+
+
+def legacy_class(module, name):
+    # Stands in for a class of an older version, pickled under that class's name
+    return type(name, (), {"__module__": module.__name__, "__qualname__": name})
+
+
+def legacy_object(cls, **attributes):
+    legacy = cls()
+    legacy.__dict__.update(attributes)
+    return legacy
+
+
+def test_legacy_pickle_imports(tmp_path, monkeypatch):
+    classes = {}
+    for module, name in ((builder, "Grid"), (location, "Location"), (terrain, "Terrain"), (hexgrid, "Hex")):
+        classes[name] = legacy_class(module, name)
+        monkeypatch.setattr(module, name, classes[name])
+    grass, water = (legacy_object(classes["Terrain"], name=name, possible_neighbours=["grass", "water"],
+                                  colour_code="") for name in ("grass", "water"))
+    options = [[grass], [grass, water], [None], [water]]
+    cells = {legacy_object(classes["Hex"], q=q, r=0, s=-q): legacy_object(classes["Location"], terrain_options=option,
+                                                                            longest=5, determined=len(option) == 1)
+             for q, option in enumerate(options)}
+    path = tmp_path / "legacy.pickle"
+    path.write_bytes(pickle.dumps(legacy_object(classes["Grid"], grid=cells, height=1, width=4)))
+    monkeypatch.undo()
+
+    assert not mapfile.is_map_file(path)
+    grid = mapfile.import_pickle(path)
+    assert (grid.height, grid.width) == (1, 4)
+    ruleset = builder.get_ruleset(grid.grid)
+    expected = [(ruleset.mask_of_names(["grass"]), True), (ruleset.mask_of_names(["grass", "water"]), False),
+                (0, True), (ruleset.mask_of_names(["water"]), True)]
+    assert [(cell.domain, cell.determined) for cell in grid.grid.values()] == expected
+    assert list(grid.grid) == [hexgrid.Hex(q, 0) for q in range(4)]
+
+
+def test_other_pickles_are_not_imported(tmp_path):
+    path = tmp_path / "other.pickle"
+    path.write_bytes(pickle.dumps({"grid": {}}))
+    with pytest.raises(ValueError):
+        mapfile.import_pickle(path)
+    path.write_bytes(pickle.dumps(random.Random(1)))
+    with pytest.raises(pickle.UnpicklingError):
+        mapfile.import_pickle(path)
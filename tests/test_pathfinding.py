@@ -0,0 +1,62 @@
+import random
+from hexmap import app
+from hexmap.cartographer import builder, pathfinding
+from hexmap.cartographer.pathfinding import DistanceField, TravelMap
+from hexmap.features.terrain import Terrain
+from hexmap.math import hexgrid
+
+
+def path_cost(travel_map, path):
+    for position, following in zip(path.positions, path.positions[1:]):
+        assert hexgrid.hex_distance(position, following) == 1
+    return sum(travel_map.cost(position) for position in path.positions[1:])
+
+
+def test_a_star_costs_match_distance_fields():
+    grid = app.generate_map(height=14, width=14, town_count=2, lake_count=2, seed=7)
+    travel_map = TravelMap(grid)
+    rng = random.Random(7)
+    passable = sorted(travel_map.costs, key=builder.row_major)
+    for goal in rng.sample(passable, 4):
+        field = travel_map.distance_field([goal])
+        for start in rng.sample(passable, 10):
+            path = travel_map.find_path(start, goal)
+            if field.distance(start) is None:
+                assert path is None
+                continue
+            assert path.positions[0] == start and path.positions[-1] == goal
+            assert path.cost == field.distance(start) == path_cost(travel_map, path)
+            assert field.path(start).cost == path.cost
+            assert path_cost(travel_map, field.path(start)) == path.cost
+
+
+def walled_map():
+    # A row of plains with a wall of water between the two ends and one mountain before the wall
+    terrains = [Terrain(name, ["plains", "mountains", "water"], "") for name in ("plains", "mountains", "water")]
+    positions = builder.create_rectangle_hexmap(1, 6, terrains)
+    cells = list(positions)
+    for position, terrain_option in zip(cells, [terrains[0], terrains[1], terrains[0], terrains[2], terrains[0]]):
+        builder.set_terrain_for_location(position, positions, terrain_option)
+    return positions, cells
+
+
+def test_impassable_and_unreachable_targets():
+    positions, cells = walled_map()
+    travel_map = TravelMap(positions)
+    assert travel_map.find_path(cells[0], cells[2]).cost == 3 + 1
+    # Water can't be entered, or travelled past, and the undetermined end is not on the travel map
+    assert travel_map.cost(cells[3]) is None and travel_map.find_path(cells[0], cells[3]) is None
+    assert travel_map.find_path(cells[0], cells[4]) is None
+    assert travel_map.find_path(cells[5], cells[0]) is None and travel_map.find_path(cells[0], cells[5]) is None
+    field = travel_map.distance_field([cells[3], cells[4]])
+    assert field.distance(cells[4]) == 0 and field.distance(cells[0]) is None and field.path(cells[0]) is None
+    assert travel_map.nearest(cells[0], "water") is None
+    assert travel_map.nearest(cells[4], "plains") == (cells[4], 0)
+
+
+def test_sources_that_cannot_be_entered_are_ignored():
+    positions, cells = walled_map()
+    costs = TravelMap(positions).costs
+    assert DistanceField(costs, [cells[3]]).distances == {}
+    assert TravelMap(positions, dict(pathfinding.DEFAULT_MOVEMENT_COSTS, water=2)).find_path(cells[0], cells[4]).cost \
+        == 3 + 1 + 2 + 1
@@ -0,0 +1,55 @@
+import random
+from hexmap.cartographer import builder, stamping
+from hexmap.features import terrain
+from hexmap.features.terrain import Terrain
+from hexmap.math import hexgrid
+
+
+def make_positions(seed=0):
+    positions = builder.create_rectangle_hexmap(10, 10, terrain.get_default_terrain(), rng=random.Random(seed))
+    terrains = {terrain_option.name: terrain_option for terrain_option in builder.get_ruleset(positions).terrains}
+    return positions, terrains
+
+
+def assert_valid(positions):
+    assert not positions.undetermined
+    assert builder.unsupported_neighbours(list(positions), positions) is None
+
+
+def test_overlapping_and_contradicting_stamps():
+    positions, terrains = make_positions()
+    centre = list(positions)[44]
+    beside = hexgrid.hex_neighbor(centre, 0)
+    lake = stamping.HexBlob(terrains["water"], 1, centre)
+    # A second lake may overlap the first, a mountain range or town can't touch it
+    overlapping_lake = stamping.HexBlob(terrains["water"], 1, beside)
+    mountains = stamping.HexBlob(terrains["mountains"], 1, hexgrid.hex_neighbor(beside, 0))
+    town = stamping.Single(terrains["town"], hexgrid.hex_neighbor(centre, 3))
+    report = stamping.stamp_features([lake, overlapping_lake, mountains, town], positions)
+
+    assert report.placed == [lake, overlapping_lake]
+    assert [conflict.feature for conflict in report.conflicts] == [mountains, town]
+    water = builder.get_ruleset(positions).bit(terrains["water"])
+    lake_cells = set(lake.cells(positions)) | set(overlapping_lake.cells(positions))
+    assert all(builder.get_cell_state(position, positions) == (water, True) for position in lake_cells)
+    for conflict in report.conflicts:
+        cells = conflict.feature.cells(positions)
+        assert conflict.positions and set(conflict.positions) <= set(cells)
+        # None of a conflicting feature's cells are stamped
+        bit = builder.get_ruleset(positions).bit(conflict.feature.terrain_option)
+        assert all(builder.get_cell_state(position, positions) != (bit, True) for position in cells)
+
+    builder.complete_with_backtracking(positions)
+    assert_valid(positions)
+    assert all(builder.get_cell_state(position, positions) == (water, True) for position in lake_cells)
+
+
+def test_features_with_nowhere_to_go_conflict():
+    positions, terrains = make_positions(1)
+    off_map = stamping.Line(terrains["town"], hexgrid.Hex(40, 40), hexgrid.Hex(44, 40))
+    unknown = stamping.Single(Terrain("lava", ["lava"], ""), next(iter(positions)))
+    report = stamping.stamp_features([off_map, unknown], positions)
+    assert report.placed == [] and report.revisions == 0
+    assert report.conflicts == [stamping.Conflict(off_map, []), stamping.Conflict(unknown, [next(iter(positions))])]
+    builder.complete_with_backtracking(positions)
+    assert_valid(positions)
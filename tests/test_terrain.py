@@ -0,0 +1,66 @@
+import json
+import random
+from collections import Counter
+import pytest
+from hexmap.features import terrain
+from hexmap.features.ruleset import compile_ruleset
+from hexmap.features.terrain import Terrain
+
+
+@pytest.mark.parametrize("entry", [
+    [],
+    {"possible_neighbours": ["plains"]},
+    {"name": 3},
+    {"name": "plains", "possible_neighbours": "plains"},
+    {"name": "plains", "possible_neighbours": ["plains", 2]},
+    {"name": "plains", "colour_code": 32},
+    {"name": "plains", "weight": "2"},
+    {"name": "plains", "weight": True},
+    {"name": "plains", "weight": 0},
+    {"name": "plains", "weight": -1},
+    {"name": "plains", "weight": float("nan")},
+    {"name": "plains", "weight": float("inf")},
+])
+def test_bad_terrain_entries_are_rejected(entry):
+    with pytest.raises(ValueError):
+        terrain.terrain_from_dict(entry)
+
+
+def test_terrain_entries_round_trip():
+    entry = {"name": "marsh", "possible_neighbours": ["plains", "marsh"], "colour_code": "green", "weight": 0.5}
+    marsh = terrain.terrain_from_dict(entry)
+    assert marsh == Terrain("marsh", ["plains", "marsh"], terrain.Colors.GREEN, 0.5)
+    assert (marsh.colour_code, marsh.weight) == (terrain.Colors.GREEN, 0.5)
+    assert terrain.terrain_from_dict(terrain.terrain_to_dict(marsh)) == marsh
+    assert "weight" not in terrain.terrain_to_dict(terrain.terrain_from_dict({"name": "plains"}))
+
+
+@pytest.mark.parametrize("entries", [
+    {"name": "plains"},
+    [],
+    [{"name": "plains", "possible_neighbours": ["plains", "swamp"]}],
+    [{"name": "plains"}, {"name": "plains"}],
+    [{"name": "plains", "weight": -2}],
+])
+def test_bad_configs_are_rejected(tmp_path, entries):
+    path = tmp_path / "terrain.json"
+    path.write_text(json.dumps(entries), encoding="utf-8")
+    with pytest.raises(ValueError):
+        terrain.load_terrain(path)
+
+
+def test_choices_follow_the_weights():
+    weights = {"a": 1, "b": 2, "c": 0.5, "d": 4.5}
+    names = list(weights)
+    ruleset = compile_ruleset([Terrain(name, names, "", weight) for name, weight in weights.items()])
+    rng = random.Random(0)
+    samples = 200000
+    counts = Counter(ruleset.choose(ruleset.full, rng).name for _ in range(samples))
+    total = sum(weights.values())
+    for name, weight in weights.items():
+        assert counts[name] / samples == pytest.approx(weight / total, abs=0.005), name
+    # Smaller domains are chosen from by the weights of their own terrains
+    mask = ruleset.mask_of_names(["a", "c"])
+    counts = Counter(ruleset.choose(mask, rng).name for _ in range(samples))
+    assert counts["a"] / samples == pytest.approx(weights["a"] / (weights["a"] + weights["c"]), abs=0.005)
+    assert set(counts) == {"a", "c"}
@@ -0,0 +1,45 @@
+import random
+from hexmap import app
+from hexmap.render import text
+from hexmap.render.viewport import Viewport
+
+
+def make_grid(seed=0):
+    return app.generate_map(height=12, width=16, town_count=1, lake_count=1, seed=seed)
+
+
+def test_frame_matches_printed_map():
+    grid = make_grid()
+    viewport = Viewport(grid, height=grid.height, width=grid.width, colour=False)
+    assert viewport.frame() == list(text.render_lines(grid, colour=False, coordinates=False))
+
+
+def test_unchanged_rows_come_from_the_cache():
+    grid = make_grid()
+    viewport = Viewport(grid, height=5, width=8, colour=False)
+    first = viewport.frame()
+    rendered = viewport.rendered_rows
+    assert viewport.frame() == first and viewport.rendered_rows == rendered
+    # Scrolling down one row only renders the row that came into view
+    viewport.scroll(1, 0)
+    viewport.frame()
+    assert viewport.rendered_rows == rendered + 1
+    # Scrolling back is served from the cache
+    viewport.scroll(-1, 0)
+    assert viewport.frame() == first and viewport.rendered_rows == rendered + 1
+
+
+def test_edits_render_their_rows_again():
+    grid = make_grid()
+    viewport = Viewport(grid, height=grid.height, width=grid.width, colour=False)
+    viewport.frame()
+    rendered = viewport.rendered_rows
+    position = random.Random(1).choice(list(grid.grid))
+    terrains = {terrain_option.name: terrain_option for terrain_option in grid.grid[position].ruleset.terrains}
+    edit = grid.set_terrain(position, terrains["water"])
+    assert edit.changes
+    lines = viewport.frame()
+    assert lines == list(text.render_lines(grid, colour=False, coordinates=False))
+    assert viewport.rendered_rows - rendered == len({changed.r for changed, *_ in edit.changes})
+    grid.undo()
+    assert viewport.frame() == list(text.render_lines(grid, colour=False, coordinates=False))